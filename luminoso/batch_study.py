@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+"""
+Analyze many study directories at once, without a display.
+
+    luminoso-batch [--workers N] [--force] [--incremental]
+                   [--share-matrices] [--cache-megabytes MB]
+                   [--summary FILE] StudyDir|'glob/*' ...
+
+Studies are spread over a pool of worker processes. Each worker keeps the
+matrices it loads (such as ConceptNet) in memory for every study it analyzes
+that has a copy of the same file, up to MB megabytes of them (by default
+2048), dropping the least recently used first. Studies whose saved analysis
+is still current are skipped unless --force is given.
+
+--share-matrices first moves each study's matrix files into the shared
+matrix store (see luminoso/matrix_store.py), so that the studies keep one
+copy of each matrix between them.
+
+For each study, a JSON summary of what happened, how long it and each stage
+of its analysis took, and any error is written to Results/batch_summary.json
+in the study, and collected in FILE if --summary is given.
+"""
+from __future__ import with_statement
+import os
+import sys
+import glob
+import time
+import logging
+import traceback
+
+# Analyze without Qt; this must be set before luminoso.study is imported.
+os.environ['LUMINOSO_HEADLESS'] = '1'
+
+from luminoso.study import StudyDirectory, write_json_to_file, freeze_support
+from luminoso.sized_cache import SizedLRUCache
+logger = logging.getLogger('luminoso')
+
+SUMMARY_FILE = 'batch_summary.json'
+
+DEFAULT_CACHE_MEGABYTES = 2048
+
+# The matrices loaded by this worker process, shared by every study it
+# analyzes.
+_matrix_cache = None
+
+def _init_worker(cache_megabytes=DEFAULT_CACHE_MEGABYTES):
+    global _matrix_cache
+    _matrix_cache = SizedLRUCache(cache_megabytes * 1024 * 1024)
+
+def expand_study_dirs(patterns):
+    """
+    Expand a list of directories and glob patterns into study directories,
+    in order and without duplicates.
+    """
+    dirs = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) or [pattern]
+        for match in matches:
+            match = os.path.abspath(match)
+            if os.path.isdir(match) and match not in seen:
+                seen.add(match)
+                dirs.append(match)
+    return dirs
+
+def analyze_study_dir(dirname, force=False, incremental=False,
+                      matrix_cache=None, in_pool=False):
+    """
+    Analyze one study directory unless its analysis is current, and return
+    a summary of what happened. This never raises an exception for a problem
+    with the study; the error goes in the summary instead.
+
+    `in_pool` should be true when this runs in a worker process, which
+    can't start its own pool of workers to extract concepts.
+    """
+    summary = {'study': dirname, 'outcome': None, 'error': None,
+               'started': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    start = time.time()
+    try:
+        study_dir = StudyDirectory(dirname, matrix_cache=matrix_cache)
+        if in_pool: study_dir.settings['workers'] = 1
+        if not force and study_dir.is_analysis_current():
+            summary['outcome'] = 'skipped'
+        else:
+            analysis_start = time.time()
+            results = study_dir.analyze(incremental=incremental)
+            summary['analyze_seconds'] = time.time() - analysis_start
+            summary['outcome'] = 'analyzed'
+            summary['num_documents'] = results.stats['num_documents']
+            summary['num_concepts'] = results.stats['num_concepts']
+            summary['consistency'] = results.stats['consistency']
+            summary['stages'] = results.study.instrumentation.timings()
+    except Exception:
+        summary['outcome'] = 'failed'
+        summary['error'] = traceback.format_exc()
+        logger.error('Analyzing %s failed:\n%s' % (dirname, summary['error']))
+    summary['seconds'] = time.time() - start
+
+    try:
+        results_dir = os.path.join(dirname, 'Results')
+        if not os.path.isdir(results_dir): os.makedirs(results_dir)
+        write_json_to_file(summary, os.path.join(results_dir, SUMMARY_FILE))
+    except (IOError, OSError):
+        logger.warn('Could not write the batch summary for %s' % dirname)
+    return summary
+
+def _analyze_in_worker(args):
+    dirname, force, incremental, in_pool = args
+    return analyze_study_dir(dirname, force, incremental, _matrix_cache, in_pool)
+
+def run_batch(dirs, workers=None, force=False, incremental=False,
+              cache_megabytes=DEFAULT_CACHE_MEGABYTES):
+    """
+    Analyze the study directories in `dirs` with a pool of `workers`
+    processes (by default, one per CPU), yielding the summary of each study
+    as it finishes. Each process keeps up to `cache_megabytes` of matrices
+    loaded between studies.
+    """
+    try:
+        import multiprocessing
+    except ImportError:
+        # Python 2.5 doesn't have it, so analyze one study at a time.
+        workers = 1
+    if workers is None: workers = multiprocessing.cpu_count()
+    in_pool = workers > 1 and len(dirs) > 1
+    jobs = [(dirname, force, incremental, in_pool) for dirname in dirs]
+    if not in_pool:
+        _init_worker(cache_megabytes)
+        for job in jobs:
+            yield _analyze_in_worker(job)
+        return
+
+    pool = multiprocessing.Pool(min(workers, len(jobs)), _init_worker,
+                                (cache_megabytes,))
+    try:
+        # One study at a time per worker, because studies vary so much in
+        # size.
+        for summary in pool.imap_unordered(_analyze_in_worker, jobs, 1):
+            yield summary
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+USAGE = __doc__.split('\n\n')[1]
+
+def main():
+    freeze_support()
+    logging.basicConfig(level=logging.WARNING)
+    args = sys.argv[1:]
+    workers = None
+    cache_megabytes = DEFAULT_CACHE_MEGABYTES
+    summary_file = None
+    force = incremental = share = False
+    patterns = []
+    while args:
+        arg = args.pop(0)
+        if arg == '--workers' and args: workers = int(args.pop(0))
+        elif arg == '--summary' and args: summary_file = args.pop(0)
+        elif arg == '--cache-megabytes' and args:
+            cache_megabytes = int(args.pop(0))
+        elif arg == '--force': force = True
+        elif arg == '--incremental': incremental = True
+        elif arg == '--share-matrices': share = True
+        elif arg.startswith('--'):
+            print USAGE
+            sys.exit(2)
+        else: patterns.append(arg)
+    dirs = expand_study_dirs(patterns)
+    if not dirs:
+        print USAGE
+        sys.exit(2)
+
+    if share:
+        for dirname in dirs:
+            StudyDirectory(dirname).share_matrices()
+
+    summaries = []
+    for summary in run_batch(dirs, workers, force, incremental,
+                             cache_megabytes):
+        print '%-9s %7.1fs  %s' % (summary['outcome'], summary['seconds'],
+                                   summary['study'])
+        summaries.append(summary)
+    summaries.sort(key=lambda summary: summary['study'])
+    if summary_file is not None:
+        write_json_to_file(summaries, summary_file)
+    if any(summary['outcome'] == 'failed' for summary in summaries):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+"""
+Benchmark each stage of an analysis, without a display.
+
+    luminoso-benchmark [--scales N,N,...] [--no-matrix] [--seed N]
+                       [--vocabulary N] [--sentences N] [--sentence-length N]
+                       [--workers N] [--study StudyDir ...]
+                       [--output FILE] [--baseline FILE] [--tolerance T]
+
+By default, this analyzes synthetic studies with 1000 and 10000 documents,
+blended with a stand-in for ConceptNet (unless --no-matrix is given). The
+numbers of documents are given by --scales. Each synthetic document has
+--sentences sentences (default 5) of about --sentence-length words (default
+12), drawn from a vocabulary of --vocabulary words (default 5000). Real
+study directories can be benchmarked too, with --study.
+
+The results, including how long each stage took, are written as JSON to FILE
+or to standard output. If --baseline names an earlier output, every stage
+that got more than T times slower (default 0.25, or 25%) is reported, and
+the exit status is 1.
+"""
+from __future__ import with_statement
+import os
+import sys
+import time
+import shutil
+import platform
+import tempfile
+import logging
+import numpy as np
+
+# Analyze without Qt; this must be set before luminoso.study is imported.
+os.environ['LUMINOSO_HEADLESS'] = '1'
+
+from csc import divisi2
+from luminoso.study import Study, Document, StudyDirectory, \
+     write_json_to_file, load_json_from_file, freeze_support
+logger = logging.getLogger('luminoso')
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+BENCHMARK_FORMAT_VERSION = 1
+
+# The numbers of documents that synthetic studies are benchmarked at, unless
+# --scales says otherwise. Larger ones, up to 1000000, work but take a long
+# time.
+DEFAULT_SCALES = [1000, 10000]
+
+CONSONANTS = 'bdfgklmnprtvz'
+VOWELS = 'aeiou'
+SYLLABLES = [c + v for c in CONSONANTS for v in VOWELS]
+
+def synthetic_word(index, syllables=3):
+    """
+    Make up a word for a number, like 'bobabe'. Different numbers get
+    different words, and the words end in vowels, so the lemmatizer tends to
+    leave them alone.
+    """
+    parts = []
+    for i in xrange(syllables):
+        index, digit = divmod(index, len(SYLLABLES))
+        parts.append(SYLLABLES[digit])
+    while index:
+        index, digit = divmod(index - 1, len(SYLLABLES))
+        parts.append(SYLLABLES[digit])
+    return ''.join(parts)
+
+def zipf_distribution(size, exponent):
+    """
+    The cumulative probabilities of ranks 1 to `size` under Zipf's law.
+    """
+    weights = 1.0 / np.arange(1, size + 1) ** exponent
+    cumulative = np.cumsum(weights)
+    return cumulative / cumulative[-1]
+
+class SyntheticCorpus(object):
+    """
+    A reproducible collection of made-up documents.
+
+    Words are drawn from a vocabulary of `vocabulary_size` made-up words,
+    with frequencies that follow Zipf's law with the given exponent. Each
+    document has `sentences_per_document` sentences that average
+    `sentence_length` words. `negation_rate` is the fraction of sentences
+    with a negation in them, and `tag_density` is the number of #tags per
+    word.
+
+    The text of a document is generated from the seed and its number
+    whenever it is needed, so a large corpus takes very little memory.
+    """
+    NEGATIONS = ['not', 'never', 'no']
+    NUM_TAGS = 20
+
+    def __init__(self, num_documents, vocabulary_size=5000, zipf_exponent=1.1,
+                 sentence_length=12, sentences_per_document=5,
+                 negation_rate=0.1, tag_density=0.01, seed=0):
+        self.num_documents = num_documents
+        self.vocabulary_size = vocabulary_size
+        self.zipf_exponent = zipf_exponent
+        self.sentence_length = sentence_length
+        self.sentences_per_document = sentences_per_document
+        self.negation_rate = negation_rate
+        self.tag_density = tag_density
+        self.seed = seed
+        self.vocabulary = [synthetic_word(i) for i in xrange(vocabulary_size)]
+        self._cumulative = zipf_distribution(vocabulary_size, zipf_exponent)
+
+    def params(self):
+        return {'num_documents': self.num_documents,
+                'vocabulary_size': self.vocabulary_size,
+                'zipf_exponent': self.zipf_exponent,
+                'sentence_length': self.sentence_length,
+                'sentences_per_document': self.sentences_per_document,
+                'negation_rate': self.negation_rate,
+                'tag_density': self.tag_density,
+                'seed': self.seed}
+
+    def sample_words(self, rng, n):
+        """
+        Choose `n` words from the vocabulary, by their Zipf frequencies.
+        """
+        ranks = np.searchsorted(self._cumulative, rng.random_sample(n))
+        return [self.vocabulary[rank] for rank in ranks]
+
+    def document_text(self, index):
+        rng = np.random.RandomState([self.seed, index])
+        sentences = []
+        for s in xrange(self.sentences_per_document):
+            length = 1 + rng.poisson(max(self.sentence_length - 1, 0))
+            words = self.sample_words(rng, length)
+            if rng.random_sample() < self.negation_rate:
+                negation = self.NEGATIONS[rng.randint(len(self.NEGATIONS))]
+                words.insert(rng.randint(len(words)), negation)
+            num_tags = rng.poisson(self.tag_density * length)
+            for t in xrange(num_tags):
+                tag = '#tag%d' % rng.randint(self.NUM_TAGS)
+                if rng.random_sample() < 0.25:
+                    tag = '#-' + tag[1:]
+                words.append(tag)
+            sentences.append(' '.join(words) + '.')
+        return u' '.join(sentences)
+
+    def documents(self):
+        return [SyntheticDocument(self, i) for i in xrange(self.num_documents)]
+
+class SyntheticDocument(Document):
+    """
+    A document from a SyntheticCorpus, which makes up its text each time it
+    is needed.
+    """
+    def __init__(self, corpus, index):
+        Document.__init__(self, 'doc%07d.txt' % index)
+        self.corpus = corpus
+        self.index = index
+
+    @property
+    def text(self):
+        return self.corpus.document_text(self.index)
+
+def stand_in_matrix(corpus, extra_concepts=5000, degree=10, seed=0):
+    """
+    Make a symmetric association matrix to stand in for ConceptNet. It
+    connects each word of the corpus's vocabulary, and `extra_concepts` other
+    words, to about `degree` others. As in ConceptNet, common words have
+    more connections.
+    """
+    rng = np.random.RandomState(seed)
+    size = corpus.vocabulary_size + extra_concepts
+    labels = [synthetic_word(i) for i in xrange(size)]
+    cumulative = zipf_distribution(size, corpus.zipf_exponent)
+    weights = {}
+    for i in xrange(size):
+        neighbors = np.searchsorted(cumulative, rng.random_sample(degree))
+        for j in neighbors:
+            if i == j: continue
+            weights[(i, j)] = weights[(j, i)] = 0.5 + rng.random_sample() / 2
+    entries = [(value, labels[i], labels[j])
+               for (i, j), value in weights.iteritems()]
+    return divisi2.make_sparse(entries)
+
+def synthetic_study(corpus, with_matrix=True, settings=None):
+    """
+    Make a Study of the documents in a SyntheticCorpus, blended with a
+    stand-in for ConceptNet if `with_matrix` is true.
+    """
+    matrices = {}
+    if with_matrix:
+        matrices['standin.assoc.smat'] = stand_in_matrix(corpus,
+                                                         seed=corpus.seed)
+    return Study(name='synthetic-%d' % corpus.num_documents,
+                 documents=corpus.documents(), canonical=[],
+                 other_matrices=matrices, settings=settings or {})
+
+def run_benchmark(name, study, params=None):
+    """
+    Analyze a study and save the results in a temporary directory, and
+    return how long each stage of the analysis took.
+    """
+    study.instrumentation.clear()
+    results_dir = tempfile.mkdtemp()
+    start = time.time()
+    try:
+        results = study.analyze()
+        results.save(results_dir)
+    finally:
+        shutil.rmtree(results_dir)
+    total = time.time() - start
+
+    stages = {}
+    for event in study.instrumentation.timings():
+        # Add up stages that happen more than once.
+        stage = stages.setdefault(event['stage'],
+          {'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'peak_rss_delta_kb': None,
+           'sizes': event['sizes']})
+        stage['wall_seconds'] += event['wall_seconds']
+        stage['cpu_seconds'] += event['cpu_seconds']
+        if event['peak_rss_delta_kb'] is not None:
+            stage['peak_rss_delta_kb'] = (stage['peak_rss_delta_kb'] or 0) \
+                                         + event['peak_rss_delta_kb']
+    return {'name': name, 'params': params or {}, 'total_seconds': total,
+            'consistency': results.stats['consistency'], 'stages': stages}
+
+def benchmark_scales(scales, with_matrix=True, seed=0, settings=None,
+                     **corpus_params):
+    """
+    Benchmark synthetic studies with each number of documents in `scales`,
+    yielding the result of each.
+    """
+    for num_documents in scales:
+        corpus = SyntheticCorpus(num_documents, seed=seed, **corpus_params)
+        study = synthetic_study(corpus, with_matrix, settings)
+        name = 'synthetic-%d%s' % (num_documents,
+                                   with_matrix and '-standin' or '')
+        # Benchmarks of differently shaped corpora mustn't be compared.
+        for param, value in sorted(corpus_params.items()):
+            name += '-%s=%s' % (param, value)
+        params = corpus.params()
+        params['with_matrix'] = with_matrix
+        yield run_benchmark(name, study, params)
+
+def benchmark_study_dir(dirname, settings=None):
+    """
+    Benchmark the analysis of a real study directory, without changing its
+    saved results.
+    """
+    study_dir = StudyDirectory(dirname)
+    if settings: study_dir.settings.update(settings)
+    study = study_dir.get_study()
+    name = 'study-%s' % os.path.basename(os.path.normpath(dirname))
+    return run_benchmark(name, study, {'study': os.path.abspath(dirname)})
+
+def compare_to_baseline(benchmarks, baseline, tolerance=0.25, min_seconds=0.05):
+    """
+    Find the stages that got slower than in `baseline`, an earlier output of
+    this module. A stage is slower if it took more than `tolerance` times
+    longer than before, and at least `min_seconds` longer, so that noise in
+    very quick stages is ignored.
+
+    Returns a list of dictionaries describing the slower stages.
+    """
+    before = dict((benchmark['name'], benchmark)
+                  for benchmark in baseline['benchmarks'])
+    regressions = []
+    for benchmark in benchmarks:
+        old = before.get(benchmark['name'])
+        if old is None: continue
+        for stage, timing in sorted(benchmark['stages'].items()):
+            if stage not in old['stages']: continue
+            seconds = timing['wall_seconds']
+            old_seconds = old['stages'][stage]['wall_seconds']
+            if seconds > old_seconds * (1 + tolerance) and \
+               seconds - old_seconds >= min_seconds:
+                regressions.append({'name': benchmark['name'], 'stage': stage,
+                                    'baseline_seconds': old_seconds,
+                                    'seconds': seconds,
+                                    'ratio': seconds / max(old_seconds, 1e-9)})
+    return regressions
+
+def describe_machine():
+    return {'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+USAGE = __doc__.split('\n\n')[1]
+
+def main():
+    freeze_support()
+    logging.basicConfig(level=logging.WARNING)
+    args = sys.argv[1:]
+    scales = DEFAULT_SCALES
+    with_matrix = True
+    seed = 0
+    corpus_params = {}
+    settings = {}
+    study_dirs = []
+    output_file = baseline_file = None
+    tolerance = 0.25
+    while args:
+        arg = args.pop(0)
+        if arg == '--scales' and args:
+            scales = [int(n) for n in args.pop(0).split(',') if n]
+        elif arg == '--no-matrix': with_matrix = False
+        elif arg == '--seed' and args: seed = int(args.pop(0))
+        elif arg == '--vocabulary' and args:
+            corpus_params['vocabulary_size'] = int(args.pop(0))
+        elif arg == '--sentences' and args:
+            corpus_params['sentences_per_document'] = int(args.pop(0))
+        elif arg == '--sentence-length' and args:
+            corpus_params['sentence_length'] = int(args.pop(0))
+        elif arg == '--workers' and args: settings['workers'] = int(args.pop(0))
+        elif arg == '--study' and args: study_dirs.append(args.pop(0))
+        elif arg == '--output' and args: output_file = args.pop(0)
+        elif arg == '--baseline' and args: baseline_file = args.pop(0)
+        elif arg == '--tolerance' and args: tolerance = float(args.pop(0))
+        else:
+            print >> sys.stderr, USAGE
+            sys.exit(2)
+
+    benchmarks = []
+    def report(benchmark):
+        print >> sys.stderr, '%-30s %8.2fs' % (benchmark['name'],
+                                               benchmark['total_seconds'])
+        for stage, timing in sorted(benchmark['stages'].items()):
+            print >> sys.stderr, '    %-26s %8.2fs' % (stage,
+                                                       timing['wall_seconds'])
+        benchmarks.append(benchmark)
+    for benchmark in benchmark_scales(scales, with_matrix, seed, settings,
+                                      **corpus_params):
+        report(benchmark)
+    for dirname in study_dirs:
+        report(benchmark_study_dir(dirname, settings))
+
+    output = {'version': BENCHMARK_FORMAT_VERSION,
+              'machine': describe_machine(), 'benchmarks': benchmarks}
+    if output_file is None:
+        print json.dumps(output, indent=1)
+    else:
+        write_json_to_file(output, output_file)
+
+    if baseline_file is not None:
+        regressions = compare_to_baseline(benchmarks,
+                                          load_json_from_file(baseline_file),
+                                          tolerance)
+        for regression in regressions:
+            print >> sys.stderr, ('SLOWER: %(name)s %(stage)s took '
+                                  '%(seconds).2fs, was %(baseline_seconds).2fs'
+                                  % regression)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
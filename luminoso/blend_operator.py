@@ -0,0 +1,181 @@
+"""
+Blend matrices implicitly, for the SVD.
+
+`divisi2.blending.blend` builds a new sparse matrix over the union of the
+labels of all the matrices, and `normalize_all` copies it again, so a blend
+of ConceptNet with a large study holds three copies of the data at once. The
+SVD only ever needs to multiply the blend by blocks of vectors, though, and
+that can be done one matrix at a time:
+
+    N(B) x = r * sum_i(f_i P_i M_i Q_i^T (c * x))
+
+where f_i is the blend factor of matrix M_i, P_i and Q_i place its rows and
+columns among the union of the labels, and r and c are the row and column
+scales that `normalize_all` would apply to the materialized blend B.
+
+A BlendOperator is a SciPy LinearOperator, labeled like a divisi2 matrix,
+that does that. The scales are computed from the matrices directly, so the
+result is the same as normalizing the materialized blend, including where
+matrices overlap.
+"""
+import numpy as np
+from scipy.sparse.linalg import LinearOperator
+
+from csc.divisi2.blending import blend_factor
+from csc.divisi2.ordered_set import OrderedSet
+
+class BlendOperator(LinearOperator):
+    """
+    The blend of some labeled divisi2 SparseMatrices, as an operator.
+
+    `factors` are the blend factors, which default to what
+    `divisi2.blending.blend` would use.
+    """
+    def __init__(self, matrices, factors=None):
+        assert len(matrices) > 0
+        if factors is None:
+            if len(matrices) == 1:
+                # blend() leaves a single matrix alone.
+                factors = [1.0]
+            else:
+                factors = [blend_factor(mat) for mat in matrices]
+        self.row_labels, self.col_labels = OrderedSet(), OrderedSet()
+        self.parts = []
+        for mat, factor in zip(matrices, factors):
+            row_map = np.array([self.row_labels.add(label)
+                                for label in mat.row_labels], dtype=np.int64)
+            col_map = np.array([self.col_labels.add(label)
+                                for label in mat.col_labels], dtype=np.int64)
+            self.parts.append((mat.to_scipy_csr(), float(factor),
+                               row_map, col_map))
+        shape = (len(self.row_labels), len(self.col_labels))
+        self.row_scale = np.ones((shape[0],))
+        self.col_scale = np.ones((shape[1],))
+        LinearOperator.__init__(self, np.float64, shape)
+
+    @property
+    def nnz(self):
+        """
+        The number of entries in the matrices. Entries that overlap are
+        counted more than once.
+        """
+        return sum(part[0].nnz for part in self.parts)
+
+    def normalize_all(self):
+        """
+        Get a copy of this operator that is rescaled the way
+        `SparseMatrix.normalize_all` rescales a matrix: rows and columns are
+        divided by the square root of their Euclidean norm. The matrices
+        themselves aren't copied.
+        """
+        row_squares, col_squares = self._squared_norms()
+        result = self._copy()
+        result.row_scale = self.row_scale * _inv_root_norm(row_squares)
+        result.col_scale = self.col_scale * _inv_root_norm(col_squares)
+        return result
+
+    def _copy(self):
+        result = object.__new__(BlendOperator)
+        result.__dict__.update(self.__dict__)
+        return result
+
+    def _entries(self, part):
+        """
+        Get the rows, columns and blended values of the entries of one
+        matrix, in the union of the labels.
+        """
+        csr, factor, row_map, col_map = part
+        coo = csr.tocoo()
+        return (row_map[coo.row], col_map[coo.col],
+                coo.data * factor * self.row_scale[row_map[coo.row]]
+                * self.col_scale[col_map[coo.col]])
+
+    def _squared_norms(self):
+        """
+        The squared Euclidean norm of each row and column of the blend.
+        """
+        nrows, ncols = self.shape
+        row_squares = np.zeros((nrows,))
+        col_squares = np.zeros((ncols,))
+        for part in self.parts:
+            rows, cols, values = self._entries(part)
+            row_squares += np.bincount(rows, values ** 2, minlength=nrows)
+            col_squares += np.bincount(cols, values ** 2, minlength=ncols)
+
+        # Where two matrices have an entry in the same place, the blend has
+        # their sum, whose square has an extra 2ab.
+        for i in xrange(len(self.parts)):
+            for j in xrange(i + 1, len(self.parts)):
+                rows, cols, products = self._overlap(self.parts[i],
+                                                     self.parts[j])
+                row_squares += np.bincount(rows, 2 * products, minlength=nrows)
+                col_squares += np.bincount(cols, 2 * products, minlength=ncols)
+        return row_squares, col_squares
+
+    def _overlap(self, part1, part2):
+        """
+        Find the places where both matrices have an entry, returning their
+        rows, columns and the products of the two blended values.
+        """
+        nrows, ncols = self.shape
+        shared_rows = _mask(part1[2], nrows) & _mask(part2[2], nrows)
+        shared_cols = _mask(part1[3], ncols) & _mask(part2[3], ncols)
+
+        def shared_entries(part):
+            rows, cols, values = self._entries(part)
+            keep = shared_rows[rows] & shared_cols[cols]
+            keys = rows[keep] * ncols + cols[keep]
+            order = np.argsort(keys)
+            return keys[order], values[keep][order]
+        keys1, values1 = shared_entries(part1)
+        keys2, values2 = shared_entries(part2)
+        if len(keys1) == 0 or len(keys2) == 0:
+            empty = np.zeros((0,), dtype=np.int64)
+            return empty, empty, np.zeros((0,))
+        found = np.minimum(np.searchsorted(keys2, keys1), len(keys2) - 1)
+        both = keys2[found] == keys1
+        keys = keys1[both]
+        return keys // ncols, keys % ncols, values1[both] * values2[found[both]]
+
+    def _matmat(self, X):
+        X = np.asarray(X)
+        scaled = X * self.col_scale[:, np.newaxis]
+        result = np.zeros((self.shape[0], X.shape[1]))
+        for csr, factor, row_map, col_map in self.parts:
+            # Each label appears once in a matrix, so the rows don't collide.
+            result[row_map] += factor * (csr * scaled[col_map])
+        return result * self.row_scale[:, np.newaxis]
+
+    def _matvec(self, x):
+        return self._matmat(np.asarray(x).reshape(-1, 1)).ravel()
+
+    def _transpose(self):
+        result = object.__new__(BlendOperator)
+        LinearOperator.__init__(result, np.float64,
+                                (self.shape[1], self.shape[0]))
+        result.row_labels, result.col_labels = self.col_labels, self.row_labels
+        result.row_scale, result.col_scale = self.col_scale, self.row_scale
+        result.parts = [(csr.T, factor, col_map, row_map)
+                        for csr, factor, row_map, col_map in self.parts]
+        return result
+
+    # The values are real.
+    _adjoint = _transpose
+
+    def _rmatvec(self, x):
+        return self._transpose()._matvec(x)
+
+def _mask(indices, n):
+    mask = np.zeros((n,), dtype=np.bool_)
+    mask[indices] = True
+    return mask
+
+def _inv_root_norm(squares):
+    """
+    One over the square root of the norm, as in divisi2, except that empty
+    rows and columns are left at 0 instead of becoming infinite.
+    """
+    result = np.zeros(squares.shape)
+    nonzero = squares > 0
+    result[nonzero] = 1.0 / np.sqrt(np.sqrt(squares[nonzero]))
+    return result
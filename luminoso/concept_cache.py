@@ -0,0 +1,150 @@
+"""
+A cache of concepts extracted from documents, kept on disk so that documents
+that have not changed don't need to go through natural language processing
+again.
+
+Entries are keyed by a hash of the document (see Document.digest) plus a
+description of the NLP settings, not by the document's name or study. This means one cache
+directory can be shared by any number of studies (and processes); a corpus
+that appears in several studies only has to be processed once.
+"""
+from __future__ import with_statement
+import os
+import hashlib
+import logging
+import cPickle as pickle
+from luminoso.replace_file import replace_file
+logger = logging.getLogger('luminoso')
+
+# Bump this when the format of cached values changes.
+CACHE_VERSION = 1
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# When the cache grows past its maximum size, evict entries until it is
+# this fraction of the maximum, so we don't have to evict on every write.
+EVICT_TO = 0.8
+
+def text_hash(text):
+    """
+    The SHA-1 hash of a document's text, as a hex string.
+    """
+    if isinstance(text, unicode): text = text.encode('utf-8')
+    return hashlib.sha1(text).hexdigest()
+
+class ConceptCache(object):
+    """
+    A directory of pickled extraction results, one file per document.
+
+    `settings_key` is a string describing everything besides the text that
+    affects the results, such as the NLP settings. Changing it makes all
+    existing entries invisible (they will eventually be evicted).
+    """
+    def __init__(self, dir, settings_key, max_bytes=DEFAULT_MAX_BYTES):
+        self.dir = dir
+        self.settings_key = '%d:%s' % (CACHE_VERSION, settings_key)
+        self.max_bytes = max_bytes
+        self._size = None
+
+    def key(self, digest):
+        """
+        Get the cache key for a document with the given SHA-1 `digest`.
+        """
+        return hashlib.sha1(self.settings_key + '\0' + digest).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.dir, key[:2], key[2:] + '.pickle')
+
+    def get(self, key):
+        """
+        Get the value stored for `key`, or None if there isn't one.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+        # Mark this entry as recently used.
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value):
+        """
+        Store `value` under `key`, evicting old entries if the cache has
+        become too large.
+
+        The value is written to a temporary file and renamed into place, so
+        that other processes sharing the cache never see a partial entry.
+        """
+        path = self._path(key)
+        try:
+            subdir = os.path.dirname(path)
+            if not os.path.exists(subdir):
+                os.makedirs(subdir)
+            tmp_path = '%s.%d.tmp' % (path, os.getpid())
+            with open(tmp_path, 'wb') as out:
+                pickle.dump(value, out, -1)
+            nbytes = os.path.getsize(tmp_path)
+            try:
+                # An entry being replaced no longer counts.
+                nbytes -= os.path.getsize(path)
+            except OSError:
+                pass
+            replace_file(tmp_path, path)
+        except (IOError, OSError):
+            # A cache that can't be written to is just a slower cache.
+            logger.warn("Could not write to the concept cache in %s" % self.dir)
+            return
+        if self._size is None:
+            self._size = self.total_size()
+        else:
+            self._size += nbytes
+        if self._size > self.max_bytes:
+            self.evict(int(self.max_bytes * EVICT_TO))
+
+    def _entries(self):
+        """
+        List (mtime, size, path) for every entry in the cache.
+        """
+        entries = []
+        if not os.path.isdir(self.dir): return entries
+        for subdir in os.listdir(self.dir):
+            subpath = os.path.join(self.dir, subdir)
+            if not os.path.isdir(subpath): continue
+            for filename in os.listdir(subpath):
+                if not filename.endswith('.pickle'): continue
+                path = os.path.join(subpath, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    # another process evicted it
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def total_size(self):
+        """
+        The number of bytes used by all entries in the cache.
+        """
+        return sum(size for (mtime, size, path) in self._entries())
+
+    def evict(self, target_bytes):
+        """
+        Remove the least recently used entries until the cache takes up no
+        more than `target_bytes`.
+        """
+        entries = self._entries()
+        entries.sort()
+        size = sum(entry[1] for entry in entries)
+        for mtime, nbytes, path in entries:
+            if size <= target_bytes: break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size -= nbytes
+        self._size = size
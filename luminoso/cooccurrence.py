@@ -0,0 +1,287 @@
+"""
+Build the matrix of how concepts co-occur in a study's documents, using
+sparse matrix products instead of enumerating every pair of concepts.
+
+Each sentence becomes a row of a sparse "incidence" matrix S, whose entries
+are the total polarity of each concept in that sentence, and a row of C, which
+counts how many times each concept occurs in it. Each sentence also gets rows
+in "window" matrices W and D, which hold the same information for the concepts
+that came shortly before it (see `WINDOW_SIZE`).
+
+A pair of concepts in the same sentence is weighted by the product of their
+polarities. A pair between a sentence and its window is weighted by
+v1*v2/2 in integer division: 0 when the polarities agree, and -1 when they
+disagree. Summed over all pairs, that is (v1*v2 - 1)/2, so the association
+matrix is
+
+    offdiag(S^T S) + offdiag(X + X^T), where X = (S^T W - C^T D) / 2
+
+This adds up to exactly what enumerating every pair would, but the memory
+needed is proportional to the number of sentences in a chunk plus the number
+of non-zero entries in the result, not to the number of pairs.
+
+The result can also be pruned, to keep it small for large studies: pairs
+with a weight below `min_weight` can be dropped, and each concept can be
+limited to its `max_neighbors` strongest associations. With a memory budget
+(`max_megabytes`), the running total is compacted whenever it grows past the
+budget, by dropping its weakest pairs. That is an approximation: a pair that
+is dropped starts counting again from 0 if it occurs later.
+"""
+from collections import deque
+from itertools import izip
+from array import array
+import numpy as np
+from scipy import sparse
+
+from csc import divisi2
+
+# The number of recent concept occurrences that stay associated with later
+# sentences in the same document. Tags stay associated for the rest of the
+# document.
+WINDOW_SIZE = 100
+
+# How many sentences to collect before multiplying them into the result.
+CHUNK_SENTENCES = 20000
+
+# About how many bytes each entry of the running total or of the sentences
+# collected for a chunk takes, counting the temporary copies made when they
+# are added up.
+ENTRY_BYTES = 24
+
+class CooccurrenceBuilder(object):
+    """
+    Accumulates documents, given as the SentenceConcepts of each one, into a
+    co-occurrence matrix over the valid concepts. `valid` is a boolean array
+    that says which ids in `vocabulary` are valid.
+
+        >>> builder = CooccurrenceBuilder(vocabulary, valid)
+        >>> for doc in documents:
+        ...     builder.add_document(sentence_concepts[doc.name])
+        >>> assoc = builder.to_matrix()
+
+    `max_neighbors`, `min_weight` and `max_megabytes` prune the result; see
+    the top of this module. None means no limit.
+    """
+    def __init__(self, vocabulary, valid, chunk_sentences=CHUNK_SENTENCES,
+                 max_neighbors=None, min_weight=0, max_megabytes=None):
+        self.vocabulary = vocabulary
+        self.chunk_sentences = chunk_sentences
+        self.max_neighbors = max_neighbors
+        self.min_weight = min_weight
+        # Half of the budget is for the running total, and half for the
+        # sentences collected for the next chunk.
+        self.max_entries = None
+        if max_megabytes is not None:
+            self.max_entries = max(1, int(max_megabytes * 1024 * 1024)
+                                   // ENTRY_BYTES // 2)
+        # How many times the running total was compacted, and how many
+        # entries were dropped.
+        self.compactions = 0
+        self.pruned = 0
+        # The row and column of each valid id in the result, in the order
+        # the ids were first seen, or -1 for invalid ids and ids not seen
+        # yet. This is a list because it's looked up one id at a time.
+        self._columns = [-1] * len(vocabulary)
+        self._valid = [bool(v) for v in valid]
+        self.ids = array('i')
+        self.total = None
+        self._start_chunk()
+
+    def _start_chunk(self):
+        self.nrows = 0
+        self.s_rows, self.s_cols = array('i'), array('i')
+        self.s_values, self.s_counts = array('d'), array('d')
+        self.w_rows, self.w_cols = array('i'), array('i')
+        self.w_values, self.w_counts = array('d'), array('d')
+
+    def _column(self, cid):
+        """
+        Get the column of a concept id in the result, or -1 if it's not a
+        valid concept.
+        """
+        column = self._columns[cid]
+        if column < 0 and self._valid[cid]:
+            column = self._columns[cid] = len(self.ids)
+            self.ids.append(cid)
+        return column
+
+    def add_document(self, sentence_concepts):
+        # `recent` holds (column, value, is_tag) for concepts in the window
+        # that might fall out of it, oldest first. `window` holds the total
+        # value and the number of occurrences of each valid concept in the
+        # window, including old tags.
+        # Concepts added to the vocabulary since the valid ones were chosen
+        # aren't valid.
+        added = len(self.vocabulary) - len(self._valid)
+        if added > 0:
+            self._columns.extend([-1] * added)
+            self._valid.extend([False] * added)
+        is_tag = self.vocabulary.is_tag
+        recent = deque()
+        window = {}
+        for sentence_ids, values in sentence_concepts:
+            cols = [(self._column(cid), value, is_tag[cid])
+                    for cid, value in izip(sentence_ids, values)]
+            row = self.nrows
+            sentence = {}
+            for col, value, tag in cols:
+                if col >= 0:
+                    total, count = sentence.get(col, (0, 0))
+                    sentence[col] = (total + value, count + 1)
+            if sentence:
+                for col, (total, count) in sentence.iteritems():
+                    self.s_rows.append(row)
+                    self.s_cols.append(col)
+                    self.s_values.append(total)
+                    self.s_counts.append(count)
+                for col, (total, count) in window.iteritems():
+                    if count > 0:
+                        self.w_rows.append(row)
+                        self.w_cols.append(col)
+                        self.w_values.append(total)
+                        self.w_counts.append(count)
+                self.nrows += 1
+
+            # Remember tags, but forget words that were too long ago
+            while len(recent) > WINDOW_SIZE:
+                col, value, tag = recent.popleft()
+                if not tag and col >= 0:
+                    total, count = window[col]
+                    window[col] = (total - value, count - 1)
+            for col, value, tag in cols:
+                recent.append((col, value, tag))
+                if col >= 0:
+                    total, count = window.get(col, (0, 0))
+                    window[col] = (total + value, count + 1)
+
+            if self.nrows >= self.chunk_sentences or \
+               (self.max_entries is not None and
+                len(self.s_rows) + len(self.w_rows) >= self.max_entries):
+                self._flush()
+
+    def _flush(self):
+        """
+        Multiply the sentences collected so far into the running total.
+        """
+        if self.nrows == 0: return
+        shape = (self.nrows, len(self.ids))
+        def make(values, rows, cols):
+            return sparse.csr_matrix((np.frombuffer(values, dtype=np.float64),
+                                      (np.frombuffer(rows, dtype=np.int32),
+                                       np.frombuffer(cols, dtype=np.int32))),
+                                     shape=shape)
+        S = make(self.s_values, self.s_rows, self.s_cols)
+        C = make(self.s_counts, self.s_rows, self.s_cols)
+        W = make(self.w_values, self.w_rows, self.w_cols)
+        D = make(self.w_counts, self.w_rows, self.w_cols)
+        self._start_chunk()
+
+        cross = (S.T * W - C.T * D) * 0.5
+        chunk = S.T * S + cross + cross.T
+        self._add_to_total(chunk.tocsr())
+
+    def _add_to_total(self, chunk):
+        # More concepts may have been seen since the last chunk.
+        n = len(self.ids)
+        if self.total is None:
+            self.total = _resize(chunk, n)
+        else:
+            self.total = _resize(self.total, n) + _resize(chunk, n)
+        if self.max_entries is not None and self.total.nnz > self.max_entries:
+            self._compact()
+
+    def _compact(self):
+        """
+        Drop the weakest pairs from the running total, leaving it half as
+        big as the budget allows, so it has room to grow.
+        """
+        total = self.total.tocoo()
+        entries = (total.row != total.col) & (total.data != 0)
+        rows, cols, values = total.row[entries], total.col[entries], total.data[entries]
+        keep = strongest_pairs(rows, cols, values, self.max_entries // 2)
+        self.pruned += len(values) - np.sum(keep)
+        self.compactions += 1
+        self.total = sparse.csr_matrix(
+          (values[keep], (rows[keep], cols[keep])), shape=total.shape)
+
+    def to_matrix(self):
+        """
+        Get the co-occurrence matrix as a square divisi2 SparseMatrix, or
+        None if no valid concepts co-occurred.
+        """
+        self._flush()
+        if self.total is None: return None
+        total = self.total.tocoo()
+        keep = (total.row != total.col) & (total.data != 0)
+        entries = np.sum(keep)
+        if self.min_weight:
+            keep &= np.abs(total.data) >= self.min_weight
+        if self.max_neighbors is not None:
+            keep = strongest_neighbors(total.row, total.col, total.data,
+                                       keep, self.max_neighbors)
+        self.pruned += entries - np.sum(keep)
+        if not np.any(keep): return None
+        # Only concepts that are associated with something get a row and a
+        # column. The matrix is symmetric, so they are the same concepts.
+        present = np.unique(total.row[keep])
+        index = np.zeros((len(self.ids),), dtype=np.int64)
+        index[present] = np.arange(len(present))
+        result = divisi2.SparseMatrix.from_lists(
+            total.data[keep], index[total.row[keep]], index[total.col[keep]],
+            nrows=len(present), ncols=len(present))
+        labels = self.vocabulary.ordered_set(np.asarray(self.ids)[present])
+        result.row_labels = labels
+        result.col_labels = labels
+        return result
+
+def strongest_pairs(rows, cols, values, n):
+    """
+    Given the off-diagonal entries of a symmetric matrix as coordinate
+    arrays, find at most `n` of them with the largest absolute values.
+    Entries (i, j) and (j, i) are kept or dropped together. Ties are broken
+    by the indices of the pair, because partial counts are often tied.
+
+    Returns a boolean mask over the entries.
+    """
+    keep = np.zeros(len(values), dtype=np.bool_)
+    order = np.lexsort((np.maximum(rows, cols), np.minimum(rows, cols),
+                        -np.abs(values)))
+    keep[order[:max(n - n % 2, 0)]] = True
+    return keep
+
+def strongest_neighbors(rows, cols, values, candidates, k):
+    """
+    Given the entries of a symmetric matrix as coordinate arrays, find the
+    ones that are among the `k` strongest `candidates` in their row, or in
+    their column. Keeping either keeps the matrix symmetric, though some
+    concepts end up with more than `k` neighbors.
+
+    Returns a boolean mask over the entries.
+    """
+    indices = np.flatnonzero(candidates)
+    # Sort the candidates by row, strongest first within each row, and
+    # find the rank of each one in its row.
+    order = indices[np.lexsort((-np.abs(values[indices]), rows[indices]))]
+    sorted_rows = rows[order]
+    row_starts = np.searchsorted(sorted_rows, sorted_rows)
+    top = np.zeros(len(rows), dtype=np.bool_)
+    top[order[np.arange(len(order)) - row_starts < k]] = True
+
+    # Find the entry for the same pair the other way around.
+    n = max(np.max(rows), np.max(cols)) + 1 if len(rows) else 0
+    keys = rows.astype(np.int64) * n + cols
+    transposed_keys = cols.astype(np.int64) * n + rows
+    by_key = np.argsort(keys)
+    found = np.minimum(np.searchsorted(keys[by_key], transposed_keys),
+                       len(keys) - 1)
+    partner = by_key[found]
+    has_partner = keys[partner] == transposed_keys
+    return candidates & (top | (has_partner & top[partner]))
+
+def _resize(mat, n):
+    """
+    Pad a sparse matrix with empty rows and columns to make it n by n.
+    """
+    if mat.shape == (n, n): return mat
+    coo = mat.tocoo()
+    return sparse.csr_matrix((coo.data, (coo.row, coo.col)), shape=(n, n))
@@ -0,0 +1,47 @@
+"""
+Density rendering for SVDViewer, for when there are too many points on the
+screen to draw each one.
+
+Instead of writing each point's color into the pixel buffer, where
+overlapping points overwrite each other, the points are counted into a
+histogram with one bin per pixel. Each pixel gets the average color of the
+points in it, brightened according to how many there are.
+"""
+import numpy as np
+
+# How bright a pixel with a single point in it is, relative to the most
+# crowded pixel on the screen.
+MIN_BRIGHTNESS = 0.4
+
+def density_image(points, colors, width, height):
+    """
+    Render `points`, an (n, 2) array of integer screen coordinates, into a
+    (height, width, c) array of uint8 pixels, where `colors` is an (n, c)
+    array of colors from 0 to 255. Points off the screen are ignored.
+
+    Brightness grows with the logarithm of the number of points in a pixel,
+    so that dense areas stand out without washing out everything else.
+    """
+    points = np.asarray(points)
+    colors = np.asarray(colors, dtype=np.float64)
+    nchannels = colors.shape[1]
+    x, y = points[:, 0], points[:, 1]
+    on_screen = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+    bins = y[on_screen] * width + x[on_screen]
+    npixels = width * height
+
+    counts = np.bincount(bins, minlength=npixels)
+    image = np.zeros((npixels, nchannels), dtype=np.float64)
+    for channel in xrange(nchannels):
+        image[:, channel] = np.bincount(bins, weights=colors[on_screen, channel],
+                                        minlength=npixels)
+
+    filled = counts > 0
+    log_counts = np.log(counts[filled])
+    most = log_counts.max() if len(log_counts) else 0.0
+    if most > 0:
+        brightness = MIN_BRIGHTNESS + (1 - MIN_BRIGHTNESS) * log_counts / most
+    else:
+        brightness = np.ones(log_counts.shape)
+    image[filled] *= (brightness / counts[filled])[:, np.newaxis]
+    return np.uint8(np.clip(image, 0, 255)).reshape(height, width, nchannels)
@@ -0,0 +1,161 @@
+"""
+Measure how long each stage of an analysis takes and how much memory it
+uses.
+
+Code that does a stage of work wraps it in `Instrumentation.stage`:
+
+    >>> with study.instrumentation.stage('svd', k=50) as sizes:
+    ...     U, S, V = matrix.svd(k=50)
+    ...     sizes['rows'] = U.shape[0]
+
+This sends a 'start' event when the stage begins and an 'end' event when it
+finishes to every sink, which is any callable that takes an event
+dictionary. An 'end' event looks like:
+
+    {'event': 'end', 'stage': 'svd', 'time': 1287380000.0,
+     'wall_seconds': 2.5, 'cpu_seconds': 2.4,
+     'peak_rss_kb': 512000, 'peak_rss_delta_kb': 120000,
+     'sizes': {'k': 50, 'rows': 30000}, 'error': None}
+
+`peak_rss_delta_kb` is how much the process's peak memory use grew during
+the stage, which is 0 if the stage didn't use more memory than something
+before it. Memory is only measured where the `resource` module exists (not on
+Windows); elsewhere the memory fields are None.
+"""
+from __future__ import with_statement
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def peak_rss_kb():
+    """
+    The peak resident memory of this process so far, in kilobytes, or None
+    if it can't be measured.
+    """
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # Mac OS reports bytes instead of kilobytes.
+        peak //= 1024
+    return peak
+
+def cpu_seconds():
+    """
+    The CPU time used by this process and the child processes it has waited
+    for, such as finished workers.
+    """
+    times = os.times()
+    return times[0] + times[1] + times[2] + times[3]
+
+class Instrumentation(object):
+    """
+    Sends events about the stages of an analysis to a list of sinks, and
+    remembers the 'end' event of every stage.
+    """
+    def __init__(self, sinks=None):
+        self.sinks = list(sinks or [])
+        self.stages = []
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def remove_sink(self, sink):
+        self.sinks.remove(sink)
+
+    def emit(self, event):
+        for sink in self.sinks:
+            sink(event)
+
+    @contextmanager
+    def stage(self, name, **sizes):
+        """
+        Measure the stage of work done in a `with` block. Keyword arguments,
+        and anything added to the dictionary this yields, are reported as
+        the sizes of the stage.
+        """
+        self.emit({'event': 'start', 'stage': name, 'time': time.time(),
+                   'sizes': dict(sizes)})
+        start_wall = time.time()
+        start_cpu = cpu_seconds()
+        start_rss = peak_rss_kb()
+        error = None
+        try:
+            try:
+                yield sizes
+            except Exception, e:
+                error = '%s: %s' % (e.__class__.__name__, e)
+                raise
+        finally:
+            end_rss = peak_rss_kb()
+            rss_delta = None
+            if start_rss is not None:
+                rss_delta = end_rss - start_rss
+            event = {'event': 'end', 'stage': name, 'time': time.time(),
+                     'wall_seconds': time.time() - start_wall,
+                     'cpu_seconds': cpu_seconds() - start_cpu,
+                     'peak_rss_kb': end_rss,
+                     'peak_rss_delta_kb': rss_delta,
+                     'sizes': dict(sizes),
+                     'error': error}
+            self.stages.append(event)
+            self.emit(event)
+
+    def timings(self):
+        """
+        Get the 'end' events of all the stages so far, in the order they
+        finished.
+        """
+        return list(self.stages)
+
+    def clear(self):
+        """
+        Forget the stages so far, so that the timings only describe the
+        work that comes next. The sinks stay attached.
+        """
+        self.stages = []
+
+    def save(self, filename):
+        with open(filename, 'w') as out:
+            json.dump({'version': 1, 'stages': self.timings()}, out, indent=1)
+
+class JSONLogSink(object):
+    """
+    A sink that appends each event to a file as a line of JSON.
+    """
+    def __init__(self, filename, events=('start', 'end')):
+        self.filename = filename
+        self.events = events
+
+    def __call__(self, event):
+        if event['event'] not in self.events: return
+        with open(self.filename, 'a') as out:
+            out.write(json.dumps(event) + '\n')
+
+class Collector(object):
+    """
+    A sink that keeps every event in a list, for looking at them in the same
+    process.
+    """
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, event):
+        self.events.append(event)
+
+    def ends(self, stage=None):
+        """
+        Get the 'end' events, optionally only those of the named stage.
+        """
+        return [event for event in self.events if event['event'] == 'end'
+                and (stage is None or event['stage'] == stage)]
@@ -0,0 +1,185 @@
+"""
+A record of the input files a study was analyzed from, so that we can tell
+whether its results are out of date without reading every document.
+
+For each document, canonical document and matrix, the manifest records its
+size, modification time and SHA-1 hash. It also records a hash of the
+study's settings, since changing them makes the results out of date too. Scanning a study directory against
+an earlier manifest only hashes the files whose size or modification time
+changed; the rest keep their earlier entries, including anything else that
+was recorded about them.
+"""
+from __future__ import with_statement
+import os
+import sys
+import hashlib
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+MANIFEST_VERSION = 1
+
+# The directories of a study that hold its inputs, the kind of input in each,
+# and the file extension that inputs have. A reference to a matrix in the
+# shared matrix store (see matrix_store.py) is an input like a matrix file.
+INPUT_DIRS = [('Documents', 'document', '.txt'),
+              ('Canonical', 'canonical', '.txt'),
+              ('Matrices', 'matrix', '.smat'),
+              ('Matrices', 'matrix', '.smat.ref')]
+
+def file_hash(filename):
+    """
+    The SHA-1 hash of a file's contents, as a hex string.
+    """
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        while True:
+            block = f.read(1 << 20)
+            if not block: break
+            sha1.update(block)
+    return sha1.hexdigest()
+
+def input_path(dirname, filename):
+    """
+    The key that a manifest uses for the file `filename` in the study
+    subdirectory `dirname`.
+    """
+    path = dirname + '/' + filename
+    if isinstance(path, str):
+        return path.decode(sys.getfilesystemencoding() or 'utf-8', 'replace')
+    return path
+
+class Manifest(object):
+    """
+    Maps the path of each input file, relative to the study directory and
+    separated with '/', to a dictionary of facts about it: 'kind', 'size',
+    'mtime' and 'sha1', for documents whose text has been read,
+    'encoding', and for matrices that have been loaded, 'shape'.
+
+    `settings` is a hash of the settings the study is analyzed with, or None
+    if they aren't known.
+    """
+    def __init__(self, files=None, settings=None):
+        if files is None: files = {}
+        self.files = files
+        self.settings = settings
+
+    @classmethod
+    def scan(cls, study_dir, previous=None, settings=None):
+        """
+        Make a manifest of the inputs in `study_dir`, reusing the entries of
+        the `previous` manifest for files that don't appear to have changed.
+        `settings` is the hash of the study's current settings.
+        """
+        files = {}
+        for dirname, kind, extension in INPUT_DIRS:
+            dirpath = os.path.join(study_dir, dirname)
+            if not os.path.isdir(dirpath): continue
+            for filename in os.listdir(dirpath):
+                if not filename.endswith(extension): continue
+                path = input_path(dirname, filename)
+                fullpath = os.path.join(dirpath, filename)
+                st = os.stat(fullpath)
+                entry = None
+                if previous is not None:
+                    entry = previous.files.get(path)
+                if (entry is None or entry['kind'] != kind
+                    or entry['size'] != st.st_size
+                    or entry['mtime'] != st.st_mtime):
+                    entry = {'kind': kind, 'size': st.st_size,
+                             'mtime': st.st_mtime,
+                             'sha1': file_hash(fullpath)}
+                files[path] = entry
+        return cls(files, settings)
+
+    def _current_entry(self, dirname, filename):
+        """
+        Get the entry for the file `filename` in the study subdirectory
+        `dirname`, or None if there isn't one or the file appears to have
+        changed since it was made.
+        """
+        entry = self.files.get(input_path(dirname, os.path.basename(filename)))
+        if entry is None: return None
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+        if entry['size'] != st.st_size or entry['mtime'] != st.st_mtime:
+            return None
+        return entry
+
+    def get_hash(self, dirname, filename):
+        """
+        Get the recorded SHA-1 hash of an input file, or None if it has
+        changed since it was recorded.
+        """
+        entry = self._current_entry(dirname, filename)
+        if entry is None: return None
+        return entry['sha1']
+
+    def get_encoding(self, dirname, filename):
+        """
+        Get the recorded character encoding of a document, or None if it
+        isn't known or the file has changed since it was recorded.
+        """
+        entry = self._current_entry(dirname, filename)
+        if entry is None: return None
+        return entry.get('encoding')
+
+    def set_encoding(self, dirname, filename, encoding):
+        """
+        Record the character encoding of a document that is in the manifest.
+        """
+        entry = self.files.get(input_path(dirname, os.path.basename(filename)))
+        if entry is not None:
+            entry['encoding'] = encoding
+
+    def get_shape(self, dirname, filename):
+        """
+        Get the recorded shape of a matrix, or None if it isn't known or the
+        file has changed since it was recorded.
+        """
+        entry = self._current_entry(dirname, filename)
+        if entry is None or 'shape' not in entry: return None
+        return tuple(entry['shape'])
+
+    def set_shape(self, dirname, filename, shape):
+        """
+        Record the shape of a matrix that is in the manifest.
+        """
+        entry = self.files.get(input_path(dirname, os.path.basename(filename)))
+        if entry is not None:
+            entry['shape'] = list(shape)
+
+    def contents(self):
+        """
+        Get a dictionary from path to (kind, sha1), which is the same for
+        two manifests exactly when they describe the same inputs.
+        """
+        return dict((path, (entry['kind'], entry['sha1']))
+                    for path, entry in self.files.items())
+
+    def same_contents(self, other):
+        return (self.contents() == other.contents() and
+                self.settings == other.settings)
+
+    def save(self, filename):
+        with open(filename, 'w') as out:
+            json.dump({'version': MANIFEST_VERSION, 'files': self.files,
+                       'settings': self.settings}, out)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Load a manifest saved with `save`. Returns None if there is no
+        usable manifest there.
+        """
+        try:
+            with open(filename) as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return None
+        if data.get('version') != MANIFEST_VERSION: return None
+        return cls(data['files'], data.get('settings'))
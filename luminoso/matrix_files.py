@@ -0,0 +1,158 @@
+"""
+Save and load labeled matrices as raw arrays, so that loading them means
+memory-mapping a few files instead of unpickling everything into RAM.
+
+A dense matrix or vector saved under `name` is stored as `name.npy`. A
+SparseMatrix is stored as the three arrays of its CSR form, `name.data.npy`,
+`name.indices.npy` and `name.indptr.npy`, plus its shape in `name.shape.npy`.
+Row labels go in `name.rows.*` and column labels (or the labels of a vector)
+in `name.cols.*`:
+
+    name.cols.utf8          all the labels, UTF-8 encoded, one after another
+    name.cols.offsets.npy   where each label starts and ends in that buffer
+    name.cols.bytes.npy     which labels were byte strings, not unicode
+
+Arrays are memory-mapped copy-on-write: pages are read from disk only when
+they are used, processes that open the same results share them in the page
+cache, and code that modifies a matrix in place (like the SVDViewer's
+jitter) gets private copies of the pages it touches without changing the
+files. For the same reason, files are never overwritten in place: each one
+is written under a temporary name and renamed over the old one, so that
+results which are still mapped keep reading the old file.
+"""
+from __future__ import with_statement
+import os
+import numpy as np
+
+from csc import divisi2
+from csc.divisi2.ordered_set import OrderedSet
+from luminoso.replace_file import replace_file
+
+MMAP_MODE = 'c'
+
+def _path(dir, name, suffix):
+    return os.path.join(dir, name + suffix)
+
+def _write_file(path, write):
+    """
+    Replace the file at `path` with one written by `write(out)`.
+    """
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as out:
+        write(out)
+    replace_file(temp_path, path)
+
+def _save_array(dir, name, suffix, array):
+    _write_file(_path(dir, name, suffix), lambda out: np.save(out, array))
+
+def _load_array(dir, name, suffix, mmap=True, mmap_mode=MMAP_MODE):
+    path = _path(dir, name, suffix)
+    if mmap:
+        try:
+            return np.load(path, mmap_mode=mmap_mode)
+        except ValueError:
+            # numpy can't memory-map an array with no entries
+            pass
+    return np.load(path)
+
+def save_labels(dir, name, labels):
+    """
+    Save a sequence of labels as a UTF-8 buffer plus offsets. Does nothing if
+    `labels` is None.
+    """
+    if labels is None: return
+    encoded = []
+    is_bytes = np.zeros((len(labels),), dtype=np.bool_)
+    for i, label in enumerate(labels):
+        if isinstance(label, unicode):
+            encoded.append(label.encode('utf-8'))
+        else:
+            encoded.append(str(label))
+            is_bytes[i] = True
+    offsets = np.zeros((len(encoded) + 1,), dtype=np.int64)
+    offsets[1:] = np.cumsum([len(e) for e in encoded])
+    _write_file(_path(dir, name, '.utf8'),
+                lambda out: out.write(''.join(encoded)))
+    _save_array(dir, name, '.offsets.npy', offsets)
+    _save_array(dir, name, '.bytes.npy', is_bytes)
+
+def load_labels(dir, name):
+    """
+    Load labels saved by `save_labels` as an OrderedSet, or None if there
+    aren't any.
+    """
+    if not os.path.exists(_path(dir, name, '.utf8')): return None
+    with open(_path(dir, name, '.utf8'), 'rb') as f:
+        buf = f.read()
+    offsets = np.load(_path(dir, name, '.offsets.npy')).tolist()
+    is_bytes = np.load(_path(dir, name, '.bytes.npy')).tolist()
+    labels = []
+    for i in xrange(len(offsets) - 1):
+        label = buf[offsets[i]:offsets[i+1]]
+        if not is_bytes[i]: label = label.decode('utf-8')
+        labels.append(label)
+    return OrderedSet(labels)
+
+def save_dense(dir, name, matrix):
+    """
+    Save a DenseMatrix, DenseVector or plain ndarray.
+    """
+    _save_array(dir, name, '.npy', np.asarray(matrix))
+    if matrix.ndim == 1:
+        save_labels(dir, name + '.cols', getattr(matrix, 'labels', None))
+    else:
+        save_labels(dir, name + '.rows', getattr(matrix, 'row_labels', None))
+        save_labels(dir, name + '.cols', getattr(matrix, 'col_labels', None))
+
+def load_dense(dir, name, mmap=True):
+    """
+    Load a matrix saved by `save_dense`, memory-mapped unless `mmap` is
+    false. Vectors without labels come back as plain ndarrays.
+    """
+    array = _load_array(dir, name, '.npy', mmap)
+    if array.ndim == 1:
+        labels = load_labels(dir, name + '.cols')
+        if labels is None: return array
+        return divisi2.DenseVector(array, labels)
+    return divisi2.DenseMatrix(array, load_labels(dir, name + '.rows'),
+                               load_labels(dir, name + '.cols'))
+
+def save_sparse(dir, name, matrix):
+    """
+    Save a divisi2 SparseMatrix in CSR form.
+    """
+    csr = matrix.to_scipy_csr()
+    csr.sort_indices()
+    _save_array(dir, name, '.data.npy', csr.data)
+    _save_array(dir, name, '.indices.npy', csr.indices)
+    _save_array(dir, name, '.indptr.npy', csr.indptr)
+    _save_array(dir, name, '.shape.npy', np.array(csr.shape))
+    save_labels(dir, name + '.rows', matrix.row_labels)
+    save_labels(dir, name + '.cols', matrix.col_labels)
+
+def load_csr(dir, name, mmap=True, mmap_mode=MMAP_MODE):
+    """
+    Get the (data, indices, indptr) arrays of a sparse matrix saved by
+    `save_sparse`, memory-mapped unless `mmap` is false. Pass
+    `mmap_mode='r'` to map them read-only instead of copy-on-write.
+    """
+    return (_load_array(dir, name, '.data.npy', mmap, mmap_mode),
+            _load_array(dir, name, '.indices.npy', mmap, mmap_mode),
+            _load_array(dir, name, '.indptr.npy', mmap, mmap_mode))
+
+def load_sparse(dir, name):
+    """
+    Load a SparseMatrix saved by `save_sparse`. Divisi keeps sparse matrices
+    in its own format, so unlike dense matrices this reads the whole matrix.
+    """
+    data, indices, indptr = load_csr(dir, name)
+    nrows, ncols = np.load(_path(dir, name, '.shape.npy')).tolist()
+    rows = np.repeat(np.arange(nrows), np.diff(indptr))
+    matrix = divisi2.SparseMatrix.from_lists(
+        np.asarray(data, dtype=np.float64), rows,
+        np.asarray(indices, dtype=np.int64), nrows=nrows, ncols=ncols)
+    row_labels = load_labels(dir, name + '.rows')
+    col_labels = load_labels(dir, name + '.cols')
+    matrix.row_labels = row_labels
+    matrix.col_labels = col_labels
+    return matrix
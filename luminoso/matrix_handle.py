@@ -0,0 +1,82 @@
+"""
+Handles on the matrices in a study's Matrices directory, so that opening a
+study doesn't load matrices that its analysis won't use.
+
+Studies collect matrices over time, but an association blend only uses the
+`.assoc.smat` ones. A MatrixHandle knows the name, kind and digest of a
+matrix, and its shape if that was recorded, and loads the matrix the first
+time `load` is called.
+"""
+import numpy as np
+
+# Roughly how much memory each entry of a loaded sparse matrix takes: its
+# value, its column index and the bookkeeping around them.
+SPARSE_ENTRY_BYTES = 16
+
+def matrix_kind(name):
+    """
+    The kind of matrix a file in Matrices holds: 'assoc' for association
+    matrices, which are blended with the association matrix of the
+    documents, and 'matrix' for anything else, which is blended with the
+    documents matrix.
+    """
+    if name.endswith('.assoc.smat'): return 'assoc'
+    return 'matrix'
+
+def matrix_digest(matrix):
+    """
+    The digest of a matrix or MatrixHandle, or None if it doesn't have one
+    (such as a matrix made in memory).
+    """
+    return getattr(matrix, 'digest', None)
+
+def matrix_nbytes(matrix):
+    """
+    Roughly how many bytes of memory a loaded matrix takes up, for deciding
+    how many matrices a cache can hold.
+    """
+    if isinstance(matrix, np.ndarray): return matrix.nbytes
+    return matrix.nnz * SPARSE_ENTRY_BYTES
+
+class MatrixHandle(object):
+    """
+    A matrix that is loaded by calling `loader` when it's first needed.
+
+    `digest` identifies the contents of the matrix. It can be given as a
+    function to call the first time it's needed, for digests that take a
+    while to compute. `shape` is None if it won't be known until the matrix
+    is loaded.
+    """
+    def __init__(self, name, loader, digest=None, shape=None, filename=None):
+        self.name = name
+        self.kind = matrix_kind(name)
+        self.filename = filename
+        self.shape = shape
+        self._loader = loader
+        self._digest = digest
+        self._matrix = None
+
+    @property
+    def digest(self):
+        if callable(self._digest):
+            self._digest = self._digest()
+        return self._digest
+
+    @property
+    def loaded(self):
+        return self._matrix is not None
+
+    def load(self):
+        """
+        Get the matrix, loading it the first time.
+        """
+        if self._matrix is None:
+            self._matrix = self._loader()
+            self.shape = tuple(self._matrix.shape)
+        return self._matrix
+
+    def __repr__(self):
+        if self.shape is None: shape = 'unknown shape'
+        else: shape = '%d by %d' % self.shape
+        return '<MatrixHandle %s (%s, %s%s)>' % (
+            self.name, self.kind, shape, '' if self.loaded else ', not loaded')
@@ -0,0 +1,245 @@
+"""
+A content-addressed store of large matrices, such as ConceptNet, shared by
+every study on a machine.
+
+Instead of its own copy of a matrix, a study's Matrices directory can hold a
+small reference file, `name.smat.ref`, that names the matrix by the SHA-1
+hash of the .smat file it came from. The store keeps each matrix once, in
+its own directory named by that hash, as the CSR arrays written by
+`matrix_files.save_sparse`. Those arrays are memory-mapped read-only, so
+every analysis, batch worker and GUI session that uses the matrix shares one
+copy of it in the page cache, and opening a study doesn't unpickle it.
+
+The store is in $LUMINOSO_MATRIX_STORE, or ~/.luminoso/matrices by default.
+"""
+from __future__ import with_statement
+import os
+import shutil
+import tempfile
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import aslinearoperator
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from csc import divisi2
+from luminoso import matrix_files
+from luminoso.manifest import file_hash
+from luminoso.svd_engines import operator_svd
+
+STORE_VERSION = 1
+
+REFERENCE_SUFFIX = '.ref'
+
+def default_store_dir():
+    return (os.environ.get('LUMINOSO_MATRIX_STORE') or
+            os.path.join(os.path.expanduser('~'), '.luminoso', 'matrices'))
+
+def write_reference(filename, digest):
+    """
+    Write a reference file that stands for the stored matrix `digest`.
+    """
+    with open(filename, 'w') as out:
+        json.dump({'version': STORE_VERSION, 'digest': digest}, out)
+
+def read_reference(filename):
+    """
+    Get the digest of the matrix that a reference file stands for.
+    """
+    with open(filename) as f:
+        try:
+            return json.load(f)['digest']
+        except (ValueError, KeyError):
+            raise IOError("%s is not a matrix reference" % filename)
+
+class MatrixStore(object):
+    """
+    A directory of matrices, each in a subdirectory named by its digest.
+    Matrices are written to a temporary directory and renamed into place, so
+    several processes can add the same matrix at once.
+    """
+    def __init__(self, dir=None):
+        if dir is None: dir = default_store_dir()
+        self.dir = dir
+
+    def _path(self, digest):
+        return os.path.join(self.dir, digest)
+
+    def __contains__(self, digest):
+        return os.path.exists(os.path.join(self._path(digest), 'meta.json'))
+
+    def add_file(self, filename, digest=None):
+        """
+        Add the matrix saved with `divisi2.save` in `filename`, unless it's
+        already there, and return its digest.
+        """
+        if digest is None: digest = file_hash(filename)
+        if digest not in self:
+            self.add(divisi2.load(filename), digest)
+        return digest
+
+    def add(self, matrix, digest):
+        """
+        Store a labeled SparseMatrix under `digest`.
+        """
+        if not os.path.isdir(self.dir): os.makedirs(self.dir)
+        tmpdir = tempfile.mkdtemp(prefix='.tmp-', dir=self.dir)
+        try:
+            matrix_files.save_sparse(tmpdir, 'matrix', matrix)
+            with open(os.path.join(tmpdir, 'meta.json'), 'w') as out:
+                json.dump({'version': STORE_VERSION, 'shape': matrix.shape,
+                           'nnz': matrix.nnz}, out)
+            try:
+                os.rename(tmpdir, self._path(digest))
+            except OSError:
+                # Another process stored it first.
+                if digest not in self: raise
+        finally:
+            if os.path.exists(tmpdir): shutil.rmtree(tmpdir)
+
+    def metadata(self, digest):
+        """
+        Get the 'shape' and 'nnz' of a stored matrix without loading it, or
+        None if it isn't stored.
+        """
+        try:
+            with open(os.path.join(self._path(digest), 'meta.json')) as f:
+                meta = json.load(f)
+        except (IOError, ValueError):
+            return None
+        meta['shape'] = tuple(meta['shape'])
+        return meta
+
+    def load(self, digest):
+        """
+        Get the stored matrix `digest` as a StoredMatrix.
+        """
+        if digest not in self:
+            raise IOError("The matrix %s is not in the matrix store %s"
+                          % (digest, self.dir))
+        return StoredMatrix(self._path(digest), digest)
+
+class StoredMatrix(object):
+    """
+    A read-only, labeled sparse matrix whose CSR arrays are memory-mapped
+    from the store.
+
+    `to_scipy_csr` returns the shared arrays without copying them, which is
+    what the implicit blend and the neighborhood index use. The operations
+    that divisi2's `blend` and the analysis need, like `named_lists` and
+    `normalize_all`, also work directly on the stored arrays. For anything
+    else, ask for a private divisi2 SparseMatrix with `to_sparse`; a
+    StoredMatrix doesn't quietly make one.
+    """
+    def __init__(self, dir, digest):
+        self.dir = dir
+        self.digest = digest
+        data, indices, indptr = matrix_files.load_csr(dir, 'matrix',
+                                                      mmap_mode='r')
+        shape = tuple(np.load(os.path.join(dir, 'matrix.shape.npy')).tolist())
+        self._csr = sparse.csr_matrix((data, indices, indptr), shape=shape,
+                                      copy=False)
+        self.row_labels = matrix_files.load_labels(dir, 'matrix.rows')
+        self.col_labels = matrix_files.load_labels(dir, 'matrix.cols')
+        self._sparse = None
+
+    @property
+    def shape(self):
+        return self._csr.shape
+
+    @property
+    def nnz(self):
+        return self._csr.nnz
+
+    def to_scipy_csr(self):
+        """
+        Get the matrix as a SciPy csr_matrix that shares the stored arrays.
+        It must not be modified.
+        """
+        return self._csr
+
+    def svd(self, k=50):
+        """
+        Compute a truncated SVD from the stored arrays, as divisi2's `svd`
+        would.
+        """
+        operator = aslinearoperator(self._csr)
+        operator.row_labels = self.row_labels
+        operator.col_labels = self.col_labels
+        return operator_svd(operator, k)
+
+    def _rows(self):
+        """
+        The row index of each stored entry, in order.
+        """
+        csr = self._csr
+        return np.repeat(np.arange(csr.shape[0]), np.diff(csr.indptr))
+
+    def _divisi_matrix(self, data):
+        """
+        Make a divisi2 SparseMatrix with this matrix's labels and sparsity,
+        holding the values `data`.
+        """
+        csr = self._csr
+        matrix = divisi2.SparseMatrix.from_lists(
+            np.asarray(data, dtype=np.float64), self._rows(),
+            np.asarray(csr.indices, dtype=np.int64),
+            nrows=csr.shape[0], ncols=csr.shape[1])
+        matrix.row_labels = self.row_labels
+        matrix.col_labels = self.col_labels
+        return matrix
+
+    def entry_named(self, row_label, col_label):
+        "Get the entry with a given row and column label."
+        return self._csr[self.row_labels.index(row_label),
+                         self.col_labels.index(col_label)]
+
+    def named_lists(self):
+        """
+        Get the entries as lists of values, row labels and column labels, as
+        divisi2's SparseMatrix.named_lists does. This is how `blend` reads
+        the matrices it blends.
+        """
+        rows, cols = self.row_labels, self.col_labels
+        return (self._csr.data.tolist(),
+                [rows[row] for row in self._rows()],
+                [cols[col] for col in self._csr.indices])
+
+    def normalize_all(self):
+        """
+        Get a divisi2 SparseMatrix of this matrix with each entry divided by
+        the square roots of the Euclidean norms of its row and its column,
+        as divisi2's SparseMatrix.normalize_all does.
+        """
+        csr = self._csr
+        squares = csr.multiply(csr)
+        row_norms = np.sqrt(np.asarray(squares.sum(axis=1)).ravel())
+        col_norms = np.sqrt(np.asarray(squares.sum(axis=0)).ravel())
+        old_settings = np.seterr(divide='ignore')
+        try:
+            row_scale = 1.0 / np.sqrt(row_norms)
+            col_scale = 1.0 / np.sqrt(col_norms)
+        finally:
+            np.seterr(**old_settings)
+        data = csr.data * row_scale[self._rows()] * col_scale[csr.indices]
+        return self._divisi_matrix(data)
+
+    def to_sparse(self):
+        """
+        Get a divisi2 SparseMatrix copy of the matrix.
+        """
+        if self._sparse is None:
+            self._sparse = self._divisi_matrix(self._csr.data)
+        return self._sparse
+
+    def __getattr__(self, name):
+        if name.startswith('_'): raise AttributeError(name)
+        raise AttributeError("A StoredMatrix has no %r; use to_sparse() to "
+                             "get a copy that does" % name)
+
+    def __repr__(self):
+        return '<StoredMatrix %s: %d by %d, %d entries>' % (
+            self.digest, self.shape[0], self.shape[1], self.nnz)
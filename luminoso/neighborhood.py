@@ -0,0 +1,132 @@
+"""
+Find the part of a large association matrix, such as ConceptNet, that is
+near a study's concepts, so that only that part has to be blended and
+factored.
+
+An AdjacencyIndex holds the matrix in compressed sparse row form: the
+neighbors of concept i are `indices[indptr[i]:indptr[i+1]]`, strongest
+first. Building it takes time proportional to the size of the matrix, but
+it only has to be built once per matrix (see `adjacency_index`). After
+that, finding a neighborhood and extracting it take time proportional to
+the size of the neighborhood.
+"""
+import weakref
+import numpy as np
+from scipy import sparse
+
+from csc import divisi2
+from csc.divisi2.ordered_set import OrderedSet
+
+class AdjacencyIndex(object):
+    """
+    The rows of a square association matrix, with the neighbors in each row
+    sorted by the absolute value of their weight, strongest first.
+    """
+    def __init__(self, labels, indptr, indices, data):
+        self.labels = labels
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    @classmethod
+    def from_matrix(cls, matrix):
+        csr = matrix.to_scipy_csr()
+        if matrix.col_labels != matrix.row_labels:
+            # Number the columns the same way as the rows.
+            rows = matrix.row_labels
+            col_rows = np.array([rows.index(label) if label in rows else -1
+                                 for label in matrix.col_labels])
+            coo = csr.tocoo()
+            cols = col_rows[coo.col]
+            keep = cols >= 0
+            csr = sparse.csr_matrix((coo.data[keep], (coo.row[keep], cols[keep])),
+                                    shape=(len(rows), len(rows)))
+        csr.sum_duplicates()
+        rows = np.repeat(np.arange(csr.shape[0]), np.diff(csr.indptr))
+        order = np.lexsort((-np.abs(csr.data), rows))
+        return cls(matrix.row_labels, csr.indptr.astype(np.int64),
+                   csr.indices[order].astype(np.int64), csr.data[order])
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def _entries(self, rows, max_neighbors=None):
+        """
+        Find the entries in the given rows, limited to the strongest
+        `max_neighbors` of each row if that isn't None. Returns, for each
+        entry, the position in `rows` of its row and its offset in `indices`
+        and `data`.
+        """
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        if max_neighbors is not None:
+            lengths = np.minimum(lengths, max_neighbors)
+        row_of = np.repeat(np.arange(len(rows)), lengths)
+        # the start of each entry's row, plus its position within the row
+        first = np.cumsum(lengths) - lengths
+        offsets = starts[row_of] + np.arange(len(row_of)) - first[row_of]
+        return row_of, offsets
+
+    def neighborhood(self, concepts, hops=1, max_neighbors=None):
+        """
+        Get the sorted row numbers of the concepts within `hops` steps of
+        any of `concepts`, following only the `max_neighbors` strongest
+        associations of each concept if that isn't None. Concepts that
+        aren't in the matrix are ignored.
+        """
+        index = self.labels.indices
+        start = np.array(sorted(set(index[c] for c in concepts if c in index)),
+                         dtype=np.int64)
+        found = start
+        frontier = start
+        for hop in xrange(hops):
+            if len(frontier) == 0: break
+            row_of, offsets = self._entries(frontier, max_neighbors)
+            neighbors = np.unique(self.indices[offsets])
+            frontier = np.setdiff1d(neighbors, found, assume_unique=True)
+            found = np.union1d(found, frontier)
+        return found
+
+    def submatrix(self, rows):
+        """
+        Get the entries between the given sorted rows as a labeled divisi2
+        SparseMatrix, or None if there are no rows.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0: return None
+        row_of, offsets = self._entries(rows)
+        neighbors = self.indices[offsets]
+        # Keep only the entries whose column is also one of the rows.
+        position = np.minimum(np.searchsorted(rows, neighbors), len(rows) - 1)
+        inside = rows[position] == neighbors
+        result = divisi2.SparseMatrix.from_lists(
+            self.data[offsets[inside]], row_of[inside], position[inside],
+            nrows=len(rows), ncols=len(rows))
+        labels = OrderedSet([self.labels[i] for i in rows])
+        result.row_labels = labels
+        result.col_labels = labels
+        return result
+
+# The AdjacencyIndex of each matrix that has needed one, for as long as the
+# matrix is in memory. A batch worker analyzes many studies with the same
+# ConceptNet matrix, so the index only gets built once.
+_indexes = weakref.WeakKeyDictionary()
+
+def adjacency_index(matrix):
+    """
+    Get the AdjacencyIndex of a square association matrix, building it the
+    first time.
+    """
+    index = _indexes.get(matrix)
+    if index is None:
+        index = _indexes[matrix] = AdjacencyIndex.from_matrix(matrix)
+    return index
+
+def restrict_to_neighborhood(matrix, concepts, hops=1, max_neighbors=None):
+    """
+    Get the part of an association matrix within `hops` steps of the given
+    concepts, or None if none of them are in it. See
+    AdjacencyIndex.neighborhood.
+    """
+    index = adjacency_index(matrix)
+    return index.submatrix(index.neighborhood(concepts, hops, max_neighbors))
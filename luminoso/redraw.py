@@ -0,0 +1,50 @@
+"""
+Deciding how to draw each of SVDViewer's layers in a frame.
+
+A layer that says what kinds of change it depends on is drawn into an image
+that is kept between frames, so that frames in which nothing it depends on
+has changed only have to copy that image to the screen. But a layer that
+changes in every frame, like the labels while the projection is rotating or
+the mouse is hovering, gains nothing from its image and pays for drawing
+it twice. So a layer that has changed in several frames in a row is drawn
+straight to the screen, until a frame comes along that doesn't change it.
+"""
+
+# What to do with a layer in a frame.
+DRAW = 'draw'       # draw it directly on the screen
+RENDER = 'render'   # draw it into its image, then draw the image
+REUSE = 'reuse'     # draw the image it already has
+
+# A layer that has changed in this many frames in a row is drawn directly.
+VOLATILE_FRAMES = 3
+
+class RedrawTracker(object):
+    """
+    Keeps track of whether a layer's image is up to date, given
+    `depends_on`, the set of kinds of change that make the layer look
+    different. A layer whose `depends_on` is None is never kept as an image.
+    """
+    def __init__(self, depends_on):
+        self.depends_on = depends_on
+        self.has_image = False
+        self.changed_frames = 0
+
+    def frame(self, dirty):
+        """
+        Decide what to do with the layer in a frame where the kinds of
+        change in `dirty` happened: DRAW, RENDER or REUSE. A change of
+        'size' affects every layer.
+        """
+        if self.depends_on is None: return DRAW
+        if 'size' in dirty or dirty & self.depends_on:
+            self.changed_frames += 1
+            # The image is out of date, whether or not it's redrawn now.
+            self.has_image = False
+        else:
+            self.changed_frames = 0
+        if self.changed_frames >= VOLATILE_FRAMES:
+            return DRAW
+        if self.has_image:
+            return REUSE
+        self.has_image = True
+        return RENDER
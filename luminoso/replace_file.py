@@ -0,0 +1,23 @@
+"""
+Moving a newly written file into place over an old one.
+
+Files that other processes may be reading, like saved results and concept
+cache entries, are written under a temporary name and then renamed over the
+file they replace. Readers never see half a file, and anything that still
+has the old file open or memory-mapped keeps its contents. On POSIX the
+rename replaces the old file in one step. Windows can't rename over an
+existing file, so there the old file is removed first.
+"""
+import os
+
+def replace_file(temp_path, path):
+    """
+    Rename the file `temp_path` to `path`, replacing `path` if it exists.
+    """
+    try:
+        os.rename(temp_path, path)
+    except OSError:
+        if not os.path.exists(path): raise
+        # Windows can't rename over an existing file.
+        os.remove(path)
+        os.rename(temp_path, path)
@@ -23,6 +23,14 @@ def qt_exception_hook(ex_type, ex_value, ex_traceback):
                     '\n'.join(traceback.format_exception(ex_type, ex_value, ex_traceback)))
 
 def main(app=None):
+    # Let a frozen Windows build start concept extraction workers without
+    # opening another window in each. (This avoids importing luminoso.study,
+    # which would delay the splash screen.)
+    try:
+        import multiprocessing
+        multiprocessing.freeze_support()
+    except ImportError:
+        pass
     if app is None: app = initialize()
     try:
         # Set up splash screen
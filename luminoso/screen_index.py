@@ -0,0 +1,218 @@
+"""
+A spatial index of the points in an SVDViewer, in screen coordinates, so
+that finding the point nearest the mouse, or the points around it, doesn't
+mean measuring the distance to every point.
+
+The screen is divided into square cells, and the points on it are sorted by
+the cell they fall in, so the points in a block of cells can be found with a
+few slices. The index is rebuilt only when the points move on the screen.
+
+OccupancyGrid uses coarser cells to keep track of the parts of the screen
+that labels have already taken.
+"""
+import numpy as np
+
+# The width and height of a cell, in pixels.
+CELL_SIZE = 16
+
+class ScreenGrid(object):
+    """
+    An index of `points`, an (n, 2) array of integer screen coordinates,
+    on a screen of the given size.
+
+    Points that are off the screen are kept in a separate list, which is
+    only searched by queries that reach past the edge of the screen.
+    """
+    def __init__(self, points, width, height, cell_size=CELL_SIZE):
+        self.points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.ncols = max(1, -(-width // cell_size))
+        self.nrows = max(1, -(-height // cell_size))
+
+        x, y = self.points[:, 0], self.points[:, 1]
+        on_screen = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+        inside = np.flatnonzero(on_screen)
+        self.outside = np.flatnonzero(~on_screen)
+        cells = (y[inside] // cell_size) * self.ncols + x[inside] // cell_size
+        # The points in cell c are on_screen_points[starts[c]:starts[c+1]].
+        self.on_screen_points = inside[np.argsort(cells)]
+        self.starts = np.zeros((self.ncols * self.nrows + 1,), dtype=np.int64)
+        self.starts[1:] = np.cumsum(np.bincount(cells,
+                                                minlength=self.ncols * self.nrows))
+
+    def __len__(self):
+        return len(self.points)
+
+    def _cell_slices(self, x0, y0, x1, y1):
+        """
+        Get the start and end, in `on_screen_points`, of the points in each
+        row of the cells that overlap the rectangle from (x0, y0) to
+        (x1, y1), inclusive.
+        """
+        size = self.cell_size
+        cx0 = max(int(x0) // size, 0)
+        cx1 = min(int(x1) // size, self.ncols - 1)
+        cy0 = max(int(y0) // size, 0)
+        cy1 = min(int(y1) // size, self.nrows - 1)
+        if cx0 > cx1 or cy0 > cy1:
+            return np.zeros((0,), dtype=np.int64), np.zeros((0,), dtype=np.int64)
+        rows = np.arange(cy0, cy1 + 1) * self.ncols
+        return self.starts[rows + cx0], self.starts[rows + cx1 + 1]
+
+    def _cell_range(self, x0, y0, x1, y1):
+        """
+        Get the indices of the on-screen points in the cells that overlap
+        the rectangle from (x0, y0) to (x1, y1), inclusive.
+        """
+        starts, ends = self._cell_slices(x0, y0, x1, y1)
+        if len(starts) == 0: return np.zeros((0,), dtype=np.int64)
+        return np.concatenate([self.on_screen_points[start:end]
+                               for start, end in zip(starts, ends)])
+
+    def around(self, x, y, count):
+        """
+        Get the on-screen points in the smallest square of cells around
+        (x, y) that holds at least `count` of them, or all of them if there
+        aren't that many. They come in no particular order.
+
+        This takes time proportional to the number of points it returns, not
+        to the number of points on the screen.
+        """
+        radius = self.cell_size
+        while True:
+            bounds = (x - radius, y - radius, x + radius, y + radius)
+            starts, ends = self._cell_slices(*bounds)
+            if (np.sum(ends - starts) >= count or
+                self._covers_screen(*bounds)):
+                return self._cell_range(*bounds)
+            radius *= 2
+
+    def _covers_screen(self, x0, y0, x1, y1):
+        return (x0 <= 0 and y0 <= 0 and x1 >= self.width - 1 and
+                y1 >= self.height - 1)
+
+    def _reaches_outside(self, x0, y0, x1, y1):
+        return x0 < 0 or y0 < 0 or x1 >= self.width or y1 >= self.height
+
+    def _candidates(self, x0, y0, x1, y1):
+        """
+        Get the indices of every point that might be in the rectangle from
+        (x0, y0) to (x1, y1), inclusive, plus some that aren't.
+        """
+        found = self._cell_range(x0, y0, x1, y1)
+        if len(self.outside) and self._reaches_outside(x0, y0, x1, y1):
+            found = np.concatenate([found, self.outside])
+        return found
+
+    def in_rect(self, x0, y0, x1, y1):
+        """
+        Get the indices of the points in the rectangle from (x0, y0) to
+        (x1, y1), inclusive, in increasing order.
+        """
+        found = self._candidates(x0, y0, x1, y1)
+        x, y = self.points[found, 0], self.points[found, 1]
+        return np.sort(found[(x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)])
+
+    def squared_distances(self, indices, x, y):
+        offsets = self.points[indices] - np.array([x, y])
+        return np.sum(offsets ** 2, axis=-1)
+
+    def within(self, x, y, radius):
+        """
+        Get the indices of the points at most `radius` pixels from (x, y),
+        in increasing order.
+        """
+        found = self._candidates(x - radius, y - radius, x + radius, y + radius)
+        close = self.squared_distances(found, x, y) <= radius * radius
+        return np.sort(found[close])
+
+    def nearest(self, x, y):
+        """
+        Get the index of the point nearest to (x, y), or None if there are no
+        points. Of points at the same distance, the one with the lowest index
+        wins, as with `np.argmin`.
+        """
+        if len(self.points) == 0: return None
+        radius = self.cell_size
+        while True:
+            found = self._candidates(x - radius, y - radius, x + radius, y + radius)
+            if len(found):
+                distances = self.squared_distances(found, x, y)
+                best = distances.min()
+                # Every point at most `radius` away is in `found`, so if the
+                # best is that close, nothing else is closer.
+                if best <= radius * radius:
+                    return found[distances == best].min()
+            if self._covers_everything(x - radius, y - radius,
+                                       x + radius, y + radius):
+                return found[distances == best].min()
+            radius *= 2
+
+    def _covers_everything(self, x0, y0, x1, y1):
+        if len(self.outside) and not self._reaches_outside(x0, y0, x1, y1):
+            return False
+        return self._covers_screen(x0, y0, x1, y1)
+
+def select_ranks(values, ranks):
+    """
+    Get the indices of the elements of `values` that `np.argsort(values)`
+    would put at the positions in `ranks`, without sorting all of `values`.
+    `ranks` must be increasing and less than `len(values)`.
+    """
+    ranks = np.asarray(ranks, dtype=np.int64)
+    if len(ranks) == 0: return np.zeros((0,), dtype=np.int64)
+    if not hasattr(np, 'argpartition'):
+        # NumPy before 1.8 can't partition, so sort everything.
+        return np.argsort(values)[ranks]
+    # Partitioning at every rank at once is much slower than sorting the
+    # part of `values` that the ranks reach.
+    first = np.argpartition(values, ranks[-1])[:ranks[-1] + 1]
+    return first[np.argsort(values[first])][ranks]
+
+# The size of a cell in an OccupancyGrid, in pixels: about half the height
+# of a line of label text.
+OCCUPANCY_CELL_SIZE = 8
+
+class OccupancyGrid(object):
+    """
+    Keeps track of which parts of a screen of the given size are taken, such
+    as by labels, in cells of `cell_size` pixels. An area counts as taken
+    if it touches any part of a cell.
+
+    Checking a spot, or taking an area, costs time in proportion to the
+    cells it covers, and so does clearing the grid, because only the cells
+    that were taken are cleared.
+    """
+    def __init__(self, width, height, cell_size=OCCUPANCY_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = np.zeros((max(1, -(-height // cell_size)),
+                               max(1, -(-width // cell_size))), dtype=np.bool8)
+        self.taken = []
+
+    def is_taken(self, x, y):
+        """
+        Is the cell holding the on-screen pixel (x, y) taken?
+        """
+        return self.cells[int(y) // self.cell_size, int(x) // self.cell_size]
+
+    def take(self, x0, y0, x1, y1):
+        """
+        Take the cells that overlap the pixels from (x0, y0) up to, but not
+        including, (x1, y1). Parts off the screen are ignored.
+        """
+        size = self.cell_size
+        nrows, ncols = self.cells.shape
+        row0 = min(max(int(y0) // size, 0), nrows)
+        row1 = min(max(-(-int(y1) // size), 0), nrows)
+        col0 = min(max(int(x0) // size, 0), ncols)
+        col1 = min(max(-(-int(x1) // size), 0), ncols)
+        if row0 < row1 and col0 < col1:
+            self.cells[row0:row1, col0:col1] = True
+            self.taken.append((row0, row1, col0, col1))
+
+    def clear(self):
+        for row0, row1, col0, col1 in self.taken:
+            self.cells[row0:row1, col0:col1] = False
+        self.taken = []
@@ -0,0 +1,78 @@
+"""
+An in-memory cache that holds as many entries as fit in a budget of bytes,
+forgetting the least recently used ones first.
+
+SVDViewer uses it for the pre-rendered images of its labels, whose sizes
+vary a great deal with the length of the text.
+"""
+
+# The fields of an entry in SizedLRUCache's linked list.
+PREV, NEXT, KEY, VALUE, NBYTES = range(5)
+
+class SizedLRUCache(object):
+    """
+    A mapping from keys to values, each with a size in bytes given when it's
+    stored. When the total size goes over `max_bytes`, the entries that were
+    used least recently are dropped until it fits. A single entry bigger than
+    `max_bytes` is not kept at all.
+
+    The entries are kept in a circular doubly linked list, from least to
+    most recently used, so that using or dropping one takes constant time.
+    (collections.OrderedDict would do the same, but needs Python 2.7.)
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _unlink(self, entry):
+        entry[PREV][NEXT] = entry[NEXT]
+        entry[NEXT][PREV] = entry[PREV]
+
+    def _append(self, entry):
+        last = self._root[PREV]
+        entry[PREV], entry[NEXT] = last, self._root
+        last[NEXT] = self._root[PREV] = entry
+
+    def _remove(self, entry):
+        self._unlink(entry)
+        del self._entries[entry[KEY]]
+        self.nbytes -= entry[NBYTES]
+
+    def get(self, key):
+        """
+        Get the value stored for `key`, or None if there isn't one, and mark
+        it as the most recently used.
+        """
+        entry = self._entries.get(key)
+        if entry is None: return None
+        self._unlink(entry)
+        self._append(entry)
+        return entry[VALUE]
+
+    def put(self, key, value, nbytes):
+        """
+        Store `value`, which takes up `nbytes`, under `key`.
+        """
+        old = self._entries.get(key)
+        if old is not None: self._remove(old)
+        if nbytes > self.max_bytes: return
+        entry = [None, None, key, value, nbytes]
+        self._append(entry)
+        self._entries[key] = entry
+        self.nbytes += nbytes
+        while self.nbytes > self.max_bytes:
+            self._remove(self._root[NEXT])
+
+    def clear(self):
+        self._entries = {}
+        # The list's sentinel, which is both before the first entry and
+        # after the last.
+        self._root = root = [None, None, None, None, 0]
+        root[PREV] = root[NEXT] = root
+        self.nbytes = 0
@@ -10,16 +10,22 @@ if __name__ == '__main__':
     sys.path.extend([os.path.join(os.path.dirname(sys.argv[0]), "lib"),
                      os.path.dirname(sys.argv[0])])
 
-try:
-    from PyQt4 import QtCore
-except ImportError:
+# Set LUMINOSO_HEADLESS to analyze studies without Qt, even if it is
+# installed, as the batch mode in luminoso.batch_study does.
+if os.environ.get('LUMINOSO_HEADLESS'):
     from luminoso import fake_qt as QtCore
+else:
+    try:
+        from PyQt4 import QtCore
+    except ImportError:
+        from luminoso import fake_qt as QtCore
 import os, codecs, time
+from itertools import izip
+from array import array
 import cPickle as pickle
 import numpy as np
 import traceback
 import logging
-import hashlib
 import chardet
 logger = logging.getLogger('luminoso')
 
@@ -27,8 +33,22 @@ from standalone_nlp.lang_en import en_nl
 from csc import divisi2
 from csc.divisi2.blending import blend
 from csc.divisi2.ordered_set import OrderedSet
+from csc.divisi2.reconstructed import ReconstructedMatrix, reconstruct_symmetric
 
 from luminoso.whereami import package_dir
+from luminoso.concept_cache import ConceptCache, text_hash
+from luminoso.cooccurrence import CooccurrenceBuilder
+from luminoso.svd_engines import truncated_svd
+from luminoso import matrix_files
+from luminoso.manifest import Manifest, input_path, file_hash
+from luminoso.instrumentation import Instrumentation
+from luminoso.vocabulary import Vocabulary, first_appearance
+from luminoso.neighborhood import restrict_to_neighborhood
+from luminoso.blend_operator import BlendOperator
+from luminoso.matrix_store import MatrixStore, REFERENCE_SUFFIX, \
+     read_reference, write_reference
+from luminoso.matrix_handle import MatrixHandle, matrix_kind, matrix_digest, \
+    matrix_nbytes
 from luminoso.report import render_info_page, default_info_page
 
 import shutil
@@ -47,26 +67,80 @@ except ImportError:
 class OutdatedAnalysisError(Exception):
     pass
 
+# How many bytes at the start of a file chardet looks at to guess its
+# encoding, when it isn't UTF-8.
+ENCODING_SAMPLE_BYTES = 64 * 1024
+
+def decode_text(rawtext, encoding=None):
+    """
+    Decode the contents of a text file, returning (text, encoding).
+
+    If the encoding isn't known, try UTF-8 first, because most files are in
+    it (or in ASCII) and checking is fast. Otherwise, ask chardet about a
+    sample from the start of the file.
+    """
+    if encoding is None:
+        if rawtext.startswith(codecs.BOM_UTF8):
+            encoding = 'utf-8-sig'
+        else:
+            try:
+                return rawtext.decode('utf-8'), 'utf-8'
+            except UnicodeDecodeError:
+                encoding = chardet.detect(rawtext[:ENCODING_SAMPLE_BYTES])['encoding']
+                if encoding is None: encoding = 'utf-8'
+    return rawtext.decode(encoding, 'replace'), encoding
+
 class Document(object):
     '''
     A Document is an entity in a Study.
+
+    A Document made with `from_file` doesn't keep its text in memory; it reads
+    the file each time its `text` is needed.
     '''
-    def __init__(self, name, text):
+    def __init__(self, name, text=None, filename=None, encoding=None,
+                 digest=None):
         self.name = name
-        self.text = text
+        self._text = text
+        self.filename = filename
+        self.encoding = encoding
+        self._digest = digest
 
     @classmethod
-    def from_file(cls, filename, name):
-        rawtext = open(filename, 'rb').read()
-        encoding = chardet.detect(rawtext)['encoding']
+    def from_file(cls, filename, name, encoding=None, digest=None):
+        """
+        Make a Document for a text file, without reading it yet. If the
+        file's `encoding` or `digest` is known, it won't have to be detected
+        or computed.
+        """
+        return cls(name, filename=filename, encoding=encoding, digest=digest)
+
+    @property
+    def digest(self):
+        """
+        The SHA-1 hash of the document's file, or of its text if it didn't
+        come from a file. It's computed once, without decoding the file, so
+        that identifying a document doesn't cost another read of its text.
+        """
+        if self._digest is None:
+            if self._text is None and self.filename is not None:
+                self._digest = file_hash(self.filename)
+            else:
+                self._digest = text_hash(self.text)
+        return self._digest
+
+    @property
+    def text(self):
+        if self._text is not None: return self._text
+        with open(self.filename, 'rb') as f:
+            rawtext = f.read()
         try:
-            text = rawtext.decode(encoding, 'replace')
+            text, self.encoding = decode_text(rawtext, self.encoding)
         except LookupError:
             # This can happen in the case of encodings that Python doesn't implement, like EUC-TW.
             # FIXME: There should be a better way of indicating this problem
-            name = 'CHARACTER ENCODING PROBLEM [%s]' % name
-            text = ''
-        return cls(name, text)
+            logger.warn('CHARACTER ENCODING PROBLEM [%s]' % self.name)
+            text = u''
+        return text
 
     def extract_concepts_with_negation(self):
         return extract_concepts_with_negation(self.text)
@@ -123,6 +197,50 @@ def extract_concepts_from_words(words):
     pos_tagged_concepts = [(c, 1) for c in pos_tagged_words]
     return positive_concepts + pos_tagged_concepts + negative_concepts + neg_tagged_concepts
 
+def extract_document(doc, with_sentences=True):
+    """
+    Do all the natural language processing that an analysis needs for a single
+    document.
+
+    Returns a pair of:
+
+    - a list of (concept, value) pairs that make up the document's row in
+      the documents matrix
+    - a list of the concepts in each sentence, which get_documents_assoc uses
+      to find associations (or None if `with_sentences` is false)
+
+    The result depends only on the text of the document, not its name, so
+    that it can be cached. This is a module-level function so that it can run
+    in a worker process.
+    """
+    concepts = [(concept, value) for concept, value
+                in doc.extract_concepts_with_negation()[:1000]
+                if (concept not in PUNCTUATION)
+                and (not en_nl.is_blacklisted(concept))]
+    sentence_concepts = None
+    if with_sentences:
+        sentence_concepts = extract_sentence_concepts(doc)
+    return concepts, sentence_concepts
+
+def extract_sentence_concepts(doc):
+    # avoid insane space usage by limiting to 20 words
+    return [extract_concepts_from_words(sentence[:20])
+            for sentence in doc.get_sentences()]
+
+def _extract_study_document(doc):
+    return extract_document(doc, with_sentences=True)
+
+def _extract_canonical_document(doc):
+    return extract_document(doc, with_sentences=False)
+
+def nlp_settings_key():
+    """
+    Describe the settings that affect extract_document, so that cached results
+    from different settings are not confused with each other.
+    """
+    return repr((NEGATION, PUNCTUATION, EXTRA_STOPWORDS,
+                 getattr(en_nl, 'lang', 'en')))
+
 def load_json_from_file(file):
     with open(file) as f:
         return json.load(f)
@@ -134,11 +252,107 @@ def write_json_to_file(data, file):
 def entry_count(vec):
     return np.sum(np.abs(vec))
 
+def top_k_indices(values, k):
+    """
+    Get the indices of the `k` largest values in an array, largest first,
+    without sorting the whole array.
+    """
+    values = np.asarray(values)
+    if k >= len(values):
+        return np.argsort(-values, kind='mergesort')
+    if k <= 0:
+        return np.zeros((0,), dtype=int)
+    if not hasattr(np, 'argpartition'):
+        # NumPy before 1.8 can't partition, so sort everything.
+        return np.argsort(-values, kind='mergesort')[:k]
+    top = np.argpartition(-values, k - 1)[:k]
+    return top[np.argsort(-values[top], kind='mergesort')]
+
+def fold_in(rows, right, sigma):
+    """
+    Project rows of a matrix onto its truncated SVD, given the right
+    singular vectors `right` (labeled by the columns they belong to) and the
+    singular values `sigma`: each row `a` becomes `a * V * Sigma^-1`. For a
+    row that was part of the matrix, this is exactly its row of U.
+
+    `rows` is a SparseMatrix whose columns are all among the labels of
+    `right`.
+    """
+    projected = divisi2.aligned_matrix_multiply(rows, right)
+    return divisi2.DenseMatrix(np.asarray(projected) / np.asarray(sigma),
+                               rows.row_labels, None)
+
+def _index_or_missing(labels, label):
+    if label in labels: return labels.index(label)
+    return -1
+
+# How many canonical documents compute_stats handles at once.
+CANONICAL_BATCH = 256
+
 DEFAULT_SETTINGS = {
     'axes': 50,
-    'concept_cutoff': 2
+    'concept_cutoff': 2,
+    # The most concepts to analyze, or None for no limit. If more concepts
+    # pass the concept_cutoff, the best ones by 'concept_ranking' are
+    # kept: 'frequency' is the number of documents a concept is in, and
+    # 'tfidf' is its total weight in the documents matrix. #tags and
+    # concepts from canonical documents are always kept.
+    'max_concepts': None,
+    'concept_ranking': 'frequency',
+    # Number of processes to use for extracting concepts from documents.
+    'workers': 1,
+    # A directory for caching extracted concepts, which can be shared
+    # between studies. None means not to cache.
+    'concept_cache': None,
+    'concept_cache_megabytes': 256,
+    # How far an incrementally updated analysis can drift from the SVD it
+    # was based on before a full analysis is run instead. See
+    # Study.update_analysis.
+    'incremental_drift': 0.1,
+    # Limits on the association matrix built from the documents: the most
+    # neighbors each concept keeps, the smallest weight of a pair that is
+    # kept, and how much memory building it can use. None means no limit.
+    # See luminoso/cooccurrence.py.
+    'assoc_max_neighbors': None,
+    'assoc_min_weight': 0,
+    'assoc_memory_megabytes': None,
+    # Blend only the part of each other association matrix (such as
+    # ConceptNet) near the study's concepts: the concepts within
+    # 'blend_hops' steps of them, following only the 'blend_max_neighbors'
+    # strongest associations of each concept. None for both means to blend
+    # the whole matrix. See luminoso/neighborhood.py.
+    'blend_hops': None,
+    'blend_max_neighbors': None,
+    # How to compute the SVD: 'lanczos' is exact, 'randomized' is faster
+    # and approximate. See luminoso/svd_engines.py.
+    'svd_engine': 'lanczos',
+    'svd_oversample': 10,
+    'svd_power_iterations': 2,
+    # Start the randomized SVD from the eigenvectors of the last analysis.
+    'svd_warm_start': True,
+    # Run the SVD against the blend implicitly, one matrix at a time,
+    # instead of building the blend and a normalized copy of it. This
+    # takes much less memory with large matrices such as ConceptNet. See
+    # luminoso/blend_operator.py.
+    'implicit_blend': False
 }
 
+# Settings that don't change the results of an analysis, so changing them
+# doesn't make saved results out of date.
+NON_RESULT_SETTINGS = frozenset(['workers', 'concept_cache',
+                                 'concept_cache_megabytes'])
+
+def settings_hash(settings):
+    """
+    The SHA-1 hash of the settings that affect the results of an analysis,
+    with defaults filled in, as a hex string.
+    """
+    effective = dict(DEFAULT_SETTINGS)
+    effective.update(settings)
+    for key in NON_RESULT_SETTINGS:
+        effective.pop(key, None)
+    return text_hash(json.dumps(effective, sort_keys=True))
+
 class Study(QtCore.QObject):
     '''
     A Study is a collection of documents and other matrices that can be analyzed.
@@ -147,7 +361,8 @@ class Study(QtCore.QObject):
         """
         documents: list of Document objects
         canonical: list of Document objects that are the canonical documents (possibly empty)
-        other_matrices: things to blend.
+        other_matrices: things to blend, by name. These can be
+          MatrixHandles, which are loaded only if the blend uses them.
         settings: a dict of settings. See DEFAULT_SETTINGS above.
         """
         QtCore.QObject.__init__(self)
@@ -155,13 +370,31 @@ class Study(QtCore.QObject):
         self.study_documents = documents
         self.canonical_documents = canonical
         # self.documents is now a property
-        self._documents_matrix = None
+        self._reset_concepts()
+        self._svd_residual = None
+        self._svd_right = None
         self.other_matrices = other_matrices
         self.settings = settings
+        # Measures each stage of analysis; see luminoso/instrumentation.py.
+        self.instrumentation = Instrumentation()
 
     def config(self, key):
         if key in self.settings: return self.settings[key]
         else: return DEFAULT_SETTINGS[key]
+
+    def _reset_concepts(self):
+        """
+        Forget the concepts extracted from the documents, so that they are
+        extracted again.
+        """
+        self._documents_matrix = None
+        self._sentence_concepts = {}
+        # Every concept extracted from the documents gets an id in the
+        # vocabulary. _concept_columns holds the column of each id in the
+        # documents matrix, or -1 if it's only in sentences.
+        self.vocabulary = Vocabulary()
+        self._concept_columns = None
+        self._canonical_concepts = None
         
     step = QtCore.pyqtSignal(['QString'])
 
@@ -170,17 +403,13 @@ class Study(QtCore.QObject):
         self.step.emit(msg)
 
     def get_contents_hash(self):
-        def sha1(txt):
-            if isinstance(txt, unicode): txt = txt.encode('utf-8')
-            return hashlib.sha1(txt).hexdigest()
-
         docs = dict((doc.name, (isinstance(doc, CanonicalDocument),
-                                sha1(doc.text)))
+                                doc.digest))
                     for doc in self.documents)
-        matrices = tuple(sorted(self.other_matrices.keys()))
-
-        # TODO: make sure matrices have a meaningful `hash`.
-        #matrices = dict((name, hash(mat)) for name, mat in self.other_matrices.items())
+        # This uses the digests that MatrixHandles already know, so it
+        # doesn't load any matrices.
+        matrices = dict((name, matrix_digest(matrix))
+                        for name, matrix in self.other_matrices.items())
         return dict(docs=docs, matrices=matrices)
 
     @property
@@ -206,64 +435,243 @@ class Study(QtCore.QObject):
             return None
         if self._documents_matrix is not None:
             return self._documents_matrix
-        entries = []
-        for doc in self.study_documents:
-            self._step(doc.name)
-            for concept, value in doc.extract_concepts_with_negation()[:1000]:
-                if (concept not in PUNCTUATION) and (not en_nl.is_blacklisted(concept)):
-                    entries.append((value, doc.name, concept))
-        documents_matrix = divisi2.make_sparse(entries).normalize_tfidf(cols_are_terms=True)
-        canon_entries = []
-        for doc in self.canonical_documents:
-            self._step(doc.name)
-            for concept, value in doc.extract_concepts_with_negation()[:1000]:
-                if (concept not in PUNCTUATION) and (not en_nl.is_blacklisted(concept)):
-                    canon_entries.append((value, doc.name, concept))
-        if canon_entries:
-            canonical_matrix = divisi2.make_sparse(canon_entries).normalize_rows()
-            self._documents_matrix = documents_matrix + canonical_matrix
-        else:
-            self._documents_matrix = documents_matrix
+        with self.instrumentation.stage('documents_matrix',
+                                        documents=self.num_documents) as sizes:
+            documents_matrix = self._concepts_matrix(self.study_documents, True)
+            documents_matrix = documents_matrix.normalize_tfidf(cols_are_terms=True)
+            canonical_matrix = self._concepts_matrix(self.canonical_documents, False)
+            if canonical_matrix is not None:
+                canonical_matrix = canonical_matrix.normalize_rows()
+                self._documents_matrix = documents_matrix + canonical_matrix
+            else:
+                self._documents_matrix = documents_matrix
+            col_labels = self._documents_matrix.col_labels
+            self._concept_columns = np.array(
+                [_index_or_missing(col_labels, concept)
+                 for concept in self.vocabulary.labels], dtype=np.int32)
+            if canonical_matrix is not None:
+                self._canonical_concepts = self.vocabulary.mask(canonical_matrix.col_labels)
+            else:
+                self._canonical_concepts = np.zeros((len(self.vocabulary),), dtype=np.bool_)
+            sizes['concepts'] = self._documents_matrix.shape[1]
+            sizes['nnz'] = self._documents_matrix.nnz
+            sizes['vocabulary'] = len(self.vocabulary)
         return self._documents_matrix
+
+    def _concepts_matrix(self, documents, with_sentences):
+        """
+        Extract the concepts from `documents`, giving each one an id in the
+        vocabulary as it comes out, and make a matrix of documents vs.
+        concepts from them. Returns None if there are no concepts.
+
+        If `with_sentences` is true, the concepts in each sentence of each
+        document are remembered for get_documents_assoc.
+        """
+        rows, ids, values = array('i'), array('i'), array('d')
+        for row, (doc, (concepts, sentence_concepts)) in \
+          enumerate(self._extract_documents(documents, with_sentences)):
+            doc_ids, doc_values = self.vocabulary.encode(concepts)
+            rows.extend([row] * len(doc_ids))
+            ids.extend(doc_ids)
+            values.extend(doc_values)
+            if with_sentences:
+                self._sentence_concepts[doc.name] = \
+                  self.vocabulary.encode_sentences(sentence_concepts)
+        if not ids: return None
+        # Only documents and concepts that occur get rows and columns, in the
+        # order they first occur.
+        rows, row_order = first_appearance(rows)
+        cols, col_ids = first_appearance(ids)
+        matrix = divisi2.SparseMatrix.from_lists(
+            np.frombuffer(values, dtype=np.float64), rows, cols,
+            nrows=len(row_order), ncols=len(col_ids))
+        matrix.row_labels = OrderedSet([documents[i].name for i in row_order])
+        matrix.col_labels = self.vocabulary.ordered_set(col_ids)
+        return matrix
+
+    def get_concept_cache(self):
+        """
+        Get the ConceptCache configured for this study, or None if the
+        'concept_cache' setting is not set.
+        """
+        cache_dir = self.config('concept_cache')
+        if not cache_dir: return None
+        return ConceptCache(cache_dir, nlp_settings_key(),
+                            max_bytes=self.config('concept_cache_megabytes') * 1024 * 1024)
+
+    def _extract_documents(self, documents, with_sentences):
+        """
+        Run extract_document on each document, yielding (document, result)
+        pairs in the original order of the documents.
+
+        Results are looked up in the concept cache first, if there is one, so
+        that only new or changed documents are processed.
+        """
+        cache = self.get_concept_cache()
+        keys = [None] * len(documents)
+        cached = [None] * len(documents)
+        if cache is not None:
+            for i, doc in enumerate(documents):
+                keys[i] = cache.key(doc.digest)
+                result = cache.get(keys[i])
+                if result is not None and (result[1] is not None or not with_sentences):
+                    cached[i] = result
+        missing = [doc for doc, result in izip(documents, cached)
+                   if result is None]
+        if with_sentences: extractor = _extract_study_document
+        else: extractor = _extract_canonical_document
+        computed = self._map_documents(extractor, missing)
+
+        for i, doc in enumerate(documents):
+            self._step(doc.name)
+            result = cached[i]
+            if result is None:
+                result = computed.next()
+                if cache is not None:
+                    cache.put(keys[i], result)
+            yield doc, result
+        # Let the worker pool, if any, shut down cleanly.
+        for leftover in computed: pass
+
+    def _map_documents(self, func, documents):
+        """
+        Yield the results of `func` on each document, in order.
+
+        If the 'workers' setting is more than 1, the documents are spread
+        over that many worker processes. Results are still yielded in order,
+        so the matrices built from them come out exactly the same as they
+        would serially.
+        """
+        workers = self.config('workers')
+        if workers > 1 and len(documents) > 1:
+            try:
+                import multiprocessing
+            except ImportError:
+                # Python 2.5 doesn't have it.
+                logger.warn('multiprocessing is not available; '
+                            'extracting concepts in one process')
+                workers = 1
+        if workers <= 1 or len(documents) <= 1:
+            for doc in documents:
+                yield func(doc)
+            return
+
+        chunksize = max(1, len(documents) // (workers * 8))
+        pool = multiprocessing.Pool(min(workers, len(documents)))
+        try:
+            for result in pool.imap(func, documents, chunksize):
+                yield result
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
     
-    def get_documents_assoc(self):
-        self._step('Finding associated concepts...')
-        if self.num_documents == 0: return None
+    def get_valid_ids(self, cutoff=None):
+        """
+        Get a boolean array over the ids in the vocabulary, which is true for
+        the concepts that appear in enough documents to be part of the
+        analysis: at least `cutoff` of them, which defaults to the
+        'concept_cutoff' setting.
+
+        If the 'max_concepts' setting is less than the number of those
+        concepts, only that many are valid; see `_cap_concepts`.
+        """
         docs = self.get_documents_matrix()
-        concept_counts = docs.col_op(len)
-        valid_concepts = set()
+        values, rows, cols = docs.find()
+        cols = np.asarray(cols, dtype=np.int64)
+        concept_counts = np.bincount(cols, minlength=docs.shape[1])
+        columns = self._concept_columns
+        valid = np.zeros((len(columns),), dtype=np.bool_)
+        present = columns >= 0
 
         # NOTE: this is the number you change to make a study larger or
         # smaller.
-        for concept, count in concept_counts.to_sparse().named_items():
-            if count >= self.config('concept_cutoff'): valid_concepts.add(concept)
-        if len(valid_concepts) == 0:
+        if cutoff is None: cutoff = self.config('concept_cutoff')
+        cutoff = max(cutoff, 1)
+        valid[present] = concept_counts[columns[present]] >= cutoff
+
+        max_concepts = self.config('max_concepts')
+        if max_concepts is not None and np.sum(valid) > max_concepts:
+            ranking = self.config('concept_ranking')
+            if ranking == 'frequency':
+                column_scores = concept_counts
+            elif ranking == 'tfidf':
+                column_scores = np.bincount(cols, weights=np.abs(values),
+                                            minlength=docs.shape[1])
+            else:
+                raise ValueError("Unknown concept_ranking: %r" % ranking)
+            scores = np.zeros((len(columns),))
+            scores[present] = column_scores[columns[present]]
+            valid = self._cap_concepts(valid, scores, max_concepts)
+        return valid
+
+    def _cap_concepts(self, valid, scores, max_concepts):
+        """
+        Keep only `max_concepts` of the valid concept ids, with the highest
+        `scores`. #tags and concepts from canonical documents are always
+        kept, and count toward the limit.
+        """
+        is_tag = np.array(self.vocabulary.is_tag[:len(valid)], dtype=np.bool_)
+        protected = valid & (is_tag | self._canonical_concepts[:len(valid)])
+        candidates = np.flatnonzero(valid & ~protected)
+        room = max(max_concepts - int(np.sum(protected)), 0)
+        capped = protected.copy()
+        capped[candidates[top_k_indices(scores[candidates], room)]] = True
+        logger.info('Keeping %d of %d concepts (max_concepts is %d)'
+                    % (np.sum(capped), np.sum(valid), max_concepts))
+        return capped
+
+    def get_valid_concepts(self):
+        """
+        Get the set of concepts that appear in enough documents to be part
+        of the analysis.
+        """
+        labels = self.vocabulary.labels
+        return set(labels[i] for i in np.flatnonzero(self.get_valid_ids()))
+
+    def get_documents_assoc(self, documents=None):
+        """
+        Get a matrix of how concepts are associated with each other, based on
+        how they appear together in the study documents (or in `documents`,
+        a subset of them, if given).
+        """
+        self._step('Finding associated concepts...')
+        if self.num_documents == 0: return None
+        if documents is None: documents = self.study_documents
+        valid = self.get_valid_ids()
+        num_valid = int(np.sum(valid))
+        if num_valid == 0:
             # No valid concepts. This unfortunately happens when
             # concept_cutoff is too low.
             return None
 
-        entries = []
-        for doc in self.study_documents:
-            prev_concepts = []
-            for sentence in doc.get_sentences():
-                # avoid insane space usage by limiting to 20 words
-                concepts = extract_concepts_from_words(sentence[:20])
-                for concept1, value1 in concepts:
-                    if concept1 in valid_concepts:
-                        for concept2, value2 in concepts:
-                            if concept2 in valid_concepts and concept1 < concept2:
-                                entries.append( (value1*value2, concept1, concept2) )
-                                entries.append( (value1*value2, concept2, concept1) )
-                        for concept2, value2 in prev_concepts:
-                            if concept2 in valid_concepts and concept1 != concept2:
-                                entries.append( (value1*value2/2, concept1, concept2) )
-                                entries.append( (value1*value2/2, concept2, concept1) )
-                # Remember tags, but forget words that were too long ago
-                prev_concepts = [p for p in prev_concepts[:-100] if
-                p[0].startswith('#')] + prev_concepts[-100:]
-                prev_concepts.extend(concepts)
-        assert len(entries) > 0
-        return divisi2.SparseMatrix.square_from_named_entries(entries).squish()
+        with self.instrumentation.stage('association',
+                                        documents=len(documents),
+                                        valid_concepts=num_valid) as sizes:
+            builder = CooccurrenceBuilder(
+              self.vocabulary, valid,
+              max_neighbors=self.config('assoc_max_neighbors'),
+              min_weight=self.config('assoc_min_weight'),
+              max_megabytes=self.config('assoc_memory_megabytes'))
+            for doc in documents:
+                sentence_concepts = self._sentence_concepts.get(doc.name)
+                if sentence_concepts is None:
+                    sentence_concepts = self.vocabulary.encode_sentences(
+                      extract_sentence_concepts(doc))
+                builder.add_document(sentence_concepts)
+            assoc = builder.to_matrix()
+            sizes['pruned'] = int(builder.pruned)
+            sizes['compactions'] = builder.compactions
+            if assoc is not None:
+                sizes['concepts'] = assoc.shape[0]
+                sizes['nnz'] = assoc.nnz
+        if builder.pruned:
+            logger.info('Pruned %d entries from the association matrix'
+                        % builder.pruned)
+        assert assoc is not None or documents is not self.study_documents
+        return assoc
     
     def get_blend(self):
         if self.is_associative():
@@ -273,77 +681,159 @@ class Study(QtCore.QObject):
     
     def is_associative(self):
         if not self.other_matrices: return True
-        return any(name.endswith('.assoc.smat') for name in
+        return any(matrix_kind(name) == 'assoc' for name in
                    self.other_matrices)
 
+    def get_other_matrix(self, name):
+        """
+        Get one of the other matrices, loading it if it's a MatrixHandle that
+        hasn't been loaded.
+        """
+        matrix = self.other_matrices[name]
+        if not isinstance(matrix, MatrixHandle): return matrix
+        if matrix.loaded: return matrix.load()
+        with self.instrumentation.stage('load_matrix', matrix=name) as sizes:
+            loaded = matrix.load()
+            sizes['rows'], sizes['cols'] = loaded.shape
+            sizes['nnz'] = loaded.nnz
+        return loaded
+
     def get_analogy_blend(self):
-        other_matrices = [matrix for name, matrix in
-        self.other_matrices.items() if name.endswith('.smat')]
-        other_matrices = self.other_matrices.values()
+        other_matrices = [self.get_other_matrix(name)
+                          for name in self.other_matrices.keys()]
         
-        # find concepts used at least twice
-        docs = self.get_documents_matrix()
-        concept_counts = docs.col_op(len)
-        valid_concepts = set()
-        for concept, count in concept_counts.to_sparse().named_items():
-            if count >= 3: valid_concepts.add(concept)
+        # find concepts used at least three times
+        valid = self.get_valid_ids(cutoff=3)
         
         # extract relevant concepts from the doc matrix;
         # transpose it so it's concepts vs. documents
         orig_doc_matrix = self.get_documents_matrix()
         #sdoc_indices = [orig_doc_matrix.row_index(sdoc.name)
         #                for sdoc in self.study_documents]
-        concept_indices = [orig_doc_matrix.col_index(c)
-                           for c in valid_concepts]
+        concept_indices = self._concept_columns[valid].tolist()
 
         # NOTE: canonical documents can affect the stats this way.
         # Is there a clean way to fix this?
 
         doc_matrix = orig_doc_matrix[:,concept_indices].T.squish()
-        if doc_matrix is None:
-            theblend = blend(other_matrices)
-            study_concepts = set(theblend.row_labels)
-        else:
-            theblend = blend([doc_matrix] + other_matrices)
-            study_concepts = set(doc_matrix.row_labels)
+        return self._blend(doc_matrix, other_matrices)
+
+    def _blend(self, doc_matrix, other_matrices):
+        """
+        Blend the matrix made from the study documents with the other
+        matrices, returning the blend and the set of concepts that came from
+        the documents.
+
+        With the 'implicit_blend' setting, the blend is a BlendOperator
+        instead of a SparseMatrix.
+        """
+        implicit = self.config('implicit_blend')
+        with self.instrumentation.stage('blend', implicit=bool(implicit),
+                                        matrices=len(other_matrices) + 1) as sizes:
+            if doc_matrix is not None:
+                other_matrices = [doc_matrix] + other_matrices
+            if implicit:
+                theblend = BlendOperator(other_matrices)
+            else:
+                theblend = blend(other_matrices)
+            if doc_matrix is None:
+                study_concepts = set(theblend.row_labels)
+            else:
+                study_concepts = set(doc_matrix.row_labels)
+            sizes['rows'], sizes['cols'] = theblend.shape
+            sizes['nnz'] = theblend.nnz
         return theblend, study_concepts
 
     def get_assoc_blend(self):
         other_matrices = []
         doc_matrix = self.get_documents_assoc()
         self._step('Blending...')
-        for name, matrix in self.other_matrices.items():
+        for name in self.other_matrices.keys():
             # use association matrices only
             # (unless we figure out how to do both kinds of blending)
-            if name.endswith('.assoc.smat'):
+            if matrix_kind(name) == 'assoc':
+                matrix = self.get_other_matrix(name)
                 if matrix.shape[0] != matrix.shape[1]:
                     raise ValueError("The matrix %s is not square" % name)
-                other_matrices.append(matrix)
+                if doc_matrix is not None:
+                    matrix = self._neighborhood(name, matrix,
+                                                doc_matrix.row_labels)
+                if matrix is not None:
+                    other_matrices.append(matrix)
+        return self._blend(doc_matrix, other_matrices)
+
+    def _neighborhood(self, name, matrix, concepts):
+        """
+        Get the part of an association matrix near the study's `concepts`,
+        according to the 'blend_hops' and 'blend_max_neighbors' settings, or
+        None if the study's concepts aren't in it.
+        """
+        hops = self.config('blend_hops')
+        max_neighbors = self.config('blend_max_neighbors')
+        if hops is None and max_neighbors is None: return matrix
+        if hops is None: hops = 1
+        with self.instrumentation.stage('neighborhood', matrix=name,
+                                        rows=matrix.shape[0], nnz=matrix.nnz,
+                                        hops=hops) as sizes:
+            matrix = restrict_to_neighborhood(matrix, concepts, hops,
+                                              max_neighbors)
+            if matrix is not None:
+                sizes['kept_rows'] = matrix.shape[0]
+                sizes['kept_nnz'] = matrix.nnz
+        return matrix
+
+    def get_svd(self, matrix, warm_start=None):
+        """
+        Compute the truncated SVD of `matrix` with the engine chosen in the
+        settings, returning (U, Sigma, V, residual).
 
-        if doc_matrix is None:
-            theblend = blend(other_matrices)
-            study_concepts = set(theblend.row_labels)
+        `warm_start` holds eigenvectors from a previous analysis, which the
+        randomized engine can start from.
+        """
+        engine = self.config('svd_engine')
+        if engine == 'randomized':
+            if not self.config('svd_warm_start'): warm_start = None
+            kwargs = dict(oversample=self.config('svd_oversample'),
+                          power_iterations=self.config('svd_power_iterations'),
+                          warm_start=warm_start)
         else:
-            theblend = blend([doc_matrix] + other_matrices)
-            study_concepts = set(doc_matrix.row_labels)
-        return theblend, study_concepts
-
-    def get_eigenstuff(self):
+            kwargs = {}
+        with self.instrumentation.stage('svd', engine=engine,
+                                        k=self.config('axes'),
+                                        rows=matrix.shape[0], cols=matrix.shape[1],
+                                        nnz=matrix.nnz) as sizes:
+            U, Sigma, V, residual = truncated_svd(matrix, self.config('axes'),
+                                                  engine, **kwargs)
+            sizes['residual'] = residual
+        logger.info('%s SVD took %.1f seconds; relative residual %.3g'
+                    % (engine, self.instrumentation.stages[-1]['wall_seconds'],
+                       residual))
+        return U, Sigma, V, residual
+
+    def get_eigenstuff(self, warm_start=None):
         self._step('Finding eigenvectors...')
         document_matrix = self.get_documents_matrix()
         theblend, study_concepts = self.get_blend()
-        U, Sigma, V = theblend.normalize_all().svd(k=self.config('axes'))
-        indices = [U.row_index(concept) for concept in study_concepts]
-        reduced_U = U[indices]
-        if self.is_associative():
-            doc_rows = divisi2.aligned_matrix_multiply(document_matrix, reduced_U)
-            projections = reduced_U.extend(doc_rows)
+        U, Sigma, V, residual = self.get_svd(theblend.normalize_all(), warm_start)
+        self._svd_residual = residual
+        with self.instrumentation.stage('projection',
+                                        concepts=len(study_concepts),
+                                        documents=document_matrix.shape[0]):
+            indices = [U.row_index(concept) for concept in study_concepts]
+            reduced_U = U[indices]
+            if self.is_associative():
+                # The right singular vectors of the study's concepts are
+                # what update_analysis needs to fold in new concepts.
+                self._svd_right = V[[V.row_index(concept)
+                                     for concept in study_concepts]]
+                doc_rows = divisi2.aligned_matrix_multiply(document_matrix, reduced_U)
+                projections = reduced_U.extend(doc_rows)
 
-        else:
-            doc_indices = [V.row_index(doc.name)
-                           for doc in self.documents
-                           if doc.name in V.row_labels]
-            projections = reduced_U.extend(V[doc_indices])
+            else:
+                doc_indices = [V.row_index(doc.name)
+                               for doc in self.documents
+                               if doc.name in V.row_labels]
+                projections = reduced_U.extend(V[doc_indices])
         
         #if SUBTRACT_MEAN:
         #    sdoc_indices = [projections.row_index(doc.name) for doc in
@@ -403,38 +893,15 @@ class Study(QtCore.QObject):
             consistency = doc_mean / doc_stderr
             centrality = divisi2.DenseVector((all_assoc - doc_mean) / doc_stderr, spectral.row_labels)
             correlation = divisi2.DenseVector(all_assoc / doc_stderr, spectral.row_labels)
-            core = centrality.top_items(len(centrality)/2)
-            core = [c[0] for c in core
-                    if c[0] in valid_concepts
-                    and c[1] > .001][:20]
+            core = self._core_concepts(centrality, concept_indices)
 
             c_centrality = {}
             c_correlation = {}
-            key_concepts = {}
-            
-            # the number of times each concept appears in each document
-            doc_occur = self._documents_matrix
-
-            # the average number of occurrences you expect of each document
-            baseline = (1.0 + doc_occur.col_op(len)) / doc_occur.shape[0]
             for doc in self.canonical_documents:
                 # record centrality and correlation for this document
                 c_centrality[doc.name] = centrality.entry_named(doc.name)
                 c_correlation[doc.name] = correlation.entry_named(doc.name)
-
-                # find a weighted vector of similar documents
-                docvec = np.maximum(0, spectral.row_named(doc.name)[doc_indices]) ** 3
-                docvec /= (0.0001 + np.sum(docvec))
-                keyvec = divisi2.aligned_matrix_multiply(docvec, doc_occur)
-
-                assert not any(np.isnan(keyvec))
-                assert not any(np.isinf(keyvec))
-                interesting = spectral.row_named(doc.name)[concept_indices]
-                #interesting = keyvec/baseline
-                key_concepts[doc.name] = []
-                for key, val in interesting.top_items(5):
-                    if val > 0.0 and keyvec.entry_named(key) > 0.0:
-                        key_concepts[doc.name].append((key, keyvec.entry_named(key)))
+            key_concepts = self._key_concepts(spectral, doc_indices, concept_indices)
         
         return {
             'num_documents': self.num_documents,
@@ -447,34 +914,258 @@ class Study(QtCore.QObject):
             'timestamp': list(time.localtime())
         }
     
-    def analyze(self):
+    def _core_concepts(self, centrality, concept_indices, n=20):
+        """
+        Find the `n` most central concepts, out of those in the more central
+        half of the study.
+        """
+        values = np.asarray(centrality)
+        candidates = np.zeros((len(values),), dtype=np.bool_)
+        candidates[concept_indices] = True
+        half = len(values) // 2
+        if half == 0: return []
+        # the centrality of the least central item in the central half
+        cutoff = np.partition(values, len(values) - half)[len(values) - half]
+        candidates &= (values > .001) & (values >= cutoff)
+        candidates = np.flatnonzero(candidates)
+        core = candidates[top_k_indices(values[candidates], n)]
+        return [centrality.label(i) for i in core]
+
+    def _key_concepts(self, spectral, doc_indices, concept_indices, n=5):
+        """
+        Find the key concepts of each canonical document: up to `n` of the
+        concepts most associated with it, weighted by how often they occur in
+        the study documents most similar to it.
+
+        Canonical documents are handled `CANONICAL_BATCH` at a time, as rows of
+        a dense block, so each batch takes a few matrix products instead of a
+        loop over documents.
+        """
+        key_concepts = {}
+        if not self.canonical_documents: return key_concepts
+
+        # the number of times each concept appears in each study document,
+        # in the same order as doc_indices
+        doc_occur = self._documents_matrix
+        occur_rows = [doc_occur.row_index(spectral.row_labels[i])
+                      for i in doc_indices]
+        occur = doc_occur.to_scipy_csr()[occur_rows].tocsc()
+        concept_cols = np.array([_index_or_missing(doc_occur.col_labels,
+                                                   spectral.row_labels[i])
+                                 for i in concept_indices])
+
+        names = [doc.name for doc in self.canonical_documents]
+        for start in xrange(0, len(names), CANONICAL_BATCH):
+            batch = names[start:start+CANONICAL_BATCH]
+            rows = [spectral.row_index(name) for name in batch]
+            assoc = (np.dot(np.asarray(spectral.left[rows]),
+                            np.asarray(spectral.right))
+                     + spectral.total_shift + spectral.col_shift
+                     + np.asarray(spectral.row_shift)[rows][:, np.newaxis])
+
+            # find a weighted vector of similar documents for each canonical
+            # document
+            docvecs = np.maximum(0, assoc[:, doc_indices]) ** 3
+            docvecs /= (0.0001 + np.sum(docvecs, axis=1))[:, np.newaxis]
+
+            interesting = assoc[:, concept_indices]
+            top = [top_k_indices(row, n) for row in interesting]
+            # Only the occurrences of the top concepts are needed.
+            needed = np.unique(np.concatenate(top + [np.zeros((0,), dtype=int)]))
+            needed_cols = concept_cols[needed]
+            keyvecs = np.zeros((len(batch), len(needed)))
+            present = needed_cols >= 0
+            if np.any(present):
+                keyvecs[:, present] = (occur[:, needed_cols[present]].T
+                                       * docvecs.T).T
+            assert not np.any(np.isnan(keyvecs))
+            assert not np.any(np.isinf(keyvecs))
+
+            for row, name in enumerate(batch):
+                key_concepts[name] = []
+                for j in top[row]:
+                    val = interesting[row, j]
+                    keyval = keyvecs[row, np.searchsorted(needed, j)]
+                    if val > 0.0 and keyval > 0.0:
+                        label = spectral.row_labels[concept_indices[j]]
+                        key_concepts[name].append((label, keyval))
+        return key_concepts
+
+    def analyze(self, warm_start=None):
+        """
+        Analyze the study from scratch. `warm_start` optionally holds the
+        eigenvectors of an earlier analysis; see `get_svd`.
+        """
         # TODO: make it possible to blend multiple directories
-        self._documents_matrix = None
-        docs, projections, Sigma = self.get_eigenstuff()
-        magnitudes = np.sqrt(np.sum(np.asarray(projections*projections), axis=1))
-        if self.is_associative():
-            spectral = divisi2.reconstruct_activation(projections, Sigma, post_normalize=True, offset=0.0001)
-        else:
-            spectral = divisi2.reconstruct_similarity(projections, Sigma,
-            post_normalize=True, offset=0.0001)
+        self.instrumentation.clear()
+        self._reset_concepts()
+        docs, projections, Sigma = self.get_eigenstuff(warm_start)
+        svd = {'eigenvectors': projections, 'sigma': Sigma,
+               'right': self._svd_right,
+               'documents': [doc.name for doc in self.documents],
+               'engine': self.config('svd_engine'),
+               'residual': self._svd_residual}
+        return self._make_results(docs, projections, Sigma, svd)
+
+    def _make_results(self, docs, projections, Sigma, svd):
+        with self.instrumentation.stage('reconstruction',
+                                        rows=projections.shape[0],
+                                        k=projections.shape[1]):
+            magnitudes = np.sqrt(np.sum(np.asarray(projections*projections), axis=1))
+            if self.is_associative():
+                spectral = divisi2.reconstruct_activation(projections, Sigma, post_normalize=True, offset=0.0001)
+            else:
+                spectral = divisi2.reconstruct_similarity(projections, Sigma,
+                post_normalize=True, offset=0.0001)
         self._step('Calculating stats...')
-        stats = self.compute_stats(docs, spectral)
+        with self.instrumentation.stage('stats',
+                                        documents=len(self.study_documents),
+                                        canonical=len(self.canonical_documents)):
+            stats = self.compute_stats(docs, spectral)
+        if svd is not None:
+            stats['svd_engine'] = svd.get('engine', 'lanczos')
+            stats['svd_residual'] = svd.get('residual')
         
-        results = StudyResults(self, docs, spectral.left, spectral, magnitudes, stats)
+        results = StudyResults(self, docs, spectral.left, spectral, magnitudes, stats, svd)
         return results
 
+    def update_analysis(self, previous, added):
+        """
+        Update `previous`, the StudyResults of an earlier analysis of this
+        study, to include the documents named in `added`, without
+        recomputing the SVD.
+
+        The concepts that were already in the analysis keep their
+        eigenvectors. New concepts that pass the concept cutoff are folded
+        in to the previous SVD: each one's row of the normalized association
+        matrix, over the concepts the SVD knows, is projected onto their
+        right singular vectors and scaled by the inverse singular values
+        (see `fold_in`). Document vectors are then recomputed from the
+        concept vectors, exactly as in a full analysis.
+
+        Folding in doesn't move the existing vectors, so the results drift
+        from what a full analysis would give as more of the study is made of
+        documents the SVD has never seen. The drift is estimated as the
+        larger of:
+
+        - the fraction of the documents matrix's weight that is in documents
+          added since the last full SVD
+        - the fraction of the new documents' weight that is on valid concepts
+          (see get_valid_concepts) that the SVD has never seen
+
+        If it is above the 'incremental_drift' setting, or the previous
+        results can't be updated incrementally at all, this returns None,
+        and the study should be analyzed from scratch.
+        """
+        svd = previous.svd
+        if svd is None or svd.get('right') is None or not self.is_associative():
+            return None
+        added = set(added)
+        self.instrumentation.clear()
+        self._reset_concepts()
+        docs = self.get_documents_matrix()
+
+        self._step('Updating eigenvectors...')
+        doc_names = set(doc.name for doc in self.documents)
+        old_vectors = svd['eigenvectors']
+        concept_indices = [i for i, label in enumerate(old_vectors.row_labels)
+                           if label not in doc_names]
+        concept_U = old_vectors[concept_indices]
+        known = set(concept_U.row_labels)
+        right = svd['right']
+        Sigma = svd['sigma']
+
+        # Estimate the drift before doing any more work.
+        svd_documents = set(svd['documents'])
+        row_weights = docs.row_op(entry_count)
+        new_indices = [docs.row_index(name) for name in added
+                       if name in docs.row_labels]
+        unseen_indices = [i for i, label in enumerate(row_weights.labels)
+                          if label not in svd_documents]
+        total_weight = np.sum(np.asarray(row_weights))
+        new_docs = docs[new_indices]
+        new_weight = entry_count(new_docs.values())
+        valid_concepts = self.get_valid_concepts()
+        unknown_weight = sum(abs(value) for value, _, concept
+                             in new_docs.named_entries()
+                             if concept in valid_concepts
+                             and concept not in known)
+        drift = max(np.sum(np.asarray(row_weights)[unseen_indices]) / total_weight,
+                    unknown_weight / max(new_weight, 1e-9))
+        logger.info('Estimated drift from the last full analysis: %4.4f' % drift)
+        if drift > self.config('incremental_drift'):
+            return None
+
+        # Fold in new concepts, using their associations across the whole
+        # study, normalized as they are in the blend.
+        assoc = self.get_documents_assoc()
+        if assoc is not None:
+            new_concepts = [c for c in assoc.row_labels if c not in known]
+            if new_concepts:
+                normalized = assoc.normalize_all()
+                known_cols = [normalized.col_index(c) for c in right.row_labels
+                              if c in normalized.col_labels]
+                rows = normalized[[normalized.row_index(c) for c in new_concepts]]
+                rows = rows[:, known_cols].squish()
+                if rows.shape[0] > 0:
+                    concept_U = concept_U.extend(fold_in(rows, right, Sigma))
+
+        doc_rows = divisi2.aligned_matrix_multiply(docs, concept_U)
+        projections = concept_U.extend(doc_rows)
+        if SUBTRACT_MEAN:
+            projections -= np.asarray(projections).mean(axis=0)
+        new_svd = {'eigenvectors': projections, 'sigma': Sigma,
+                   'right': right,
+                   'documents': svd['documents'],
+                   'engine': svd.get('engine', 'lanczos'),
+                   'residual': svd.get('residual')}
+        return self._make_results(docs, projections, Sigma, new_svd)
+
+# Bump this when the way StudyResults are saved changes.
+RESULTS_FORMAT_VERSION = 2
+
+# The files that results were saved in before RESULTS_FORMAT_VERSION 2.
+LEGACY_RESULT_FILES = ['documents.smat', 'spectral.rmat', 'projections.dmat',
+                       'magnitudes.dvec']
+
 class StudyResults(QtCore.QObject):
-    def __init__(self, study, docs, projections, spectral, magnitudes, stats):
+    def __init__(self, study, docs, projections, spectral, magnitudes, stats, svd=None):
+        """
+        `svd` is a dictionary describing the decomposition the results came
+        from, which Study.update_analysis uses to update them:
+
+        - 'eigenvectors': the unnormalized projections of concepts and
+          documents
+        - 'sigma': the singular values
+        - 'right': the right singular vectors of the study's concepts, for
+          folding in new ones (associative studies only)
+        - 'documents': the names of the documents that were part of the
+          matrix when its SVD was computed
+        """
         QtCore.QObject.__init__(self)
         self.study = study
-        self.docs = docs
+        self._docs = docs
+        self._docs_loader = None
         self.spectral = spectral
         self.projections = projections
         self.magnitudes = magnitudes
         self.stats = stats
+        self.svd = svd
         self.canonical_filenames = [doc.name for doc in study.canonical_documents]
         self.info = render_info_page(self)
 
+    def _get_docs(self):
+        if self._docs is None and self._docs_loader is not None:
+            self.study._step('Loading document matrix...')
+            self._docs = self._docs_loader()
+            self._docs_loader = None
+        return self._docs
+    def _set_docs(self, docs):
+        self._docs = docs
+        self._docs_loader = None
+    # The document matrix is only read from disk when it is used.
+    docs = property(_get_docs, _set_docs)
+
     def write_coords_as_csv(self, filename):
         # FIXME: not divisi2 ready
         raise NotImplementedError
@@ -540,22 +1231,46 @@ class StudyResults(QtCore.QObject):
         return html
 
     def save(self, dir):
+        instrumentation = self.study.instrumentation
+        with instrumentation.stage('save', documents=len(self.docs.row_labels)):
+            self._save(dir)
+        # Saved on its own afterward, so that it includes saving.
+        instrumentation.save(os.path.join(dir, 'timings.json'))
+
+    def _save(self, dir):
         def tgt(name): return os.path.join(dir, name)
         def save_pickle(name, obj):
             with open(tgt(name), 'wb') as out:
                 pickle.dump(obj, out, -1)
 
+        # Remove results in the old pickled format, so they can't be
+        # mistaken for these, and mark the results as incomplete until they
+        # are all saved.
+        for name in LEGACY_RESULT_FILES + ['svd.pickle', 'svd.json',
+                                            'format.json']:
+            if os.path.exists(tgt(name)): os.remove(tgt(name))
+
         self.study._step('Saving document matrix...')
-        save_pickle("documents.smat", self.docs)
+        matrix_files.save_sparse(dir, 'documents', self.docs)
 
-        self.study._step('Saving eigenvectors...')
-        save_pickle("spectral.rmat", self.spectral)
-        
         self.study._step('Saving projections...')
-        save_pickle('projections.dmat', self.projections)
+        matrix_files.save_dense(dir, 'projections', self.projections)
+
+        self.study._step('Saving eigenvectors...')
+        if self.spectral.symmetric and self.spectral.left is self.projections:
+            # The spectral matrix is projections * projections^T.
+            spectral_format = 'symmetric'
+        else:
+            spectral_format = 'factors'
+            matrix_files.save_dense(dir, 'spectral.left', self.spectral.left)
+            matrix_files.save_dense(dir, 'spectral.right', self.spectral.right)
 
         self.study._step('Saving magnitudes...')
-        save_pickle('magnitudes.dvec', self.magnitudes)
+        matrix_files.save_dense(dir, 'magnitudes', self.magnitudes)
+
+        if self.svd is not None:
+            self.study._step('Saving SVD...')
+            self._save_svd(dir)
 
         self.study._step('Writing reports...')
         # Save stats
@@ -566,22 +1281,109 @@ class StudyResults(QtCore.QObject):
         # Save input contents hash to know if the study has changed.
         save_pickle('input_hash.pickle', self.study.get_contents_hash())
 
-    @classmethod
-    def load(cls, dir, for_study):
-        def tgt(name): return os.path.join(dir, name)
-        def load_pickle(name):
-            with open(tgt(name), 'rb') as f:
-                return pickle.load(f)
+        # Written last, so that it only exists if everything else was saved.
+        write_json_to_file({'version': RESULTS_FORMAT_VERSION,
+                            'spectral': spectral_format},
+                           tgt('format.json'))
+
+    def _save_svd(self, dir):
+        svd = self.svd
+        matrix_files.save_dense(dir, 'svd.eigenvectors', svd['eigenvectors'])
+        matrix_files.save_dense(dir, 'svd.sigma', svd['sigma'])
+        has_right = svd.get('right') is not None
+        if has_right:
+            matrix_files.save_dense(dir, 'svd.right', svd['right'])
+        write_json_to_file({'documents': svd['documents'],
+                            'engine': svd.get('engine', 'lanczos'),
+                            'residual': svd.get('residual'),
+                            'right': has_right},
+                           os.path.join(dir, 'svd.json'))
 
-        # Either this will all fail or all succeed.
+    @staticmethod
+    def load_input_hash(dir):
+        """
+        Get the contents hash of the study that the results in `dir` were
+        computed from.
+        """
         try:
-            input_hash = load_pickle('input_hash.pickle')
+            with open(os.path.join(dir, 'input_hash.pickle'), 'rb') as f:
+                return pickle.load(f)
         except IOError:
             raise OutdatedAnalysisError()
-        cur_hash = for_study.get_contents_hash()
-        if input_hash != cur_hash:
+
+    @staticmethod
+    def load_svd(dir):
+        """
+        Get the description of the SVD that the results in `dir` came from,
+        or None if there isn't one. Its matrices are memory-mapped, so this
+        doesn't read them yet.
+        """
+        if os.path.exists(os.path.join(dir, 'svd.json')):
+            svd = load_json_from_file(os.path.join(dir, 'svd.json'))
+            svd['eigenvectors'] = matrix_files.load_dense(dir, 'svd.eigenvectors')
+            svd['sigma'] = matrix_files.load_dense(dir, 'svd.sigma')
+            if svd['right']:
+                svd['right'] = matrix_files.load_dense(dir, 'svd.right')
+            else:
+                svd['right'] = None
+            return svd
+        try:
+            # Results from before the SVD was saved as arrays.
+            with open(os.path.join(dir, 'svd.pickle'), 'rb') as f:
+                return pickle.load(f)
+        except (IOError, EOFError, pickle.UnpicklingError):
+            # Results from before incremental updates were possible.
+            return None
+
+    @classmethod
+    def load(cls, dir, for_study, check_hash=True):
+        """
+        Load the results saved in `dir`.
+
+        Unless `check_hash` is false, this raises an OutdatedAnalysisError if
+        `for_study` has changed since the results were computed.
+        """
+        def tgt(name): return os.path.join(dir, name)
+
+        # Either this will all fail or all succeed.
+        input_hash = cls.load_input_hash(dir)
+        if check_hash and input_hash != for_study.get_contents_hash():
             raise OutdatedAnalysisError()
         
+        svd = cls.load_svd(dir)
+        for_study._step('Loading stats...')
+        stats = load_json_from_file(tgt("stats.json"))
+
+        if not os.path.exists(tgt('format.json')):
+            return cls._load_legacy(dir, for_study, stats, svd)
+        format = load_json_from_file(tgt('format.json'))
+        if format['version'] != RESULTS_FORMAT_VERSION:
+            raise OutdatedAnalysisError()
+
+        # Dense matrices are memory-mapped, so this doesn't read them yet.
+        for_study._step('Loading projections...')
+        projections = matrix_files.load_dense(dir, 'projections')
+        if format['spectral'] == 'symmetric':
+            spectral = reconstruct_symmetric(projections)
+        else:
+            spectral = ReconstructedMatrix(
+                matrix_files.load_dense(dir, 'spectral.left'),
+                matrix_files.load_dense(dir, 'spectral.right'))
+        magnitudes = matrix_files.load_dense(dir, 'magnitudes')
+
+        results = cls(for_study, None, projections, spectral, magnitudes, stats, svd)
+        results._docs_loader = lambda: matrix_files.load_sparse(dir, 'documents')
+        return results
+
+    @classmethod
+    def _load_legacy(cls, dir, for_study, stats, svd):
+        """
+        Load results saved as pickles by earlier versions of Luminoso.
+        """
+        def load_pickle(name):
+            with open(os.path.join(dir, name), 'rb') as f:
+                return pickle.load(f)
+
         for_study._step('Loading document matrix...')
         docs = load_pickle("documents.smat")
         for_study._step('Loading eigenvectors...')
@@ -590,42 +1392,85 @@ class StudyResults(QtCore.QObject):
         projections = load_pickle("projections.dmat")
         for_study._step('Loading magnitudes...')
         magnitudes = load_pickle("magnitudes.dvec")
-
-        # Load stats
-        for_study._step('Loading stats...')
-        stats = load_json_from_file(tgt("stats.json"))
-
-        return cls(for_study, docs, projections, spectral, magnitudes, stats)
+        return cls(for_study, docs, projections, spectral, magnitudes, stats, svd)
 
 class StudyLoadError(Exception): pass
 
+# What StudyDirectory._update_analysis returns when the saved results are
+# already up to date.
+ANALYSIS_CURRENT = 'current'
+
 class StudyDirectory(QtCore.QObject):
     '''
     A StudyDirectory manages the directory representing a study. It has three responsibilites:
      - loading the documents, both study and canonical
      - storing settings, such as the number of axes to compute
      - caching analysis results for speed
+
+    `matrix_cache`, if given, is a SizedLRUCache that holds the matrices
+    loaded from Matrices, keyed by the hash of their contents, so that
+    StudyDirectories sharing it load a matrix such as ConceptNet only once.
+    Matrices from the cache are shared, so they must not be modified.
+
+    Files in Matrices named `*.smat.ref` stand for matrices in the shared
+    `matrix_store` (a MatrixStore, by default the one for this machine).
     '''
-    def __init__(self, dir):
+    def __init__(self, dir, matrix_cache=None, matrix_store=None):
         QtCore.QObject.__init__(self)
         self.dir = dir.rstrip(os.path.sep)
+        self.matrix_cache = matrix_cache
+        self._matrix_store = matrix_store
         self.load_settings()
 
+    @property
+    def matrix_store(self):
+        if self._matrix_store is None:
+            self._matrix_store = MatrixStore()
+        return self._matrix_store
+
     @staticmethod
-    def make_new(destdir):
+    def make_new(destdir, matrix_store=None):
         # make a new study... the hard way.
         def dest_path(x): return os.path.join(destdir, x)
         try:
             os.mkdir(destdir)
             for dir in ['Canonical', 'Documents', 'Matrices', 'Results']:
                 os.mkdir(dest_path(dir))
-            shutil.copy(os.path.join(package_dir, 'study_skel', 'Matrices', 'conceptnet_en.assoc.smat'),
-                        os.path.join(destdir, 'Matrices', 'conceptnet_en.assoc.smat'))
+            study_dir = StudyDirectory(destdir, matrix_store=matrix_store)
+            study_dir.add_shared_matrix(
+                os.path.join(package_dir, 'study_skel', 'Matrices', 'conceptnet_en.assoc.smat'))
             write_json_to_file({}, dest_path('settings.json'))
         except (IOError, OSError):
             raise StudyLoadError
 
-        return StudyDirectory(destdir)
+        return StudyDirectory(destdir, matrix_store=matrix_store)
+
+    def add_shared_matrix(self, filename):
+        """
+        Make the matrix in `filename` part of this study, as a reference to
+        the shared matrix store. If the store can't be written, the file is
+        copied into the study instead.
+        """
+        dest = os.path.join(self.get_matrices_dir(), os.path.basename(filename))
+        try:
+            digest = self.matrix_store.add_file(filename)
+        except (IOError, OSError):
+            logger.warn('Could not add %s to the matrix store %s; copying it'
+                        % (filename, self.matrix_store.dir))
+            shutil.copy(filename, dest)
+            return
+        write_reference(dest + REFERENCE_SUFFIX, digest)
+
+    def share_matrices(self):
+        """
+        Move this study's own matrix files into the shared matrix store,
+        leaving references in their place.
+        """
+        for filename in self.get_matrices_files():
+            if filename.endswith('.smat'):
+                write_reference(filename + REFERENCE_SUFFIX,
+                                self.matrix_store.add_file(filename))
+                os.remove(filename)
     
     def _ensure_dir_exists(self, targetdir):
         path = os.path.join(self.dir, targetdir)
@@ -687,39 +1532,217 @@ class StudyDirectory(QtCore.QObject):
             
         return self.listdir('Matrices', text_only=False, full_names=True)
 
-    def get_documents(self):
-        study_documents = [Document.from_file(filename, name=os.path.basename(filename))
+    def get_documents(self, manifest=None):
+        """
+        Get the study documents. If a Manifest is given, it supplies the
+        encodings and hashes of files that haven't changed since they were
+        recorded.
+        """
+        study_documents = [Document.from_file(filename, name=os.path.basename(filename),
+                                              encoding=self._known_encoding('Documents', filename, manifest),
+                                              digest=self._known_hash('Documents', filename, manifest))
                            for filename in self.listdir('Documents', text_only=True, full_names=True)]
         return study_documents
 
-    def get_canonical_documents(self):
+    def get_canonical_documents(self, manifest=None):
         self._ensure_dir_exists("Canonical")
-        canonical_documents = [CanonicalDocument.from_file(filename, name=os.path.basename(filename))
+        canonical_documents = [CanonicalDocument.from_file(filename, name=os.path.basename(filename),
+                                                           encoding=self._known_encoding('Canonical', filename, manifest),
+                                                           digest=self._known_hash('Canonical', filename, manifest))
                                for filename in self.listdir('Canonical', text_only=True, full_names=True)]
         return canonical_documents
 
-    def get_matrices(self):
-        return dict((os.path.basename(filename), divisi2.load(filename))
-                    for filename in self.get_matrices_files()
-                    if filename.endswith('.smat'))
+    def _known_encoding(self, dirname, filename, manifest):
+        if manifest is None: return None
+        return manifest.get_encoding(dirname, filename)
+
+    def _known_hash(self, dirname, filename, manifest):
+        if manifest is None: return None
+        return manifest.get_hash(dirname, filename)
+
+    def get_matrices(self, manifest=None):
+        """
+        Get MatrixHandles for the matrices in Matrices, by name, without
+        loading them. A reference to a shared matrix has the name of the
+        matrix file it stands for.
+
+        The digest of a matrix file is its SHA-1 hash, taken from `manifest`
+        if it's current there, and its shape is known if it was recorded in
+        `manifest`.
+        """
+        matrices = {}
+        for filename in self.get_matrices_files():
+            if filename.endswith('.smat'):
+                handle = self._matrix_handle(filename, manifest)
+            elif filename.endswith('.smat' + REFERENCE_SUFFIX):
+                handle = self._shared_matrix_handle(filename)
+            else:
+                continue
+            matrices[handle.name] = handle
+        return matrices
+
+    def _matrix_handle(self, filename, manifest):
+        digest = shape = None
+        if manifest is not None:
+            digest = manifest.get_hash('Matrices', filename)
+            shape = manifest.get_shape('Matrices', filename)
+        if digest is None:
+            digest = lambda: file_hash(filename)
+        handle = MatrixHandle(os.path.basename(filename),
+                              lambda: self._load_matrix(filename, handle.digest),
+                              digest, shape, filename)
+        return handle
+
+    def _shared_matrix_handle(self, filename):
+        digest = read_reference(filename)
+        meta = self.matrix_store.metadata(digest)
+        name = os.path.basename(filename)[:-len(REFERENCE_SUFFIX)]
+        return MatrixHandle(name, lambda: self._load_shared_matrix(digest),
+                            digest, meta and meta['shape'], filename)
+
+    def _load_matrix(self, filename, digest):
+        return self._cached_matrix(digest, lambda: divisi2.load(filename))
+
+    def _load_shared_matrix(self, digest):
+        # The digest is the hash of the original file, so this shares the
+        # cache with copies of the same matrix.
+        return self._cached_matrix(digest,
+                                   lambda: self.matrix_store.load(digest))
+
+    def _cached_matrix(self, digest, load):
+        if self.matrix_cache is None:
+            return load()
+        matrix = self.matrix_cache.get(digest)
+        if matrix is None:
+            matrix = load()
+            self.matrix_cache.put(digest, matrix, matrix_nbytes(matrix))
+        return matrix
     
 
-    def get_study(self):
+    def get_study(self, manifest=None):
+        """
+        Get the Study in this directory. Its documents are read when they are
+        needed, using the encodings recorded in `manifest`, or in the
+        manifest of the saved results if none is given.
+        """
+        if manifest is None: manifest = self.load_manifest()
         try:
             return Study(name=self.dir.split(os.path.sep)[-1],
-                         documents=self.get_documents(),
-                         canonical=self.get_canonical_documents(),
-                         other_matrices=self.get_matrices(),
+                         documents=self.get_documents(manifest),
+                         canonical=self.get_canonical_documents(manifest),
+                         other_matrices=self.get_matrices(manifest),
                          settings = self.settings
                         )
         except (IOError, OSError):
             raise StudyLoadError
 
-    def analyze(self):
-        study = self.get_study()
-        results = study.analyze()
+    def analyze(self, incremental=False):
+        """
+        Analyze the study and save the results.
+
+        If `incremental` is true, and the only change since the last analysis
+        is that study documents were added, try to update the last analysis
+        with Study.update_analysis instead of starting over.
+        """
+        previous_manifest = self.load_manifest()
+        manifest = Manifest.scan(self.dir, previous_manifest,
+                                 settings_hash(self.settings))
+        study = self.get_study(manifest)
+        results = None
+        if incremental:
+            results = self._update_analysis(study, previous_manifest, manifest)
+        if results is ANALYSIS_CURRENT:
+            # Nothing was added, so the saved results are still right, and
+            # rewriting them would only disturb anything that has them open.
+            try:
+                results = StudyResults.load(self.study_path('Results'), study,
+                                            check_hash=False)
+            except (IOError, EOFError, ValueError, pickle.UnpicklingError,
+                    OutdatedAnalysisError):
+                results = None
+            else:
+                self._save_manifest(study, manifest)
+                return results
+        if results is None:
+            results = study.analyze(warm_start=self._warm_start(study))
         self._ensure_dir_exists('Results')
+        if os.path.exists(self.get_manifest_file()):
+            # The old manifest no longer describes what's in Results.
+            os.remove(self.get_manifest_file())
         results.save(self.study_path('Results'))
+        self._save_manifest(study, manifest)
+        return results
+
+    def _save_manifest(self, study, manifest):
+        """
+        Save `manifest` as the description of the saved results, along with
+        what `study` found out about its inputs while it was analyzed.
+        """
+        for dirname, docs in (('Documents', study.study_documents),
+                              ('Canonical', study.canonical_documents)):
+            for doc in docs:
+                if doc.encoding is not None:
+                    manifest.set_encoding(dirname, doc.filename, doc.encoding)
+        for handle in study.other_matrices.values():
+            if isinstance(handle, MatrixHandle) and handle.shape is not None:
+                manifest.set_shape('Matrices', handle.filename, handle.shape)
+        manifest.save(self.get_manifest_file())
+
+    def get_manifest_file(self):
+        return self.study_path(os.path.join('Results', 'manifest.json'))
+
+    def load_manifest(self):
+        """
+        Get the Manifest of the inputs that the saved results were computed
+        from, or None if there isn't one.
+        """
+        return Manifest.load(self.get_manifest_file())
+
+    def _warm_start(self, study):
+        """
+        Find the eigenvectors of the last analysis, if the study will use
+        them to warm-start its SVD.
+        """
+        if study.config('svd_engine') != 'randomized': return None
+        if not study.config('svd_warm_start'): return None
+        svd = StudyResults.load_svd(self.study_path('Results'))
+        if svd is None: return None
+        return svd['eigenvectors']
+
+    def _update_analysis(self, study, old_manifest, new_manifest):
+        """
+        Get the results of updating the last analysis to `new_manifest`, or
+        ANALYSIS_CURRENT if no documents were added, or None if the study has
+        to be analyzed from scratch.
+        """
+        results_dir = self.study_path('Results')
+        if old_manifest is None:
+            return None
+        if old_manifest.settings != new_manifest.settings:
+            # The settings changed, so the SVD may not fit them.
+            return None
+        old_files, new_files = old_manifest.contents(), new_manifest.contents()
+        for path, value in old_files.items():
+            if new_files.get(path) != value:
+                # A document or matrix was changed or removed.
+                return None
+        added_paths = set(path for path in new_files if path not in old_files)
+        if any(new_files[path][0] != 'document' for path in added_paths):
+            # Canonical documents or matrices were added.
+            return None
+        added = [doc.name for doc in study.study_documents
+                 if input_path('Documents', doc.name) in added_paths]
+        if not added:
+            return ANALYSIS_CURRENT
+
+        try:
+            previous = StudyResults.load(results_dir, study, check_hash=False)
+        except (IOError, EOFError, ValueError, pickle.UnpicklingError,
+                OutdatedAnalysisError):
+            return None
+        results = study.update_analysis(previous, added)
+        if results is None:
+            logger.info('Study has changed too much to update; analyzing it from scratch.')
         return results
 
     def set_setting(self, key, value):
@@ -729,24 +1752,78 @@ class StudyDirectory(QtCore.QObject):
     def set_num_axes(self, axes):
         self.set_setting('axes', axes)
     
+    def check_manifest(self):
+        """
+        If the saved results have a manifest and are up to date, return a
+        current Manifest of the study's inputs. Otherwise return None.
+
+        Only files whose size or modification time changed since the analysis
+        are read to check this.
+        """
+        manifest = self.load_manifest()
+        if manifest is None: return None
+        if not os.path.exists(self.study_path(os.path.join('Results', 'format.json'))):
+            return None
+        current = Manifest.scan(self.dir, manifest, settings_hash(self.settings))
+        if not current.same_contents(manifest):
+            return None
+        if current.files != manifest.files:
+            # Files were touched without changing; remember their new
+            # times so we don't hash them again.
+            current.save(self.get_manifest_file())
+        return current
+
+    def is_analysis_current(self):
+        """
+        Check whether the saved results are up to date, without loading
+        them. Results from before manifests are never considered current.
+        """
+        return self.check_manifest() is not None
+
     def get_existing_analysis(self):
-        # FIXME: this loads the study twice, I think
+        """
+        Load the saved results, or return None if they are out of date.
+        Results from before manifests are always out of date: the input
+        hash saved with them was computed differently, so there's nothing
+        to check them against.
+        """
+        results_dir = self.study_path('Results')
         try:
-            return StudyResults.load(self.study_path('Results'), self.get_study())
+            if self.load_manifest() is None:
+                raise OutdatedAnalysisError()
+            current = self.check_manifest()
+            if current is None:
+                raise OutdatedAnalysisError()
+            return StudyResults.load(results_dir, self.get_study(current), check_hash=False)
         except OutdatedAnalysisError:
             print "Skipping outdated analysis."
             return None
 
-def run_study(dirname):
+def freeze_support():
+    """
+    Let a frozen Windows build start worker processes without running the
+    whole program again in each one. Entry points call this first.
+    """
+    try:
+        import multiprocessing
+    except ImportError:
+        return
+    multiprocessing.freeze_support()
+
+def run_study(dirname, incremental=False):
     study = StudyDirectory(dirname)
-    study.analyze()
+    study.analyze(incremental=incremental)
 
 def main():
+    freeze_support()
     logging.basicConfig(level=logging.INFO)
-    if len(sys.argv) > 1:
-        run_study(sys.argv[1])
+    args = sys.argv[1:]
+    incremental = '--incremental' in args
+    args = [arg for arg in args if arg != '--incremental']
+    if args:
+        run_study(args[0], incremental=incremental)
     else:
-        print 'Run "luminoso-study StudyDir" to analyze a study directory.'
+        print 'Run "luminoso-study [--incremental] StudyDir" to analyze a study directory.'
 
 import sys
 if __name__ == '__main__':
@@ -0,0 +1,166 @@
+"""
+Ways of computing the truncated SVD of a study's blend.
+
+The 'lanczos' engine is Divisi's own SVD (SVDLIBC), which is accurate but can
+take minutes on blends of ConceptNet with a large study. The 'randomized'
+engine finds an approximate basis for the range of the matrix by multiplying
+it by a random block of vectors, then takes an exact SVD of the matrix
+projected onto that basis (Halko, Martinsson and Tropp, "Finding structure
+with randomness", 2009). It takes a few sparse matrix products instead of
+hundreds of Lanczos iterations.
+
+Every engine returns (U, Sigma, V) in the same form as divisi2's `svd`.
+The matrix can be a divisi2 SparseMatrix, or a labeled SciPy LinearOperator
+such as a BlendOperator (see luminoso/blend_operator.py), which the
+'lanczos' engine factors with ARPACK instead of SVDLIBC.
+`truncated_svd` also measures the relative residual of the decomposition, so
+that studies can see how much accuracy they traded for speed. That takes
+one product of the matrix with k vectors, without copying the matrix.
+"""
+import numpy as np
+from scipy import linalg
+from scipy.sparse.linalg import LinearOperator, svds
+
+from csc.divisi2.dense import DenseMatrix
+
+# Extra random vectors to sample beyond the number of axes. More make the
+# randomized SVD more accurate.
+DEFAULT_OVERSAMPLE = 10
+
+# How many times to multiply the sample by (A A^T). Each one sharpens the
+# separation between the top singular vectors and the rest.
+DEFAULT_POWER_ITERATIONS = 2
+
+def lanczos_svd(matrix, k, **kwargs):
+    """
+    Divisi's built-in truncated SVD. Extra arguments are ignored.
+    """
+    if isinstance(matrix, LinearOperator):
+        return operator_svd(matrix, k)
+    return matrix.svd(k=k)
+
+def operator_svd(operator, k):
+    """
+    Find the rank-`k` SVD of a labeled LinearOperator with ARPACK, which
+    only needs to multiply it by vectors.
+    """
+    nrows, ncols = operator.shape
+    if min(nrows, ncols) <= k + 1:
+        # Too small for ARPACK; multiply it out.
+        U, S, Vt = linalg.svd(operator * np.eye(ncols), full_matrices=False)
+    else:
+        U, S, Vt = svds(operator, k=k)
+        # svds returns the singular values in increasing order.
+        order = np.argsort(-S)
+        U, S, Vt = U[:, order], S[order], Vt[order]
+    U = DenseMatrix(U[:, :k], operator.row_labels, None)
+    V = DenseMatrix(Vt[:k].T, operator.col_labels, None)
+    return U, S[:k], V
+
+def randomized_svd(matrix, k, oversample=DEFAULT_OVERSAMPLE,
+                   power_iterations=DEFAULT_POWER_ITERATIONS,
+                   warm_start=None, seed=0):
+    """
+    Find an approximate rank-`k` SVD of a divisi2 SparseMatrix.
+
+    `warm_start` is an optional labeled DenseMatrix whose rows approximate
+    the left singular vectors of `matrix`, such as the eigenvectors from a
+    previous analysis of the same study. Its rows are matched to the rows of
+    `matrix` by label, and used as the first vectors of the sample, so that
+    re-analyzing a study that changed a little converges in fewer power
+    iterations. Labels it doesn't contain start at zero.
+    """
+    A = _operator(matrix)
+    nrows, ncols = A.shape
+    if matrix.nnz == 0 or min(nrows, ncols) <= k:
+        # Nothing to gain from sampling.
+        return lanczos_svd(matrix, k)
+
+    width = min(k + oversample, nrows, ncols)
+    random = np.random.RandomState(seed)
+    start = _aligned_rows(warm_start, matrix.row_labels, width)
+    nrandom = width - start.shape[1]
+    sample = A * random.standard_normal((ncols, nrandom))
+    if start.shape[1]:
+        sample = np.hstack([start, sample])
+    Q = _orthonormal(sample)
+    for iteration in xrange(power_iterations):
+        # Re-orthonormalize at every step, or the sample collapses onto the
+        # top singular vector in floating point.
+        Q = _orthonormal(A.T * Q)
+        Q = _orthonormal(A * Q)
+
+    # B is small: (width x ncols).
+    B = np.asarray((A.T * Q).T)
+    Ub, S, Vt = linalg.svd(B, full_matrices=False)
+    U = np.dot(Q, Ub[:, :k])
+    U = DenseMatrix(U, matrix.row_labels, None)
+    V = DenseMatrix(Vt[:k].T, matrix.col_labels, None)
+    return U, S[:k], V
+
+def _orthonormal(block):
+    Q, R = linalg.qr(block, mode='economic')
+    return Q
+
+def _aligned_rows(vectors, row_labels, width):
+    """
+    Arrange the rows of a labeled matrix to match `row_labels`, dropping
+    columns past `width` and columns that don't touch any of the labels.
+    """
+    if vectors is None:
+        return np.zeros((len(row_labels), 0))
+    ncols = min(vectors.shape[1], width)
+    aligned = np.zeros((len(row_labels), ncols))
+    for index, label in enumerate(vectors.row_labels):
+        if label in row_labels:
+            aligned[row_labels.index(label)] = vectors[index, :ncols]
+    keep = np.any(aligned != 0, axis=0)
+    return aligned[:, keep]
+
+def _operator(matrix):
+    """
+    Get something that can multiply by blocks of vectors.
+    """
+    if isinstance(matrix, LinearOperator): return matrix
+    return matrix.to_scipy_csr()
+
+def _times(matrix, block):
+    """
+    Multiply `matrix` by a dense block of columns. A divisi2 SparseMatrix
+    multiplies one column at a time in its own format, so this doesn't make
+    a SciPy copy of it.
+    """
+    if isinstance(matrix, LinearOperator): return matrix * block
+    product = np.zeros((matrix.shape[0], block.shape[1]))
+    for col in xrange(block.shape[1]):
+        product[:, col] = matrix.matvec(np.ascontiguousarray(block[:, col]))
+    return product
+
+def svd_residual(matrix, U, Sigma, V):
+    """
+    The relative residual ||A V - U Sigma|| / ||Sigma|| of a truncated SVD of
+    `matrix`, using Frobenius norms. An exact SVD has a residual of 0.
+
+    This takes one product of the matrix with the k columns of V, and no
+    copy of the matrix.
+    """
+    norm = np.sqrt(np.sum(np.asarray(Sigma) ** 2))
+    if norm == 0: return 0.0
+    error = _times(matrix, np.asarray(V)) - np.asarray(U) * np.asarray(Sigma)
+    return float(np.sqrt(np.sum(error ** 2)) / norm)
+
+SVD_ENGINES = {
+    'lanczos': lanczos_svd,
+    'randomized': randomized_svd,
+}
+
+def truncated_svd(matrix, k, engine='lanczos', **kwargs):
+    """
+    Compute a rank-`k` SVD of `matrix` with the named engine, returning
+    (U, Sigma, V, residual).
+    """
+    if engine not in SVD_ENGINES:
+        raise ValueError("Unknown SVD engine %r; choose one of %s" %
+                         (engine, ', '.join(sorted(SVD_ENGINES))))
+    U, Sigma, V = SVD_ENGINES[engine](matrix, k, **kwargs)
+    return U, Sigma, V, svd_residual(matrix, U, Sigma, V)
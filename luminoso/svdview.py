@@ -7,6 +7,10 @@ import numpy as np
 from collections import defaultdict
 from csc import divisi2
 from luminoso import svgfig
+from luminoso.screen_index import ScreenGrid, OccupancyGrid, select_ranks
+from luminoso.density import density_image
+from luminoso.sized_cache import SizedLRUCache
+from luminoso.redraw import RedrawTracker, DRAW, RENDER
 
 # This initializes Qt, and nothing works without it. Even though we
 # don't use the "app" variable until the end.
@@ -34,6 +38,20 @@ simcolors[400:600, 2] = np.arange(30, 230)
 FLIP_Y = np.int32([1, -1])
 TIMER_MAX = 50
 
+# The projection counts as settled when no point would move by this many
+# pixels on its way to the target.
+SETTLED_PIXELS = 0.5
+
+# The kinds of change that SVDViewer.mark_dirty keeps track of.
+SCREEN_CHANGES = frozenset(['projection', 'view'])
+
+# The most memory that LabelLayer's images of label text can take up.
+LABEL_CACHE_BYTES = 32 * 1024 * 1024
+
+# Label colors are rounded to buckets of this many levels (a power of 2), so
+# that labels of similar colors share an image.
+COLOR_BUCKET = 8
+
 # The modifier that, if held while pressing the left mouse button,
 # fakes a right mouse click. "Meta" = Control on Mac, Logo on Windows.
 RIGHT_BUTTON_MODIFIER = Qt.MetaModifier
@@ -149,6 +167,50 @@ class Layer(object):
         """
         self.luminoso = luminoso
 
+    # The kinds of change, as passed to SVDViewer.mark_dirty, that make this
+    # layer look different. A layer that leaves this as None is drawn from
+    # scratch in every frame. Otherwise, it's drawn into an image that is
+    # kept until one of these changes or the viewer is resized, unless it
+    # keeps changing (see luminoso/redraw.py).
+    depends_on = None
+    cache = None
+    redraw = None
+
+    def draw_frame(self, painter, dirty):
+        """
+        Draw this layer in a frame where the kinds of change in `dirty`
+        happened, from its cached image if that is still good.
+        """
+        if self.redraw is None:
+            self.redraw = RedrawTracker(self.depends_on)
+        action = self.redraw.frame(dirty)
+        if action == DRAW:
+            self.draw(painter)
+            return
+        if action == RENDER:
+            self.cache = self.render()
+        painter.drawImage(0, 0, self.cache)
+
+    def render(self):
+        """
+        Draw this layer onto a transparent image, which is the same image
+        every time unless the viewer has been resized.
+        """
+        width, height = self.luminoso.width, self.luminoso.height
+        image = self.cache
+        if image is None or image.width() != width or image.height() != height:
+            image = QImage(width, height, QImage.Format_ARGB32_Premultiplied)
+        image.fill(0)
+        painter = QPainter(image)
+        painter.setFont(self.luminoso.font())
+        painter.setRenderHint(QPainter.Antialiasing, True)
+        painter.setRenderHint(QPainter.TextAntialiasing, True)
+        try:
+            self.draw(painter)
+        finally:
+            painter.end()
+        return image
+
     def draw(self, painter):
         """
         Whenever the Layer needs to redraw itself, this function will be
@@ -199,6 +261,14 @@ class Layer(object):
         """
         pass
 
+    def screenEvent(self):
+        """
+        Informs a Layer that the points have moved on the screen, because
+        the projection or the view changed. The default behavior is to do
+        nothing.
+        """
+        pass
+
     def selectEvent(self, index):
         """
         Triggered when a new Concept is selected. The argument is the index
@@ -217,12 +287,18 @@ class PixelRenderingLayer(Layer):
     A layer representing the data in an SVD with fast pixel operations.
     This layer should be drawn first, and then additional data can be drawn
     over it.
+
+    When more than `max_sprites` points are on the screen, it draws their
+    density instead of a sprite for each one.
     """
-    def __init__(self, luminoso):
+    depends_on = SCREEN_CHANGES | frozenset(['colors'])
+
+    def __init__(self, luminoso, max_sprites=100000):
         """
         Calls resize() to set up a pixmap of the correct size.
         """
         Layer.__init__(self, luminoso)
+        self.max_sprites = max_sprites
         self.resize(self.luminoso.width, self.luminoso.height)
 
     def resize(self, width, height):
@@ -235,33 +311,46 @@ class PixelRenderingLayer(Layer):
         self.img = QImage(self.pixels, width, height, QImage.Format_RGB32)
 
     def draw(self, painter):
+        painter.drawImage(0, 0, self.render())
+
+    def render(self):
+        """
+        Fill in self.pixels, and return the image that shows them.
+        """
         pixels = self.pixels
+        colors = self.luminoso.colors[:, ::-1]
+        pixels[:, :, 3] = 255
+        visible = np.count_nonzero(
+          self.luminoso.is_point_on_screen(self.luminoso.screenpts))
+        if visible > self.max_sprites:
+            pixels[:, :, :3] = density_image(self.luminoso.screenpts, colors,
+                                             self.luminoso.width,
+                                             self.luminoso.height)
+        else:
+            self.draw_sprites(pixels, colors)
 
+        # Put a 3-pixel border on the screen to cover the "offscreen"
+        # points. Yes, it's cheap.
+        pixels[:3, :, :3] = 100
+        pixels[-3:, :, :3] = 100
+        pixels[:, :3, :3] = 100
+        pixels[:, -3:, :3] = 100
+        return self.img
+
+    def draw_sprites(self, pixels, colors):
         # Get the center pixel we should set for each point in the SVD
         # space. Points outside of the current window will be drawn at
         # the edges and then covered up.
         screenpts = self.luminoso.constrain_to_screen(self.luminoso.screenpts)
 
-        colors = self.luminoso.colors[:, ::-1]
-
         # Draw a +-shaped point for every point in the space.
         pixels[:, :, :3] = 0
-        pixels[:, :, 3] = 255
         pixels[screenpts[1]+1, screenpts[0], :3] = colors*0.5
         pixels[screenpts[1]-1, screenpts[0], :3] = colors*0.5
         pixels[screenpts[1], screenpts[0]+1, :3] = colors*0.5
         pixels[screenpts[1], screenpts[0]-1, :3] = colors*0.5
         pixels[screenpts[1], screenpts[0], :3] = colors
 
-        # Put a 3-pixel border on the screen to cover the "offscreen"
-        # points. Yes, it's cheap.
-        pixels[:3, :, :3] = 100
-        pixels[-3:, :, :3] = 100
-        pixels[:, :3, :3] = 100
-        pixels[:, -3:, :3] = 100
-
-        painter.drawImage(0, 0, self.img)
-
 def quadrange(maximum, steps):
     """
     This nifty little function generates a sequence of `steps` distinct
@@ -292,6 +381,8 @@ class PointLayer(Layer):
     A layer that draws points of different sizes based on their overall
     magnitude (leaving some points undrawn).
     """
+    depends_on = SCREEN_CHANGES | frozenset(['colors'])
+
     def __init__(self, luminoso, npoints=1000):
         Layer.__init__(self, luminoso)
         self.npoints = npoints
@@ -304,7 +395,8 @@ class PointLayer(Layer):
         pointlist = np.flatnonzero(whichpoints)
         
         subsizes = self.sizes[pointlist]
-        sub_order = np.argsort(-subsizes)
+        sub_order = select_ranks(-subsizes,
+                                 np.arange(min(len(subsizes), self.npoints)))
         order = pointlist[sub_order]
         pixelsize = self.luminoso.pixel_size()
 
@@ -361,14 +453,19 @@ class LabelLayer(Layer):
     """
     A layer for labeling points in an SVD.
     """
+    depends_on = SCREEN_CHANGES | frozenset(['colors', 'selection', 'hover'])
+
     def __init__(self, luminoso, nlabels=400, npoints=1000):
         Layer.__init__(self, luminoso)
         self.nlabels = nlabels
         self.npoints = npoints
-        self.whichlabels = quadrange(self.luminoso.npoints, npoints)
         self.magnitudes = np.asarray(self.luminoso.magnitudes)
-        self.update_order()
+        # The biggest points are always candidates for a label, wherever
+        # they are, as they would be first in line from far away.
+        self.biggest = np.argsort(-self.magnitudes)[:nlabels]
+        self.order_stale = True
         self.sizes = self.calculate_magnitudes()
+        self.label_images = SizedLRUCache(LABEL_CACHE_BYTES)
 
     def calculate_magnitudes(self):
         """
@@ -383,13 +480,16 @@ class LabelLayer(Layer):
         return sizes
 
     def draw(self, painter):
+        if self.order_stale: self.update_order()
         labeled_so_far = 0
-        self.label_mask[:] = False
-        label_indices = [self.luminoso.selected_index] + [self.order[i] for i in self.whichlabels]
+        self.label_mask.clear()
+        label_indices = [self.luminoso.selected_index] + list(self.order)
+        mouse = np.array([self.luminoso.mouseX, self.luminoso.mouseY])
         for (i, lindex) in enumerate(label_indices):
             if lindex is None: continue
             x, y = self.luminoso.screenpts[lindex]
-            if not self.luminoso.is_on_screen(x, y) or self.label_mask[x, y]:
+            if (not self.luminoso.is_on_screen(x, y) or
+                self.label_mask.is_taken(x, y)):
                 continue
 
             r, g, b = self.luminoso.colors[lindex] + 25
@@ -399,24 +499,55 @@ class LabelLayer(Layer):
             text = self.luminoso.labels[lindex]
             if text is None: continue
 
-            # Mask out areas that already have label text.
-            dist = self.distances[lindex]
+            image, ascent = self.label_image(painter.font(), unicode(text),
+                                             (r, g, b))
+
+            # Mask out the label text, and an area around the point that
+            # grows with the distance from the mouse.
+            dist = np.sqrt(np.sum((self.luminoso.screenpts[lindex] - mouse) ** 2.0))
             width = int(dist/8) + 9
             height = int(dist/16) + 3
-            xmin = max(x-width, 0)
-            xmax = min(x+width, self.luminoso.width)
-            ymin = max(y-height, 0)
-            ymax = min(y+height, self.luminoso.height)
-            self.label_mask[xmin:xmax, ymin:ymax] = True
+            self.label_mask.take(x-width, y-height, x+width, y+height)
+            self.label_mask.take(x+4, y+4-ascent, x+4+image.width(),
+                                 y+4-ascent+image.height())
 
-            painter.setPen(QColor(0, 0, 0))
-            painter.drawText(Point(x+5, y+5), unicode(text))
-            painter.setPen(QColor(r, g, b))
-            painter.drawText(Point(x+4, y+4), unicode(text))
+            painter.drawImage(Point(x+4, y+4-ascent), image)
 
             labeled_so_far += 1
             if labeled_so_far >= self.nlabels: break
 
+    def label_image(self, font, text, color):
+        """
+        Get an image of `text` in `font`, with its shadow, as a pair of
+        (image, ascent). Drawing the image with its top left corner at
+        (x, y - ascent) puts the text's baseline at (x, y).
+
+        The color is rounded to a bucket, and images are kept in an LRU
+        cache, so that a frame mostly just copies images that were drawn
+        before.
+        """
+        r, g, b = [int(c) | (COLOR_BUCKET - 1) for c in color]
+        key = (text, r, g, b, unicode(font.key()))
+        found = self.label_images.get(key)
+        if found is None:
+            metrics = QFontMetrics(font)
+            ascent = metrics.ascent()
+            width = metrics.width(text) + 1
+            height = metrics.height() + 1
+            image = QImage(width, height, QImage.Format_ARGB32_Premultiplied)
+            image.fill(0)
+            painter = QPainter(image)
+            painter.setFont(font)
+            painter.setRenderHint(QPainter.TextAntialiasing, True)
+            painter.setPen(QColor(0, 0, 0))
+            painter.drawText(Point(1, ascent+1), text)
+            painter.setPen(QColor(r, g, b))
+            painter.drawText(Point(0, ascent), text)
+            painter.end()
+            found = (image, ascent)
+            self.label_images.put(key, found, width * height * 4)
+        return found
+
     def drawSVG(self):
         texts = []
         for i in xrange(self.luminoso.npoints):
@@ -439,18 +570,43 @@ class LabelLayer(Layer):
             texts.append(text)
         return svgfig.Fig(*texts)
     
+    # The order is brought up to date when the next frame is drawn, however
+    # many events come in before then. It depends on where the mouse is and
+    # on where the points are, which changes without any mouse events while
+    # the projection rotates.
     def wheelEvent(self, event):
-        self.update_order()
+        self.order_stale = True
 
     def mouseMoveEvent(self, event):
-        self.update_order()
+        self.order_stale = True
+
+    def screenEvent(self):
+        self.order_stale = True
 
     def resize(self, width, height):
-        self.label_mask = np.zeros((self.luminoso.width, self.luminoso.height), dtype=np.bool8)
+        self.label_mask = OccupancyGrid(self.luminoso.width, self.luminoso.height)
+        self.order_stale = True
         
     def update_order(self):
-        self.distances = self.luminoso.distances_from_mouse(self.luminoso.array)
-        self.order = np.argsort(self.distances / self.magnitudes)
+        """
+        Choose the points to try labeling, in order of their distance from
+        the mouse divided by their magnitude.
+
+        Only the points around the mouse, and the biggest points, are
+        candidates, and `quadrange` picks which ranks among them to try, so
+        this costs about the same however many points there are.
+        """
+        luminoso = self.luminoso
+        grid = luminoso.screen_index()
+        candidates = np.union1d(grid.around(luminoso.mouseX, luminoso.mouseY,
+                                            self.npoints * 4),
+                                self.biggest)
+        distances = np.sqrt(grid.squared_distances(candidates, luminoso.mouseX,
+                                                   luminoso.mouseY))
+        ranks = quadrange(len(candidates), self.npoints)
+        self.order = candidates[select_ranks(distances / self.magnitudes[candidates],
+                                             ranks)]
+        self.order_stale = False
 
 class SelectionLayer(Layer):
     """
@@ -532,7 +688,7 @@ class SimilarityLayer(Layer):
         sim = divisi2.dot(self.luminoso.array, vec) / np.linalg.norm(vec) / np.sqrt(np.sum(self.luminoso.array ** 2, axis=1))
 
         sim_indices = np.clip(np.int32(sim*600 + 300), 0, 599)
-        self.luminoso.colors = simcolors[sim_indices]
+        self.luminoso.set_colors(simcolors[sim_indices])
 
     def mouseReleaseEvent(self, event):
         self.luminoso.update_colors()
@@ -705,6 +861,8 @@ class SVDViewer(QWidget):
         self.painter = QPainter()
 
         self.selected_index = None
+        self._screen_index = None
+        self.dirty = set()
         self.mouseX = 0
         self.mouseY = 0
         self.buttons = 0
@@ -718,6 +876,7 @@ class SVDViewer(QWidget):
         self.timer.start()
 
         self.setMouseTracking(True)
+        self.max_norm = self.calculate_max_norm()
         self.default_colors = self.components_to_colors(self.array)[:]
         self.update_colors()
 
@@ -735,6 +894,22 @@ class SVDViewer(QWidget):
             self.timer.start()
         self.timer_ticks = 0
 
+    def settle_timer(self):
+        """
+        Stop the timer early, because nothing is moving, in a way that lets
+        activate_timer start it again.
+        """
+        self.timer_ticks = TIMER_MAX
+        self.timer.stop()
+
+    def mark_dirty(self, *changes):
+        """
+        Record that something has changed since the last frame, so that the
+        layers that depend on it are redrawn: 'projection', 'view' (zoom
+        and pan), 'selection', 'colors', 'hover' or 'size'.
+        """
+        self.dirty.update(changes)
+
     def stop_timer(self):
         self.timer.stop()
 
@@ -749,6 +924,22 @@ class SVDViewer(QWidget):
         coords = [c for c in np.abs(self.array.flatten()) if c > 0] + [1.0]
         coords.sort()
         return coords[len(coords)//2]
+
+    def calculate_max_norm(self):
+        """
+        Find the length of the longest vector, which bounds how far any point
+        moves when the projection changes.
+        """
+        if self.npoints == 0: return 0.0
+        return np.sqrt(np.max(np.sum(self.array ** 2, axis=1)))
+
+    def pixels_moved(self, old, new):
+        """
+        At most how many pixels a point moves on the screen when the
+        projection matrix changes from `old` to `new`.
+        """
+        pixel = np.min(self.screen_size / [max(self.width, 1), max(self.height, 1)])
+        return self.max_norm * np.sqrt(np.sum((new - old) ** 2)) / pixel
     
     def add_jitter(self):
         self.jitter = np.exp(np.random.normal(size=self.array.shape) / 50.0)
@@ -774,6 +965,7 @@ class SVDViewer(QWidget):
         self.projection.reset_projection()
         self.set_default_axes()
         self.update_screenpts()
+        self.mark_dirty('projection', 'view')
         self.update()
 
     @staticmethod
@@ -893,9 +1085,30 @@ class SVDViewer(QWidget):
     
     def update_screenpts(self):
         self.screenpts = self.components_to_screen(self.array)
+        self._screen_index = None
+        self._screen_matrix = self.projection.matrix.copy()
+        self._screen_view = self.view_state()
+        for layer in self.layers: layer.screenEvent()
+
+    def view_state(self):
+        return (tuple(self.screen_center), tuple(self.screen_size),
+                self.width, self.height)
+
+    def screen_index(self):
+        """
+        Get a ScreenGrid of the points where they are on the screen now. It's
+        rebuilt the first time it's needed after the points move.
+        """
+        if self._screen_index is None:
+            self._screen_index = ScreenGrid(self.screenpts, self.width, self.height)
+        return self._screen_index
 
     def update_colors(self):
-        self.colors = self.default_colors
+        self.set_colors(self.default_colors)
+
+    def set_colors(self, colors):
+        self.colors = colors
+        self.mark_dirty('colors')
         
     def constrain_to_screen(self, points):
         return np.clip(points,
@@ -906,8 +1119,14 @@ class SVDViewer(QWidget):
         offsets = self.screenpts - mouse
         return np.sqrt(np.sum(offsets*offsets, axis=1))
 
+    def points_near_mouse(self, radius):
+        """
+        Get the indices of the points within `radius` pixels of the mouse.
+        """
+        return self.screen_index().within(self.mouseX, self.mouseY, radius)
+
     def get_nearest_point(self):
-        return np.argmin(self.distances_from_mouse(self.array))
+        return self.screen_index().nearest(self.mouseX, self.mouseY)
 
     def select_nearest_point(self):
         self.selected_index = self.get_nearest_point()
@@ -922,6 +1141,7 @@ class SVDViewer(QWidget):
     def selectEvent(self, index):
         for layer in self.layers:
             layer.selectEvent(index)
+        self.mark_dirty('selection')
         self.svdSelectEvent.emit()
 
     def focus_on_point(self, text):
@@ -933,6 +1153,7 @@ class SVDViewer(QWidget):
             self.screen_center = coords
         self.selected_index = index
         self.selectEvent(index)
+        self.activate_timer()
 
     def paintEvent(self, event):
         if self.paint_lock.tryLock():
@@ -940,9 +1161,10 @@ class SVDViewer(QWidget):
             self.painter.begin(self)
             self.painter.setRenderHint(QPainter.Antialiasing, True)
             self.painter.setRenderHint(QPainter.TextAntialiasing, True)
+            dirty, self.dirty = self.dirty, set()
             try:
                 for layer in self.layers:
-                    layer.draw(self.painter)
+                    layer.draw_frame(self.painter, dirty)
             finally:
                 self.painter.end()
                 self.paint_lock.unlock()
@@ -950,25 +1172,58 @@ class SVDViewer(QWidget):
     def resizeEvent(self, sizeEvent):
         self.width = sizeEvent.size().width()
         self.height = sizeEvent.size().height()
+        self._screen_index = None
         for layer in self.layers:
             layer.resize(self.width, self.height)
+        self.mark_dirty('size')
+        self.activate_timer()
 
     def mouseMoveEvent(self, mouseEvent):
         point = mouseEvent.pos()
         self.mouseX = point.x()
         self.mouseY = point.y()
         for layer in self.layers: layer.mouseMoveEvent(mouseEvent)
+        self.mark_dirty('hover')
         if self.leftMouseDown() or self.rightMouseDown():
             self.activate_timer()
         elif self.timer_ticks >= TIMER_MAX:
             self.update()
     
     def timerEvent(self):
-        self.projection.timerEvent()
+        """
+        Move the projection toward its target, and redraw if anything has
+        changed. The screen points are only recomputed when the projection
+        has moved them by a pixel or so, or the view has been zoomed or
+        panned, and the timer stops once the projection settles.
+        """
+        projection = self.projection
+        projection.timerEvent()
         for layer in self.layers: layer.timerEvent()
-        self.update_screenpts()
-        self.update()
-        self.age_timer()
+
+        settled = (self.pixels_moved(projection.matrix, projection.target_matrix)
+                   < SETTLED_PIXELS and
+                   not (self.leftMouseDown() or self.rightMouseDown()))
+        if settled:
+            projection.matrix = projection.target_matrix.copy()
+
+        changes = []
+        if self.view_state() != self._screen_view:
+            changes.append('view')
+        if settled:
+            if not np.array_equal(projection.matrix, self._screen_matrix):
+                changes.append('projection')
+        elif (self.pixels_moved(self._screen_matrix, projection.matrix)
+              >= SETTLED_PIXELS):
+            changes.append('projection')
+        if changes:
+            self.update_screenpts()
+            self.mark_dirty(*changes)
+
+        if self.dirty: self.update()
+        if settled:
+            self.settle_timer()
+        else:
+            self.age_timer()
     
     def updateMouseButtons(self, event):
         self.buttons = event.buttons()
@@ -1008,7 +1263,9 @@ class SVDViewer(QWidget):
         self.refreshData(self, index)
 
     def refreshData(self):
+        self.max_norm = self.calculate_max_norm()
         self.update_screenpts()
+        self.mark_dirty('projection')
         self.default_colors = self.components_to_colors(self.array)[:]
         self.update_colors()
         self.update()
@@ -0,0 +1,81 @@
+from __future__ import with_statement
+from luminoso.batch_study import analyze_study_dir, run_batch
+from luminoso.study import StudyDirectory
+import unittest
+import tempfile
+import shutil
+import json
+import os
+
+'''
+This is a unit test for batch_study.py
+'''
+
+TEXTS = [
+    u'Pizza is tasty. Pasta and cheese go well together.',
+    u'Pizza with cheese is my favorite food. Pasta is good too.',
+    u'Soup is warm and good in winter.',
+    u'Soup with bread is a nice lunch.',
+    u'Bread and butter with cheese.',
+    u'Pasta salad with cheese and bread.',
+]
+
+class TestBatchStudy(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.study = os.path.join(self.dir, 'study')
+        os.makedirs(os.path.join(self.study, 'Documents'))
+        for i, text in enumerate(TEXTS):
+            with open(os.path.join(self.study, 'Documents', 'doc%d.txt' % i), 'w') as out:
+                out.write(text.encode('utf-8'))
+        self.write_settings({'axes': 4})
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write_settings(self, settings):
+        with open(os.path.join(self.study, 'settings.json'), 'w') as out:
+            json.dump(settings, out)
+
+    '''
+    A study is skipped while its analysis is current, and analyzed again
+    when its documents or its settings change.
+    '''
+    def test_skip_current(self):
+        self.assertEqual(analyze_study_dir(self.study)['outcome'], 'analyzed')
+        self.assertEqual(analyze_study_dir(self.study)['outcome'], 'skipped')
+
+        self.write_settings({'axes': 3})
+        summary = analyze_study_dir(self.study)
+        self.assertEqual(summary['outcome'], 'analyzed')
+        self.assertEqual(analyze_study_dir(self.study)['outcome'], 'skipped')
+
+        # Settings that don't change the results don't count.
+        self.write_settings({'axes': 3, 'workers': 2})
+        self.assertEqual(analyze_study_dir(self.study)['outcome'], 'skipped')
+
+    '''
+    Results without a manifest, from before manifests were saved, are
+    treated as outdated.
+    '''
+    def test_legacy_results(self):
+        analyze_study_dir(self.study)
+        self.assertTrue(StudyDirectory(self.study).get_existing_analysis()
+                        is not None)
+        os.remove(os.path.join(self.study, 'Results', 'manifest.json'))
+        study_dir = StudyDirectory(self.study)
+        self.assertFalse(study_dir.is_analysis_current())
+        self.assertEqual(study_dir.get_existing_analysis(), None)
+        self.assertEqual(analyze_study_dir(self.study)['outcome'], 'analyzed')
+
+    def test_run_batch(self):
+        summaries = list(run_batch([self.study], workers=1, cache_megabytes=1))
+        self.assertEqual([summary['outcome'] for summary in summaries],
+                         ['analyzed'])
+        self.assertTrue(os.path.exists(os.path.join(self.study, 'Results',
+                                                    'batch_summary.json')))
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestBatchStudy)
+    unittest.TextTestRunner(verbosity=2).run(suite)
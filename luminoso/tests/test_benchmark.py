@@ -0,0 +1,81 @@
+from luminoso.benchmark import SyntheticCorpus, synthetic_word, \
+     synthetic_study, run_benchmark, compare_to_baseline, benchmark_scales
+import unittest
+
+'''
+This is a unit test for benchmark.py
+'''
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_words(self):
+        words = [synthetic_word(i) for i in xrange(70000)]
+        self.assertEqual(len(set(words)), len(words))
+        self.assertTrue(all(word[-1] in 'aeiou' for word in words))
+
+    '''
+    The same seed makes the same documents, and the rates of negations and
+    tags are followed.
+    '''
+    def test_corpus(self):
+        plain = dict(vocabulary_size=100, negation_rate=0, tag_density=0)
+        corpus = SyntheticCorpus(20, seed=1, **plain)
+        again = SyntheticCorpus(20, seed=1, **plain)
+        other = SyntheticCorpus(20, seed=2, **plain)
+        texts = [doc.text for doc in corpus.documents()]
+        self.assertEqual(texts, [doc.text for doc in again.documents()])
+        self.assertNotEqual(texts, [doc.text for doc in other.documents()])
+
+        words = ' '.join(texts).split()
+        self.assertFalse(any(word.startswith('#') for word in words))
+        self.assertFalse('not' in words)
+        # The most common word is the first one in the vocabulary
+        counts = dict((word, words.count(word)) for word in set(words))
+        self.assertEqual(max(counts, key=counts.get), corpus.vocabulary[0])
+
+        tagged = SyntheticCorpus(20, vocabulary_size=100, negation_rate=1.0,
+                                 tag_density=0.5)
+        for doc in tagged.documents():
+            words = doc.text.split()
+            self.assertTrue(any(word in SyntheticCorpus.NEGATIONS for word in words))
+            self.assertTrue(any(word.startswith('#') for word in words))
+
+    def test_run_benchmark(self):
+        corpus = SyntheticCorpus(40, vocabulary_size=300)
+        study = synthetic_study(corpus, with_matrix=False, settings={'axes': 5})
+        result = run_benchmark('tiny', study)
+        for stage in ('documents_matrix', 'association', 'svd', 'stats', 'save'):
+            self.assertTrue(result['stages'][stage]['wall_seconds'] >= 0)
+        self.assertEqual(result['stages']['documents_matrix']['sizes']['documents'], 40)
+
+    '''
+    The shape of the synthetic corpora can be changed, and the benchmarks
+    are named so that they aren't compared with ones of the default shape.
+    '''
+    def test_corpus_params(self):
+        benchmarks = list(benchmark_scales([30], with_matrix=False,
+                                           settings={'axes': 5},
+                                           vocabulary_size=200,
+                                           sentences_per_document=2))
+        self.assertEqual(benchmarks[0]['name'],
+                         'synthetic-30-sentences_per_document=2-vocabulary_size=200')
+        self.assertEqual(benchmarks[0]['params']['vocabulary_size'], 200)
+        self.assertEqual(benchmarks[0]['params']['sentences_per_document'], 2)
+        self.assertEqual(benchmarks[0]['params']['sentence_length'], 12)
+
+    def test_compare(self):
+        baseline = {'benchmarks': [
+            {'name': 'a', 'stages': {'svd': {'wall_seconds': 1.0},
+                                     'blend': {'wall_seconds': 0.01}}}]}
+        benchmarks = [
+            {'name': 'a', 'stages': {'svd': {'wall_seconds': 2.0},
+                                     'blend': {'wall_seconds': 0.03}}},
+            {'name': 'b', 'stages': {'svd': {'wall_seconds': 9.0}}}]
+        regressions = compare_to_baseline(benchmarks, baseline)
+        self.assertEqual([(r['name'], r['stage']) for r in regressions],
+                         [('a', 'svd')])
+        self.assertEqual(compare_to_baseline(benchmarks, baseline, tolerance=1.5), [])
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestBenchmark)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,73 @@
+from luminoso.blend_operator import BlendOperator
+from luminoso.svd_engines import truncated_svd
+from csc.divisi2.blending import blend
+from csc import divisi2
+import numpy as np
+import unittest
+
+'''
+This is a unit test for blend_operator.py
+'''
+
+def random_matrix(seed, labels, density=0.2):
+    '''
+    A random matrix whose rows and columns are some of `labels`.
+    '''
+    random = np.random.RandomState(seed)
+    rows = [label for label in labels if random.rand() < 0.7]
+    cols = [label for label in labels if random.rand() < 0.7]
+    dense = random.standard_normal((len(rows), len(cols)))
+    dense[random.rand(len(rows), len(cols)) > density] = 0.0
+    i, j = np.nonzero(dense)
+    return divisi2.SparseMatrix.from_named_lists(
+        list(dense[i, j]), [rows[r] for r in i], [cols[c] for c in j])
+
+def aligned(operator, matrix):
+    '''
+    The dense form of a labeled matrix, with its rows and columns in the
+    order of the operator's labels.
+    '''
+    dense = np.asarray(matrix.to_dense())
+    rows = [matrix.row_index(label) for label in operator.row_labels]
+    cols = [matrix.col_index(label) for label in operator.col_labels]
+    return dense[rows][:, cols]
+
+class TestBlendOperator(unittest.TestCase):
+
+    def setUp(self):
+        labels = ['c%d' % i for i in xrange(60)]
+        # The matrices overlap in many places.
+        self.matrices = [random_matrix(1, labels), random_matrix(2, labels)]
+        self.factors = [1.0, 0.5]
+
+    '''
+    The operator multiplies vectors the same way the materialized,
+    normalized blend does.
+    '''
+    def test_same_as_blend(self):
+        operator = BlendOperator(self.matrices, self.factors).normalize_all()
+        expected = aligned(operator,
+                           blend(self.matrices, self.factors).normalize_all())
+        X = np.random.RandomState(0).standard_normal((operator.shape[1], 3))
+        self.assertTrue(np.allclose(operator * X, np.dot(expected, X)))
+        Y = np.random.RandomState(1).standard_normal((operator.shape[0], 2))
+        self.assertTrue(np.allclose(operator.T * Y, np.dot(expected.T, Y)))
+        self.assertTrue(np.allclose(operator.rmatvec(Y[:, 0]),
+                                    np.dot(expected.T, Y[:, 0])))
+
+    def test_svd(self):
+        operator = BlendOperator(self.matrices, self.factors).normalize_all()
+        materialized = blend(self.matrices, self.factors).normalize_all()
+        U, S, V, residual = truncated_svd(operator, 5, 'lanczos')
+        self.assertTrue(residual < 1e-6)
+        self.assertTrue(np.allclose(
+            S, np.linalg.svd(np.asarray(materialized.to_dense()),
+                             compute_uv=False)[:5]))
+        self.assertEqual(list(U.row_labels), list(operator.row_labels))
+        rU, rS, rV, residual = truncated_svd(operator, 5, 'randomized',
+                                             power_iterations=4)
+        self.assertTrue(np.allclose(S[:2], rS[:2], rtol=0.05))
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestBlendOperator)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,65 @@
+from luminoso.concept_cache import ConceptCache, text_hash
+import unittest
+import tempfile
+import shutil
+import os
+
+'''
+This is a unit test for concept_cache.py
+'''
+
+class TestConceptCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = ConceptCache(self.dir, 'settings')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    '''
+    Values come back out under the key for the same text, and not for
+    different text or different settings.
+    '''
+    def test_round_trip(self):
+        value = ([(u'boy', 1), (u'test', -1)], [[(u'boy', 1)], [(u'test', -1)]])
+        key = self.cache.key(text_hash(u"The boy doesn't like tests."))
+        self.cache.put(key, value)
+
+        self.assertEqual(self.cache.get(key), value)
+        self.assertEqual(self.cache.get(self.cache.key(text_hash(u"Something else."))), None)
+
+        other_settings = ConceptCache(self.dir, 'other settings')
+        self.assertEqual(other_settings.get(other_settings.key(text_hash(u"The boy doesn't like tests."))), None)
+
+    '''
+    Writing past the size limit evicts the least recently used entries.
+    '''
+    def test_eviction(self):
+        cache = ConceptCache(self.dir, 'settings', max_bytes=4000)
+        keys = [cache.key(text_hash(unicode(i))) for i in xrange(10)]
+        for i, key in enumerate(keys):
+            cache.put(key, 'x' * 1000)
+            # make sure modification times are distinct and in order
+            os.utime(cache._path(key), (i, i))
+
+        self.assertTrue(cache.total_size() <= 4000)
+        self.assertEqual(cache.get(keys[0]), None)
+        self.assertEqual(cache.get(keys[-1]), 'x' * 1000)
+
+    '''
+    Storing an entry again replaces its size in the running total, instead
+    of adding to it.
+    '''
+    def test_overwrite_size(self):
+        cache = ConceptCache(self.dir, 'settings', max_bytes=4000)
+        key = cache.key(text_hash(u'same'))
+        cache.put(cache.key(text_hash(u'other')), 'y' * 1000)
+        for i in xrange(10):
+            cache.put(key, 'x' * 1000)
+        self.assertEqual(cache._size, cache.total_size())
+        self.assertEqual(cache.get(cache.key(text_hash(u'other'))), 'y' * 1000)
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestConceptCache)
+    unittest.TextTestRunner(verbosity=2).run(suite)
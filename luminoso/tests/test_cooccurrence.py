@@ -0,0 +1,125 @@
+from luminoso.cooccurrence import CooccurrenceBuilder, strongest_pairs
+import numpy as np
+from luminoso.vocabulary import Vocabulary
+import unittest
+
+'''
+This is a unit test for cooccurrence.py
+'''
+
+DOCUMENTS = [
+    [[(u'#tag', 1), (u'food', 1), (u'spicy', -1)],
+     [(u'food', 1), (u'good', 1), (u'rare', 1)],
+     [(u'spicy', 1), (u'good', -1)]],
+    [[(u'good', 1), (u'food', 1)],
+     [(u'#tag', 1), (u'spicy', 1), (u'spicy', 1)]],
+]
+VALID = set([u'#tag', u'food', u'spicy', u'good'])
+
+def enumerate_pairs(documents, valid_concepts, window_size):
+    '''
+    The straightforward way to count the same associations, one pair at a
+    time.
+    '''
+    counts = {}
+    def add(value, c1, c2):
+        counts[c1, c2] = counts.get((c1, c2), 0) + value
+    for doc in documents:
+        prev_concepts = []
+        for concepts in doc:
+            for concept1, value1 in concepts:
+                if concept1 not in valid_concepts: continue
+                for concept2, value2 in concepts:
+                    if concept2 in valid_concepts and concept1 < concept2:
+                        add(value1*value2, concept1, concept2)
+                        add(value1*value2, concept2, concept1)
+                for concept2, value2 in prev_concepts:
+                    if concept2 in valid_concepts and concept1 != concept2:
+                        add(value1*value2/2, concept1, concept2)
+                        add(value1*value2/2, concept2, concept1)
+            prev_concepts = [p for p in prev_concepts[:-window_size]
+                             if p[0].startswith('#')] + prev_concepts[-window_size:]
+            prev_concepts.extend(concepts)
+    return dict((key, value) for key, value in counts.items() if value != 0)
+
+class TestCooccurrence(unittest.TestCase):
+
+    def build(self, chunk_sentences, **limits):
+        vocab = Vocabulary()
+        encoded = [vocab.encode_sentences(doc) for doc in DOCUMENTS]
+        builder = CooccurrenceBuilder(vocab, vocab.mask(VALID), chunk_sentences,
+                                      **limits)
+        for doc in encoded:
+            builder.add_document(doc)
+        matrix = builder.to_matrix()
+        return dict(((row, col), value)
+                    for value, row, col in matrix.named_entries() if value != 0)
+
+    '''
+    The sparse products add up to the same thing as enumerating pairs, whether
+    the sentences are multiplied in one chunk or several.
+    '''
+    def test_matches_pairs(self):
+        expected = enumerate_pairs(DOCUMENTS, VALID, 100)
+        self.assertEqual(self.build(1000), expected)
+        self.assertEqual(self.build(1), expected)
+
+    def assertSymmetric(self, pairs):
+        for (row, col), value in pairs.items():
+            self.assertEqual(pairs.get((col, row)), value)
+
+    def test_min_weight(self):
+        expected = enumerate_pairs(DOCUMENTS, VALID, 100)
+        self.assertEqual(self.build(1000, min_weight=2),
+                         dict((key, value) for key, value in expected.items()
+                              if abs(value) >= 2))
+
+    '''
+    Each concept keeps at least its strongest neighbor, and the result stays
+    symmetric.
+    '''
+    def test_max_neighbors(self):
+        expected = enumerate_pairs(DOCUMENTS, VALID, 100)
+        pruned = self.build(1000, max_neighbors=1)
+        self.assertTrue(len(pruned) < len(expected))
+        self.assertSymmetric(pruned)
+        for key, value in pruned.items():
+            self.assertEqual(expected[key], value)
+        for concept in VALID:
+            weights = [abs(value) for (row, col), value in expected.items()
+                       if row == concept]
+            kept = [abs(value) for (row, col), value in pruned.items()
+                    if row == concept]
+            if weights:
+                self.assertEqual(max(kept), max(weights))
+
+    def test_memory_budget(self):
+        expected = enumerate_pairs(DOCUMENTS, VALID, 100)
+        # room for a few entries
+        pruned = self.build(1, max_megabytes=400.0 / 1024 / 1024)
+        self.assertTrue(0 < len(pruned) < len(expected))
+        self.assertSymmetric(pruned)
+
+    '''
+    Both entries for a pair are kept or dropped, even among ties.
+    '''
+    def test_strongest_pairs(self):
+        rows = np.array([0, 1, 0, 2, 1, 2])
+        cols = np.array([1, 0, 2, 0, 2, 1])
+        values = np.array([1, 1, -3, -3, 1, 1])
+        self.assertEqual(list(strongest_pairs(rows, cols, values, 2)),
+                         [False, False, True, True, False, False])
+        self.assertEqual(list(strongest_pairs(rows, cols, values, 5)),
+                         [True, True, True, True, False, False])
+        self.assertEqual(list(strongest_pairs(rows, cols, values, 10)), [True] * 6)
+
+    def test_empty(self):
+        vocab = Vocabulary()
+        doc = vocab.encode_sentences([[(u'rare', 1)]])
+        builder = CooccurrenceBuilder(vocab, vocab.mask(VALID))
+        builder.add_document(doc)
+        self.assertEqual(builder.to_matrix(), None)
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestCooccurrence)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,42 @@
+from luminoso.density import density_image, MIN_BRIGHTNESS
+import numpy as np
+import unittest
+
+'''
+This is a unit test for density.py
+'''
+
+class TestDensity(unittest.TestCase):
+
+    '''
+    Where no points overlap, each pixel is the color of its point, and points
+    off the screen are left out.
+    '''
+    def test_single_points(self):
+        points = np.array([[0, 0], [3, 1], [-1, 2], [4, 0]])
+        colors = np.array([[10, 20, 30], [200, 100, 50], [255, 255, 255],
+                           [1, 2, 3]])
+        image = density_image(points, colors, 4, 2)
+        self.assertEqual(image.shape, (2, 4, 3))
+        self.assertEqual(list(image[0, 0]), [10, 20, 30])
+        self.assertEqual(list(image[1, 3]), [200, 100, 50])
+        self.assertEqual(np.count_nonzero(image.sum(axis=-1)), 2)
+
+    '''
+    Overlapping points average their colors, and the most crowded pixel is
+    the brightest.
+    '''
+    def test_overlap(self):
+        points = np.array([[1, 1]] * 9 + [[0, 0]])
+        colors = np.array([[100, 0, 0], [0, 100, 0], [200, 200, 0]] * 3 +
+                          [[200, 200, 200]])
+        image = density_image(points, colors, 2, 2)
+        self.assertEqual(list(image[1, 1]), [100, 100, 0])
+        self.assertEqual(list(image[0, 0]), [int(200 * MIN_BRIGHTNESS)] * 3)
+        self.assertEqual(list(density_image(np.zeros((0, 2), dtype=int),
+                                            np.zeros((0, 3)), 2, 2).ravel()),
+                         [0] * 12)
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestDensity)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,67 @@
+from __future__ import with_statement
+from luminoso.study import Document, decode_text
+from luminoso.concept_cache import text_hash
+from luminoso.manifest import file_hash
+import unittest
+import tempfile
+import shutil
+import os
+
+'''
+This is a unit test for reading Documents from files in study.py
+'''
+
+class TestDocuments(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_decode_text(self):
+        self.assertEqual(decode_text('plain text'), (u'plain text', 'utf-8'))
+        self.assertEqual(decode_text('caf\xc3\xa9'), (u'caf\xe9', 'utf-8'))
+        self.assertEqual(decode_text('\xef\xbb\xbfbom'), (u'bom', 'utf-8-sig'))
+        # Not UTF-8, so chardet guesses
+        latin1 = u'Cr\xe8me br\xfbl\xe9e, s\'il vous pla\xeet. ' * 20
+        text, encoding = decode_text(latin1.encode('latin-1'))
+        self.assertNotEqual(encoding, 'utf-8')
+        self.assertEqual(text, latin1)
+        # A known encoding is used without guessing
+        self.assertEqual(decode_text('caf\xe9', 'latin-1'), (u'caf\xe9', 'latin-1'))
+
+    '''
+    A Document from a file reads it when its text is needed, not before, and
+    remembers the encoding it found.
+    '''
+    def test_lazy(self):
+        filename = os.path.join(self.dir, 'a.txt')
+        doc = Document.from_file(filename, 'a.txt')
+        with open(filename, 'wb') as out:
+            out.write('caf\xc3\xa9')
+        self.assertEqual(doc.encoding, None)
+        self.assertEqual(doc.text, u'caf\xe9')
+        self.assertEqual(doc.encoding, 'utf-8')
+
+    '''
+    A Document's digest is the hash of its file, computed once, or taken
+    from what's already known about the file.
+    '''
+    def test_digest(self):
+        filename = os.path.join(self.dir, 'a.txt')
+        with open(filename, 'wb') as out:
+            out.write('caf\xc3\xa9')
+        doc = Document.from_file(filename, 'a.txt')
+        self.assertEqual(doc.digest, file_hash(filename))
+        self.assertEqual(doc.encoding, None)
+        self.assertEqual(doc.digest, Document('a.txt', u'caf\xe9').digest)
+
+        os.remove(filename)
+        self.assertEqual(doc.digest, text_hash(u'caf\xe9'))
+        known = Document.from_file(filename, 'a.txt', digest='abc')
+        self.assertEqual(known.digest, 'abc')
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestDocuments)
+    unittest.TextTestRunner(verbosity=2).run(suite)
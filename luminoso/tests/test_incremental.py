@@ -0,0 +1,136 @@
+from __future__ import with_statement
+from luminoso.study import StudyDirectory, StudyResults, fold_in
+import numpy as np
+import unittest
+import tempfile
+import shutil
+import json
+import os
+
+'''
+This is a unit test for updating an analysis incrementally in study.py
+'''
+
+TEXTS = [
+    u'Pizza is tasty. Pasta and cheese go well together.',
+    u'Pizza with cheese is my favorite food. Pasta is good too.',
+    u'I like pizza and pasta with cheese.',
+    u'Soup is warm and good in winter.',
+    u'Soup with bread is a nice lunch.',
+    u'Bread and butter with cheese.',
+    u'A salad is good for lunch.',
+    u'Pasta salad with cheese and bread.',
+    u'Warm soup and bread in winter.',
+    u'Cheese pizza for lunch.',
+]
+
+NEW_TEXTS = [u'Olive oil on pasta salad.', u'Olive oil with bread and cheese.']
+
+class TestIncremental(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.dir, 'Documents'))
+        for i, text in enumerate(TEXTS):
+            self.write_document('doc%d.txt' % i, text)
+        self.write_settings({'axes': 4, 'incremental_drift': 1.0})
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write_document(self, name, text):
+        with open(os.path.join(self.dir, 'Documents', name), 'w') as out:
+            out.write(text.encode('utf-8'))
+
+    def write_settings(self, settings):
+        with open(os.path.join(self.dir, 'settings.json'), 'w') as out:
+            json.dump(settings, out)
+
+    def stages(self, results):
+        return [stage['stage'] for stage in
+                results.study.instrumentation.timings()]
+
+    '''
+    Folding the rows of the analyzed matrix back in to its SVD gives the
+    same vectors as the full SVD did.
+    '''
+    def test_fold_in_matches_svd(self):
+        results = StudyDirectory(self.dir).analyze()
+        study = results.study
+        normalized = study.get_documents_assoc().normalize_all()
+        right = results.svd['right']
+        concepts = list(right.row_labels)[:5]
+        rows = normalized[[normalized.row_index(c) for c in concepts]]
+        folded = fold_in(rows, right, results.svd['sigma'])
+        eigenvectors = results.svd['eigenvectors']
+        for concept in concepts:
+            self.assertTrue(np.allclose(np.asarray(folded.row_named(concept)),
+                                        np.asarray(eigenvectors.row_named(concept)),
+                                        atol=1e-8))
+
+    '''
+    Adding documents updates the analysis without a new SVD, and the new
+    concepts get vectors. Changing the settings means a full analysis.
+    '''
+    def test_update(self):
+        StudyDirectory(self.dir).analyze()
+        for i, text in enumerate(NEW_TEXTS):
+            self.write_document('new%d.txt' % i, text)
+        results = StudyDirectory(self.dir).analyze(incremental=True)
+        self.assertFalse('svd' in self.stages(results))
+        self.assertTrue(u'olive oil' in results.projections.row_labels)
+        self.assertTrue('new0.txt' in results.projections.row_labels)
+        self.assertTrue(StudyDirectory(self.dir).is_analysis_current())
+
+        self.write_settings({'axes': 3, 'incremental_drift': 1.0})
+        study_dir = StudyDirectory(self.dir)
+        self.assertFalse(study_dir.is_analysis_current())
+        results = study_dir.analyze(incremental=True)
+        self.assertTrue('svd' in self.stages(results))
+        self.assertEqual(results.projections.shape[1], 3)
+
+    '''
+    Analyzing the same study again reports only the new analysis's timings.
+    '''
+    def test_timings_per_analysis(self):
+        study = StudyDirectory(self.dir).get_study()
+        study.analyze()
+        results = study.analyze()
+        self.assertEqual(self.stages(results).count('svd'), 1)
+        self.assertEqual(self.stages(results).count('stats'), 1)
+
+    def test_saved_svd(self):
+        results = StudyDirectory(self.dir).analyze()
+        results_dir = os.path.join(self.dir, 'Results')
+        self.assertFalse(os.path.exists(os.path.join(results_dir, 'svd.pickle')))
+        svd = StudyResults.load_svd(results_dir)
+        for key in ('eigenvectors', 'sigma', 'right'):
+            self.assertTrue(np.allclose(np.asarray(svd[key]),
+                                        np.asarray(results.svd[key])))
+        self.assertEqual(svd['right'].row_labels, results.svd['right'].row_labels)
+        self.assertEqual(svd['documents'], results.svd['documents'])
+
+    def test_repeat(self):
+        study_dir = StudyDirectory(self.dir)
+        study_dir.analyze()
+        old = study_dir.analyze(incremental=True)
+        old_projections = np.array(old.projections)
+        projections_file = os.path.join(self.dir, 'Results', 'projections.npy')
+        mtime = os.stat(projections_file).st_mtime
+
+        # Nothing was added, so nothing is saved again.
+        results = study_dir.analyze(incremental=True)
+        self.assertEqual(os.stat(projections_file).st_mtime, mtime)
+        self.assertTrue(np.array_equal(np.asarray(results.projections),
+                                       old_projections))
+
+        # Saving new results leaves the old ones readable.
+        self.write_document('new0.txt', NEW_TEXTS[0])
+        results = study_dir.analyze(incremental=True)
+        self.assertTrue('new0.txt' in results.projections.row_labels)
+        self.assertTrue(np.array_equal(np.asarray(old.projections),
+                                       old_projections))
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestIncremental)
+    unittest.TextTestRunner(verbosity=2).run(suite)
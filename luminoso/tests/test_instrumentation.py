@@ -0,0 +1,63 @@
+from __future__ import with_statement
+from luminoso.instrumentation import Instrumentation, Collector, JSONLogSink
+import unittest
+import tempfile
+import shutil
+import json
+import os
+
+'''
+This is a unit test for instrumentation.py
+'''
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.collector = Collector()
+        self.instrumentation = Instrumentation([self.collector])
+
+    def test_stage(self):
+        with self.instrumentation.stage('svd', k=5) as sizes:
+            sizes['rows'] = 100
+        self.assertEqual([event['event'] for event in self.collector.events],
+                         ['start', 'end'])
+        end, = self.collector.ends('svd')
+        self.assertEqual(end['sizes'], {'k': 5, 'rows': 100})
+        self.assertEqual(end['error'], None)
+        self.assertTrue(end['wall_seconds'] >= 0)
+        self.assertEqual(self.instrumentation.timings(), [end])
+
+    '''
+    A stage that fails still reports its end, with the error, and the
+    exception isn't swallowed.
+    '''
+    def test_error(self):
+        def fail():
+            with self.instrumentation.stage('blend'):
+                raise ValueError('no matrices')
+        self.assertRaises(ValueError, fail)
+        end, = self.collector.ends()
+        self.assertEqual(end['error'], 'ValueError: no matrices')
+
+    def test_save_and_log(self):
+        dir = tempfile.mkdtemp()
+        try:
+            log = os.path.join(dir, 'log.jsonl')
+            self.instrumentation.add_sink(JSONLogSink(log, events=('end',)))
+            with self.instrumentation.stage('stats'):
+                pass
+            with self.instrumentation.stage('save'):
+                pass
+            self.assertEqual([json.loads(line)['stage'] for line in open(log)],
+                             ['stats', 'save'])
+            timings = os.path.join(dir, 'timings.json')
+            self.instrumentation.save(timings)
+            saved = json.load(open(timings))
+            self.assertEqual([stage['stage'] for stage in saved['stages']],
+                             ['stats', 'save'])
+        finally:
+            shutil.rmtree(dir)
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestInstrumentation)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,69 @@
+from __future__ import with_statement
+from luminoso import manifest
+from luminoso.manifest import Manifest
+import unittest
+import tempfile
+import shutil
+import os
+
+'''
+This is a unit test for manifest.py
+'''
+
+class TestManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.dir, 'Documents'))
+        self.write('Documents/a.txt', 'Some text.')
+        self.write('Documents/notes.doc', 'Not a document.')
+        self.hashed = []
+        self.file_hash = manifest.file_hash
+        def counting_hash(filename):
+            self.hashed.append(filename)
+            return self.file_hash(filename)
+        manifest.file_hash = counting_hash
+
+    def tearDown(self):
+        manifest.file_hash = self.file_hash
+        shutil.rmtree(self.dir)
+
+    def write(self, path, text):
+        with open(os.path.join(self.dir, path), 'w') as out:
+            out.write(text)
+
+    '''
+    Only files whose size or time changed are hashed again, and the manifest
+    only changes when their contents do.
+    '''
+    def test_rescan(self):
+        first = Manifest.scan(self.dir)
+        self.assertEqual(first.files.keys(), [u'Documents/a.txt'])
+        self.assertEqual(len(self.hashed), 1)
+
+        second = Manifest.scan(self.dir, first)
+        self.assertEqual(len(self.hashed), 1)
+        self.assertTrue(second.same_contents(first))
+
+        os.utime(os.path.join(self.dir, 'Documents/a.txt'), (1, 1))
+        touched = Manifest.scan(self.dir, second)
+        self.assertEqual(len(self.hashed), 2)
+        self.assertTrue(touched.same_contents(first))
+
+        self.write('Documents/a.txt', 'Different text.')
+        changed = Manifest.scan(self.dir, touched)
+        self.assertFalse(changed.same_contents(first))
+
+    def test_save_and_load(self):
+        first = Manifest.scan(self.dir, settings='abc')
+        filename = os.path.join(self.dir, 'manifest.json')
+        first.save(filename)
+        loaded = Manifest.load(filename)
+        self.assertEqual(loaded.files, first.files)
+        self.assertTrue(loaded.same_contents(first))
+        self.assertFalse(Manifest.scan(self.dir, loaded, 'def').same_contents(first))
+        self.assertEqual(Manifest.load(os.path.join(self.dir, 'missing.json')), None)
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestManifest)
+    unittest.TextTestRunner(verbosity=2).run(suite)
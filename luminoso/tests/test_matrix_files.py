@@ -0,0 +1,72 @@
+from luminoso import matrix_files
+from csc import divisi2
+import numpy as np
+import unittest
+import tempfile
+import shutil
+import os
+
+'''
+This is a unit test for matrix_files.py
+'''
+
+class TestMatrixFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    '''
+    Dense matrices come back memory-mapped, with the same labels, including
+    unicode and byte string labels.
+    '''
+    def test_dense(self):
+        labels = [u'caf\xe9', 'doc.txt', u'tea']
+        matrix = divisi2.DenseMatrix(np.arange(6.0).reshape(3, 2), labels, None)
+        matrix_files.save_dense(self.dir, 'proj', matrix)
+        loaded = matrix_files.load_dense(self.dir, 'proj')
+
+        self.assertTrue(np.all(np.asarray(loaded) == np.asarray(matrix)))
+        self.assertEqual(list(loaded.row_labels), labels)
+        self.assertEqual(type(loaded.row_labels[1]), str)
+        self.assertEqual(loaded.col_labels, None)
+        base = np.asarray(loaded)
+        while not isinstance(base, np.memmap): base = base.base
+        self.assertEqual(base.mode, matrix_files.MMAP_MODE)
+
+    def test_sparse(self):
+        matrix = divisi2.SparseMatrix.from_named_lists(
+            [1.0, -2.0, 3.0], ['a.txt', 'a.txt', 'b.txt'],
+            [u'food', u'spicy', u'food'])
+        matrix_files.save_sparse(self.dir, 'docs', matrix)
+        loaded = matrix_files.load_sparse(self.dir, 'docs')
+
+        self.assertEqual(loaded.shape, matrix.shape)
+        self.assertEqual(sorted(loaded.named_entries()),
+                         sorted(matrix.named_entries()))
+
+    '''
+    Saving over existing files works where renaming can't replace a file,
+    as on Windows.
+    '''
+    def test_save_over(self):
+        def windows_rename(src, dst):
+            if os.path.exists(dst):
+                raise OSError(17, 'File exists')
+            rename(src, dst)
+        rename = os.rename
+        os.rename = windows_rename
+        try:
+            matrix_files.save_dense(self.dir, 'vec', np.arange(3.0))
+            matrix_files.save_dense(self.dir, 'vec', np.arange(4.0))
+        finally:
+            os.rename = rename
+        self.assertTrue(np.array_equal(matrix_files.load_dense(self.dir, 'vec'),
+                                       np.arange(4.0)))
+        self.assertEqual(os.listdir(self.dir), ['vec.npy'])
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestMatrixFiles)
+    unittest.TextTestRunner(verbosity=2).run(suite)
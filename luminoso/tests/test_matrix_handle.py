@@ -0,0 +1,95 @@
+from luminoso.matrix_handle import MatrixHandle, SPARSE_ENTRY_BYTES
+from luminoso.sized_cache import SizedLRUCache
+from luminoso.manifest import Manifest, file_hash
+from luminoso.study import StudyDirectory, Study
+from csc import divisi2
+import unittest
+import tempfile
+import shutil
+import os
+
+'''
+This is a unit test for matrix_handle.py
+'''
+
+class TestMatrixHandle(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.dir, 'Matrices'))
+        matrix = divisi2.SparseMatrix.from_named_lists(
+            [1.0, 2.0], ['dog', 'cat'], ['cat', 'dog'])
+        for name in ['animals.assoc.smat', 'unused.smat']:
+            divisi2.save(matrix, os.path.join(self.dir, 'Matrices', name))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    '''
+    Opening a study's matrices doesn't load them, and the shapes recorded in
+    a manifest are known without loading them.
+    '''
+    def test_lazy(self):
+        study_dir = StudyDirectory(self.dir)
+        matrices = study_dir.get_matrices()
+        handle = matrices['animals.assoc.smat']
+        self.assertEqual(handle.kind, 'assoc')
+        self.assertEqual(matrices['unused.smat'].kind, 'matrix')
+        self.assertFalse(handle.loaded)
+        self.assertEqual(handle.shape, None)
+        self.assertEqual(handle.digest, file_hash(handle.filename))
+        self.assertEqual(handle.load().entry_named('dog', 'cat'), 1.0)
+        self.assertEqual(handle.shape, (2, 2))
+
+        manifest = Manifest.scan(self.dir)
+        manifest.set_shape('Matrices', handle.filename, handle.shape)
+        handle = study_dir.get_matrices(manifest)['animals.assoc.smat']
+        self.assertEqual(handle.shape, (2, 2))
+        self.assertFalse(handle.loaded)
+
+    '''
+    A study only loads the matrices its blend uses, and its contents hash
+    identifies the matrices without loading them.
+    '''
+    def test_study(self):
+        loads = []
+        def handle(name):
+            def load():
+                loads.append(name)
+                return StudyDirectory(self.dir).get_matrices()[name].load()
+            return MatrixHandle(name, load, digest=name + '-digest')
+        study = Study('test', [], [], dict((name, handle(name)) for name in
+                                           ['animals.assoc.smat', 'unused.smat']),
+                      {})
+        self.assertTrue(study.is_associative())
+        self.assertEqual(study.get_contents_hash()['matrices'],
+                         {'animals.assoc.smat': 'animals.assoc.smat-digest',
+                          'unused.smat': 'unused.smat-digest'})
+        self.assertEqual(loads, [])
+        study.get_other_matrix('animals.assoc.smat')
+        study.get_other_matrix('animals.assoc.smat')
+        self.assertEqual(loads, ['animals.assoc.smat'])
+
+    '''
+    StudyDirectories sharing a matrix cache load each matrix once, and
+    the cache only keeps as many matrices as fit in its budget.
+    '''
+    def test_cache(self):
+        # Room for three entries
+        cache = SizedLRUCache(3 * SPARSE_ENTRY_BYTES)
+        first = StudyDirectory(self.dir, matrix_cache=cache)
+        second = StudyDirectory(self.dir, matrix_cache=cache)
+        matrix = first.get_matrices()['animals.assoc.smat'].load()
+        self.assertTrue(second.get_matrices()['animals.assoc.smat'].load() is matrix)
+        self.assertEqual(len(cache), 1)
+
+        other = divisi2.SparseMatrix.from_named_lists(
+            [1.0, 2.0, 3.0], ['dog', 'cat', 'cow'], ['cat', 'dog', 'cow'])
+        divisi2.save(other, os.path.join(self.dir, 'Matrices', 'other.smat'))
+        first.get_matrices()['other.smat'].load()
+        self.assertEqual(len(cache), 1)
+        self.assertFalse(second.get_matrices()['animals.assoc.smat'].load() is matrix)
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestMatrixHandle)
+    unittest.TextTestRunner(verbosity=2).run(suite)
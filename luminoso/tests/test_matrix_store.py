@@ -0,0 +1,97 @@
+from luminoso.matrix_store import MatrixStore, read_reference
+from luminoso.study import StudyDirectory
+from csc import divisi2
+from csc.divisi2.blending import blend
+import numpy as np
+import unittest
+import tempfile
+import shutil
+import os
+
+'''
+This is a unit test for matrix_store.py
+'''
+
+class TestMatrixStore(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.store = MatrixStore(os.path.join(self.dir, 'store'))
+        self.matrix = divisi2.SparseMatrix.from_named_lists(
+            [1.0, -2.0, 3.0, 0.5], ['dog', 'dog', 'cat', 'tea'],
+            ['cat', u'caf\xe9', 'dog', 'dog'])
+        self.filename = os.path.join(self.dir, 'animals.assoc.smat')
+        divisi2.save(self.matrix, self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    '''
+    Stored matrices are memory-mapped read-only, and behave like the
+    original matrix.
+    '''
+    def test_load(self):
+        digest = self.store.add_file(self.filename)
+        self.assertTrue(digest in self.store)
+        self.assertEqual(self.store.add_file(self.filename), digest)
+        stored = self.store.load(digest)
+        self.assertEqual(stored.shape, self.matrix.shape)
+        self.assertEqual(stored.nnz, 4)
+        self.assertEqual(list(stored.row_labels), list(self.matrix.row_labels))
+        self.assertEqual(stored.entry_named('dog', u'caf\xe9'), -2.0)
+        csr = stored.to_scipy_csr()
+        base = csr.data
+        while not isinstance(base, np.memmap): base = base.base
+        self.assertEqual(base.mode, 'r')
+        U, S, V = stored.svd(k=1)
+        self.assertAlmostEqual(S[0], self.matrix.svd(k=1)[1][0])
+
+    '''
+    Blending and normalizing a stored matrix gives the same results as
+    with the original, without making a copy of it.
+    '''
+    def test_blend(self):
+        stored = self.store.load(self.store.add_file(self.filename))
+        other = divisi2.SparseMatrix.from_named_lists(
+            [1.0, 2.0], ['dog', 'cow'], ['cow', 'dog'])
+        expected = blend([other, self.matrix])
+        blended = blend([other, stored])
+        self.assertEqual(blended.shape, expected.shape)
+        for value, row, col in expected.named_entries():
+            self.assertAlmostEqual(blended.entry_named(row, col), value)
+
+        normalized = stored.normalize_all()
+        expected = self.matrix.normalize_all()
+        self.assertEqual(normalized.row_labels, expected.row_labels)
+        self.assertEqual(normalized.col_labels, expected.col_labels)
+        self.assertTrue(np.allclose(normalized.to_dense(), expected.to_dense()))
+        self.assertEqual(stored._sparse, None)
+        self.assertRaises(AttributeError, getattr, stored, 'squish')
+
+    def test_missing(self):
+        self.assertRaises(IOError, self.store.load, '0' * 40)
+
+    '''
+    A study whose matrix was moved into the store gets the same matrix, by
+    the same name, from a reference.
+    '''
+    def test_study_reference(self):
+        study_dir = os.path.join(self.dir, 'Study')
+        os.makedirs(os.path.join(study_dir, 'Matrices'))
+        shutil.copy(self.filename, os.path.join(study_dir, 'Matrices'))
+        study = StudyDirectory(study_dir, matrix_store=self.store)
+        study.share_matrices()
+        matrices_dir = os.path.join(study_dir, 'Matrices')
+        self.assertEqual(os.listdir(matrices_dir), ['animals.assoc.smat.ref'])
+        self.assertEqual(
+            read_reference(os.path.join(matrices_dir, 'animals.assoc.smat.ref')),
+            self.store.add_file(self.filename))
+        matrices = study.get_matrices()
+        self.assertEqual(matrices.keys(), ['animals.assoc.smat'])
+        self.assertEqual(matrices['animals.assoc.smat'].shape, (3, 3))
+        self.assertEqual(
+            matrices['animals.assoc.smat'].load().entry_named('tea', 'dog'), 0.5)
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestMatrixStore)
+    unittest.TextTestRunner(verbosity=2).run(suite)
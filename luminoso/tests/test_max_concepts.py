@@ -0,0 +1,62 @@
+from luminoso.study import Study, Document, CanonicalDocument
+import unittest
+
+'''
+This is a unit test for the max_concepts setting in study.py
+'''
+
+TEXTS = [
+    u'Pizza is tasty. Pasta and cheese. #italian',
+    u'Pizza with cheese. Pasta. #italian',
+    u'Pizza and pasta with cheese.',
+    u'Pizza and pasta.',
+    u'Pizza tonight.',
+    u'Soup is warm.',
+    u'Soup with bread.',
+    u'Bread and butter.',
+    u'Salad.',
+    u'Water.',
+]
+
+class TestMaxConcepts(unittest.TestCase):
+
+    def make_study(self, **settings):
+        documents = [Document('doc%d.txt' % i, text)
+                     for i, text in enumerate(TEXTS)]
+        canonical = [CanonicalDocument('canon.txt', u'Bread.')]
+        return Study('test', documents, canonical, {}, settings)
+
+    def valid(self, study):
+        return study.get_valid_concepts()
+
+    '''
+    The most frequent concepts are kept, along with tags and canonical
+    concepts, which count toward the limit.
+    '''
+    def test_frequency(self):
+        uncapped = self.valid(self.make_study(concept_cutoff=2))
+        self.assertTrue(set([u'pizza', u'pasta', u'cheese', u'soup', u'bread',
+                             u'#italian']) <= uncapped)
+        capped = self.valid(self.make_study(concept_cutoff=2, max_concepts=3))
+        self.assertEqual(capped, set([u'pizza', u'#italian', u'bread']))
+
+        capped = self.valid(self.make_study(concept_cutoff=2, max_concepts=4))
+        self.assertEqual(len(capped), 4)
+        self.assertTrue(capped <= uncapped)
+
+    def test_unlimited(self):
+        study = self.make_study(concept_cutoff=2, max_concepts=1000)
+        self.assertEqual(self.valid(study),
+                         self.valid(self.make_study(concept_cutoff=2)))
+
+    def test_tfidf(self):
+        capped = self.valid(self.make_study(concept_cutoff=2, max_concepts=4,
+                                            concept_ranking='tfidf'))
+        self.assertEqual(len(capped), 4)
+        self.assertTrue(set([u'#italian', u'bread']) <= capped)
+        study = self.make_study(max_concepts=1, concept_ranking='unknown')
+        self.assertRaises(ValueError, study.get_valid_ids)
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestMaxConcepts)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,64 @@
+from luminoso.neighborhood import AdjacencyIndex, restrict_to_neighborhood
+from csc import divisi2
+import unittest
+
+'''
+This is a unit test for neighborhood.py
+'''
+
+def chain_matrix():
+    '''
+    a - b - c - d, with a weak shortcut from a to d. e is on its own.
+    '''
+    entries = []
+    for x, y, weight in [('a', 'b', 3), ('b', 'c', 2), ('c', 'd', 3),
+                         ('a', 'd', 1)]:
+        entries.append((weight, x, y))
+        entries.append((weight, y, x))
+    entries.append((1, 'e', 'e'))
+    return divisi2.make_sparse(entries)
+
+class TestNeighborhood(unittest.TestCase):
+
+    def setUp(self):
+        self.matrix = chain_matrix()
+        self.index = AdjacencyIndex.from_matrix(self.matrix)
+
+    def labels(self, rows):
+        return set(self.index.labels[i] for i in rows)
+
+    def test_hops(self):
+        self.assertEqual(self.labels(self.index.neighborhood(['b'], hops=0)),
+                         set(['b']))
+        self.assertEqual(self.labels(self.index.neighborhood(['b'], hops=1)),
+                         set(['a', 'b', 'c']))
+        self.assertEqual(self.labels(self.index.neighborhood(['b'], hops=2)),
+                         set(['a', 'b', 'c', 'd']))
+
+    '''
+    With max_neighbors, only the strongest associations are followed, so the
+    weak shortcut from a to d is not.
+    '''
+    def test_max_neighbors(self):
+        rows = self.index.neighborhood(['a'], hops=1, max_neighbors=1)
+        self.assertEqual(self.labels(rows), set(['a', 'b']))
+        rows = self.index.neighborhood(['a'], hops=1)
+        self.assertEqual(self.labels(rows), set(['a', 'b', 'd']))
+
+    def test_submatrix(self):
+        sub = restrict_to_neighborhood(self.matrix, ['a', 'missing'], hops=1)
+        self.assertEqual(set(sub.row_labels), set(['a', 'b', 'd']))
+        self.assertEqual(list(sub.row_labels), list(sub.col_labels))
+        self.assertEqual(sub.entry_named('a', 'b'), 3)
+        self.assertEqual(sub.entry_named('d', 'a'), 1)
+        # b and d are both in the neighborhood, but aren't associated.
+        self.assertEqual(sub.entry_named('b', 'd'), 0)
+        self.assertEqual(sub.nnz, 4)
+
+    def test_missing(self):
+        self.assertEqual(restrict_to_neighborhood(self.matrix, ['missing']),
+                         None)
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestNeighborhood)
+    unittest.TextTestRunner(verbosity=2).run(suite)
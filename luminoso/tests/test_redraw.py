@@ -0,0 +1,47 @@
+from luminoso.redraw import RedrawTracker, DRAW, RENDER, REUSE, VOLATILE_FRAMES
+import unittest
+
+'''
+This is a unit test for redraw.py
+'''
+
+class TestRedraw(unittest.TestCase):
+
+    def setUp(self):
+        self.points = RedrawTracker(frozenset(['projection', 'colors']))
+        self.labels = RedrawTracker(frozenset(['projection', 'hover']))
+        self.overlay = RedrawTracker(None)
+
+    def frame(self, *dirty):
+        dirty = set(dirty)
+        return [tracker.frame(dirty) for tracker in
+                (self.points, self.labels, self.overlay)]
+
+    '''
+    Only the layers that a change affects are rendered again; the others
+    reuse their images, and layers without images are always drawn.
+    '''
+    def test_changed_layers(self):
+        self.assertEqual(self.frame(), [RENDER, RENDER, DRAW])
+        self.assertEqual(self.frame(), [REUSE, REUSE, DRAW])
+        self.assertEqual(self.frame('hover'), [REUSE, RENDER, DRAW])
+        self.assertEqual(self.frame('colors'), [RENDER, REUSE, DRAW])
+        self.assertEqual(self.frame('selection'), [REUSE, REUSE, DRAW])
+        self.assertEqual(self.frame('size'), [RENDER, RENDER, DRAW])
+
+    '''
+    A layer that changes in every frame is drawn directly, and gets an
+    image again once it stops changing.
+    '''
+    def test_volatile(self):
+        self.frame()
+        for i in xrange(VOLATILE_FRAMES - 1):
+            self.assertEqual(self.frame('hover'), [REUSE, RENDER, DRAW])
+        for i in xrange(3):
+            self.assertEqual(self.frame('hover'), [REUSE, DRAW, DRAW])
+        self.assertEqual(self.frame('colors'), [RENDER, RENDER, DRAW])
+        self.assertEqual(self.frame(), [REUSE, REUSE, DRAW])
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestRedraw)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,96 @@
+from luminoso.screen_index import ScreenGrid, OccupancyGrid, select_ranks
+import numpy as np
+import unittest
+
+'''
+This is a unit test for screen_index.py
+'''
+
+class TestScreenGrid(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(0)
+        # Some points are off the screen, and some are on top of each other.
+        self.points = np.int32(random.uniform(-100, 500, (2000, 2)))
+        self.points[1000:1010] = self.points[5]
+        self.grid = ScreenGrid(self.points, 400, 300)
+
+    def brute_force_distances(self, x, y):
+        return np.sqrt(np.sum((self.points - [x, y]) ** 2.0, axis=1))
+
+    '''
+    The nearest point is exactly the one np.argmin would find, including
+    from off the screen and where points are tied.
+    '''
+    def test_nearest(self):
+        for x, y in [(0, 0), (200, 150), (399, 299), (-300, 80), (900, 900),
+                     tuple(self.points[5])]:
+            expected = np.argmin(self.brute_force_distances(x, y))
+            self.assertEqual(self.grid.nearest(x, y), expected)
+        self.assertEqual(ScreenGrid(np.zeros((0, 2)), 400, 300).nearest(1, 1),
+                         None)
+
+    def test_within(self):
+        for x, y, radius in [(200, 150, 30), (5, 5, 40), (390, 10, 100)]:
+            expected = np.flatnonzero(self.brute_force_distances(x, y) <= radius)
+            self.assertEqual(list(self.grid.within(x, y, radius)), list(expected))
+
+    def test_in_rect(self):
+        x, y = self.points[:, 0], self.points[:, 1]
+        for x0, y0, x1, y1 in [(10, 20, 100, 60), (-50, -50, 30, 500)]:
+            expected = np.flatnonzero((x >= x0) & (x <= x1) &
+                                      (y >= y0) & (y <= y1))
+            self.assertEqual(list(self.grid.in_rect(x0, y0, x1, y1)),
+                             list(expected))
+
+    '''
+    The points around a spot are all on the screen, include every point
+    within a cell of it, and number at least as many as were asked for.
+    '''
+    def test_around(self):
+        on_screen = set(self.grid.on_screen_points)
+        for x, y, count in [(200, 150, 50), (0, 0, 300), (200, 150, 100000)]:
+            found = set(self.grid.around(x, y, count))
+            self.assertTrue(found <= on_screen)
+            self.assertTrue(len(found) >= min(count, len(on_screen)))
+            close = np.flatnonzero(self.brute_force_distances(x, y) <= 16)
+            self.assertTrue(set(close) & on_screen <= found)
+
+    def test_select_ranks(self):
+        values = np.random.RandomState(1).uniform(size=500)
+        ranks = [0, 3, 40, 41, 499]
+        self.assertEqual(list(select_ranks(values, ranks)),
+                         list(np.argsort(values)[ranks]))
+        self.assertEqual(len(select_ranks(values, [])), 0)
+
+        # NumPy before 1.8 has no argpartition.
+        argpartition = np.argpartition
+        del np.argpartition
+        try:
+            self.assertEqual(list(select_ranks(values, ranks)),
+                             list(np.argsort(values)[ranks]))
+        finally:
+            np.argpartition = argpartition
+
+    '''
+    Taking an area takes every cell it touches, clipped to the screen, and
+    clearing frees them all again.
+    '''
+    def test_occupancy(self):
+        grid = OccupancyGrid(100, 50, cell_size=10)
+        grid.take(12, 5, 21, 15)
+        self.assertTrue(grid.is_taken(10, 0))
+        self.assertTrue(grid.is_taken(29, 19))
+        self.assertFalse(grid.is_taken(30, 5))
+        self.assertFalse(grid.is_taken(15, 20))
+        grid.take(-40, 45, 5, 500)
+        grid.take(200, 0, 300, 10)
+        self.assertTrue(grid.is_taken(0, 49))
+        self.assertEqual(grid.cells.sum(), 2 * 2 + 1)
+        grid.clear()
+        self.assertFalse(grid.cells.any())
+        self.assertEqual(grid.taken, [])
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestScreenGrid)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,38 @@
+from luminoso.sized_cache import SizedLRUCache
+import unittest
+
+'''
+This is a unit test for sized_cache.py
+'''
+
+class TestSizedLRUCache(unittest.TestCase):
+
+    '''
+    The least recently used entries are dropped when the total size goes
+    over the budget.
+    '''
+    def test_eviction(self):
+        cache = SizedLRUCache(100)
+        cache.put('a', 1, 40)
+        cache.put('b', 2, 40)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3, 40)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.nbytes, 80)
+
+    def test_replace_and_oversized(self):
+        cache = SizedLRUCache(100)
+        cache.put('a', 1, 40)
+        cache.put('a', 2, 60)
+        self.assertEqual((cache.get('a'), cache.nbytes, len(cache)), (2, 60, 1))
+        cache.put('big', 3, 101)
+        self.assertFalse('big' in cache)
+        self.assertEqual(cache.get('a'), 2)
+        cache.clear()
+        self.assertEqual((len(cache), cache.nbytes), (0, 0))
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestSizedLRUCache)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,65 @@
+from luminoso.svd_engines import truncated_svd
+from csc import divisi2
+import numpy as np
+import unittest
+
+'''
+This is a unit test for svd_engines.py
+'''
+
+def make_matrix(nrows=200, ncols=150, rank=8):
+    random = np.random.RandomState(1)
+    dense = np.dot(random.standard_normal((nrows, rank)),
+                   random.standard_normal((rank, ncols)))
+    dense[np.abs(dense) < 1.0] = 0.0
+    rows, cols = np.nonzero(dense)
+    return divisi2.SparseMatrix.from_named_lists(
+        list(dense[rows, cols]), ['r%d' % i for i in rows],
+        ['c%d' % i for i in cols])
+
+class TestSVDEngines(unittest.TestCase):
+
+    def setUp(self):
+        self.matrix = make_matrix()
+
+    '''
+    The randomized SVD finds nearly the same singular values as the exact one,
+    and reports a residual near the exact one's.
+    '''
+    def test_randomized(self):
+        U, S, V, exact_residual = truncated_svd(self.matrix, 10, 'lanczos')
+        rU, rS, rV, residual = truncated_svd(self.matrix, 10, 'randomized',
+                                             power_iterations=3)
+        self.assertTrue(exact_residual < 1e-6)
+        self.assertTrue(residual < 0.05)
+        self.assertTrue(np.allclose(np.asarray(S)[:5], rS[:5], rtol=0.01))
+        self.assertEqual(list(rU.row_labels), list(self.matrix.row_labels))
+
+    '''
+    Starting from the exact singular vectors gets a better answer than
+    starting from random ones, for the same amount of work.
+    '''
+    def test_warm_start(self):
+        U, S, V, exact_residual = truncated_svd(self.matrix, 10, 'lanczos')
+        cold = truncated_svd(self.matrix, 10, 'randomized', power_iterations=0)
+        warm = truncated_svd(self.matrix, 10, 'randomized', power_iterations=0,
+                             warm_start=U)
+        self.assertTrue(warm[3] < cold[3])
+
+    '''
+    Measuring the residual doesn't copy the matrix into SciPy's format.
+    '''
+    def test_residual_without_copy(self):
+        matrix = self.matrix
+        def no_copy():
+            raise AssertionError("The matrix was copied")
+        matrix.to_scipy_csr = no_copy
+        U, S, V, residual = truncated_svd(matrix, 10, 'lanczos')
+        self.assertTrue(residual < 1e-6)
+
+    def test_unknown_engine(self):
+        self.assertRaises(ValueError, truncated_svd, self.matrix, 10, 'magic')
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestSVDEngines)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,61 @@
+import numpy as np
+import unittest
+
+try:
+    from PyQt4.QtGui import QApplication
+    from luminoso.svdview import SVDViewer, LabelLayer
+except ImportError:
+    QApplication = None
+
+'''
+This is a unit test for svdview.py. It needs PyQt4.
+'''
+
+class TestSVDViewer(unittest.TestCase):
+
+    def setUp(self):
+        self.app = QApplication.instance() or QApplication([])
+        array = np.random.RandomState(0).normal(size=(200, 6))
+        self.viewer = SVDViewer(array, ['p%d' % i for i in xrange(200)],
+                                jitter=False)
+        self.viewer.magnitudes = np.ones((200,))
+        self.viewer.setup_standard_layers()
+        self.labels = [layer for layer in self.viewer.layers
+                       if isinstance(layer, LabelLayer)][0]
+
+    def tearDown(self):
+        self.viewer.stop_timer()
+
+    def nearest_to_mouse(self):
+        viewer = self.viewer
+        mouse = np.array([viewer.mouseX, viewer.mouseY])
+        return np.argmin(np.sum((viewer.screenpts - mouse) ** 2, axis=1))
+
+    '''
+    When the projection rotates without any mouse events, the labels are
+    still ranked by where the points are now.
+    '''
+    def test_label_order_follows_rotation(self):
+        viewer = self.viewer
+        viewer.mouseX, viewer.mouseY = viewer.width // 2, viewer.height // 2
+        self.labels.update_order()
+        self.assertEqual(self.labels.order[0], self.nearest_to_mouse())
+        before = viewer.screenpts.copy()
+
+        viewer.set_axis_to_pc(0, 3)
+        for tick in xrange(200):
+            viewer.timerEvent()
+        self.assertFalse(np.array_equal(viewer.screenpts, before))
+        self.assertTrue(self.labels.order_stale)
+        self.labels.update_order()
+        self.assertEqual(self.labels.order[0], self.nearest_to_mouse())
+
+if QApplication is None:
+    del TestSVDViewer
+
+if __name__ == '__main__':
+    if QApplication is None:
+        print 'PyQt4 is not available; skipping the SVDViewer tests.'
+    else:
+        suite = unittest.TestLoader().loadTestsFromTestCase(TestSVDViewer)
+        unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,42 @@
+from luminoso.study import top_k_indices
+import numpy as np
+import unittest
+
+'''
+This is a unit test for top_k_indices in study.py
+'''
+
+class TestTopK(unittest.TestCase):
+
+    def test_top_k(self):
+        values = np.array([0.5, -2.0, 3.0, 1.0, 0.0, 2.5])
+        self.assertEqual(list(top_k_indices(values, 3)), [2, 5, 3])
+        self.assertEqual(list(top_k_indices(values, 1)), [2])
+        self.assertEqual(list(top_k_indices(values, 0)), [])
+        self.assertEqual(list(top_k_indices(values, 10)),
+                         list(np.argsort(-values)))
+
+    '''
+    The result is the same as sorting everything and taking the top k.
+    '''
+    def test_matches_sort(self):
+        values = np.random.RandomState(0).standard_normal(1000)
+        self.assertEqual(list(top_k_indices(values, 20)),
+                         list(np.argsort(-values)[:20]))
+
+    '''
+    Without np.argpartition, from NumPy before 1.8, the result is the same.
+    '''
+    def test_without_argpartition(self):
+        values = np.random.RandomState(0).standard_normal(1000)
+        expected = list(top_k_indices(values, 20))
+        argpartition = np.argpartition
+        del np.argpartition
+        try:
+            self.assertEqual(list(top_k_indices(values, 20)), expected)
+        finally:
+            np.argpartition = argpartition
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestTopK)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,45 @@
+from luminoso.vocabulary import Vocabulary, first_appearance
+import numpy as np
+import unittest
+
+'''
+This is a unit test for vocabulary.py
+'''
+
+class TestVocabulary(unittest.TestCase):
+
+    def test_ids(self):
+        vocab = Vocabulary()
+        ids, values = vocab.encode([(u'food', 1), (u'#tag', 1), (u'food', -1)])
+        self.assertEqual(list(ids), [0, 1, 0])
+        self.assertEqual(list(values), [1.0, 1.0, -1.0])
+        self.assertEqual(vocab.labels, [u'food', u'#tag'])
+        self.assertEqual(vocab.is_tag, [False, True])
+        self.assertEqual(vocab.get(u'#tag'), 1)
+        self.assertEqual(vocab.get(u'missing'), -1)
+        self.assertEqual(list(vocab.mask([u'#tag', u'missing'])), [False, True])
+        self.assertEqual(list(vocab.ordered_set([1, 0])), [u'#tag', u'food'])
+
+    '''
+    Encoded sentences give back the same concepts, as ids.
+    '''
+    def test_sentences(self):
+        vocab = Vocabulary()
+        sentences = [[(u'food', 1), (u'spicy', -1)], [], [(u'spicy', 1)]]
+        encoded = vocab.encode_sentences(sentences)
+        self.assertEqual(len(encoded), 3)
+        decoded = [[(vocab.label(cid), value) for cid, value in zip(ids, values)]
+                   for ids, values in encoded]
+        self.assertEqual(decoded, sentences)
+
+    def test_first_appearance(self):
+        numbers, distinct = first_appearance([7, 3, 7, 5, 3])
+        self.assertEqual(list(numbers), [0, 1, 0, 2, 1])
+        self.assertEqual(list(distinct), [7, 3, 5])
+        self.assertEqual(list(distinct[numbers]), [7, 3, 7, 5, 3])
+        numbers, distinct = first_appearance([])
+        self.assertEqual(len(numbers), 0)
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestVocabulary)
+    unittest.TextTestRunner(verbosity=2).run(suite)
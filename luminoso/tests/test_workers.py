@@ -0,0 +1,52 @@
+from luminoso.study import Study, Document, CanonicalDocument
+import numpy as np
+import unittest
+
+'''
+This is a unit test for extracting concepts in worker processes in study.py
+'''
+
+TEXTS = [
+    u'Pizza is tasty. Pasta and cheese go well together. #italian',
+    u'Pizza with cheese is my favorite food. Pasta is good too. #italian',
+    u'I like pizza and pasta with cheese.',
+    u'Soup is warm and good in winter.',
+    u'Soup with bread is a nice lunch.',
+    u'Bread and butter with cheese.',
+    u'A salad is good for lunch.',
+    u'Pasta salad with cheese and bread.',
+]
+
+class TestWorkers(unittest.TestCase):
+
+    def analyze(self, workers):
+        documents = [Document('doc%d.txt' % i, text)
+                     for i, text in enumerate(TEXTS)]
+        canonical = [CanonicalDocument('canon.txt', u'Bread and soup.')]
+        study = Study('test', documents, canonical, {},
+                      {'workers': workers, 'axes': 3})
+        return study, study.analyze()
+
+    '''
+    Extracting concepts in two worker processes gives exactly the same
+    results as extracting them serially.
+    '''
+    def test_same_as_serial(self):
+        serial_study, serial = self.analyze(1)
+        parallel_study, parallel = self.analyze(2)
+        self.assertEqual(len(serial_study.vocabulary),
+                         len(parallel_study.vocabulary))
+        self.assertEqual(list(serial.docs.row_labels),
+                         list(parallel.docs.row_labels))
+        self.assertEqual(list(serial.docs.col_labels),
+                         list(parallel.docs.col_labels))
+        self.assertEqual(serial.docs.named_entries(), parallel.docs.named_entries())
+        self.assertEqual(list(serial.projections.row_labels),
+                         list(parallel.projections.row_labels))
+        self.assertTrue(np.array_equal(np.asarray(serial.projections),
+                                       np.asarray(parallel.projections)))
+        self.assertEqual(serial.get_consistency(), parallel.get_consistency())
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestWorkers)
+    unittest.TextTestRunner(verbosity=2).run(suite)
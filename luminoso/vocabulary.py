@@ -0,0 +1,138 @@
+"""
+Give each concept in a study a dense integer id, once, as it comes out of
+concept extraction.
+
+After that, the documents matrix and the co-occurrence matrix are built from
+arrays of ids, instead of hashing and comparing the concept strings at every
+occurrence. The strings only come back as labels, when divisi2 matrices are
+made (see `Vocabulary.ordered_set`).
+"""
+from array import array
+import numpy as np
+
+from csc.divisi2.ordered_set import OrderedSet
+
+class Vocabulary(object):
+    """
+    A mapping from concepts to ids 0, 1, 2, ..., in the order the concepts
+    were first seen.
+
+        >>> vocab = Vocabulary()
+        >>> vocab.add(u'food'), vocab.add(u'#tag'), vocab.add(u'food')
+        (0, 1, 0)
+        >>> vocab.label(1), vocab.is_tag[1]
+        (u'#tag', True)
+    """
+    def __init__(self):
+        self._ids = {}
+        self.labels = []
+        # Whether each concept is a #tag, for code that loops over ids.
+        self.is_tag = []
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __contains__(self, concept):
+        return concept in self._ids
+
+    def add(self, concept):
+        """
+        Get the id of a concept, giving it a new one if it hasn't been seen.
+        """
+        cid = self._ids.get(concept)
+        if cid is None:
+            cid = self._ids[concept] = len(self.labels)
+            self.labels.append(concept)
+            self.is_tag.append(concept.startswith('#'))
+        return cid
+
+    def get(self, concept, default=-1):
+        """
+        Get the id of a concept, or `default` if it hasn't been seen.
+        """
+        return self._ids.get(concept, default)
+
+    def label(self, cid):
+        return self.labels[cid]
+
+    def encode(self, concepts):
+        """
+        Turn a list of (concept, value) pairs into parallel arrays of ids and
+        values.
+        """
+        ids = array('i', [self.add(concept) for concept, value in concepts])
+        values = array('d', [value for concept, value in concepts])
+        return ids, values
+
+    def encode_sentences(self, sentence_concepts):
+        """
+        Turn the (concept, value) pairs in each sentence, as returned by
+        `extract_sentence_concepts`, into a SentenceConcepts.
+        """
+        ids, values, ends = array('i'), array('i'), array('i')
+        for concepts in sentence_concepts:
+            for concept, value in concepts:
+                ids.append(self.add(concept))
+                values.append(value)
+            ends.append(len(ids))
+        return SentenceConcepts(ids, values, ends)
+
+    def mask(self, concepts):
+        """
+        Get a boolean array over all ids that is true for the ids of the
+        given concepts.
+        """
+        result = np.zeros((len(self),), dtype=np.bool_)
+        ids = [self._ids[concept] for concept in concepts
+               if concept in self._ids]
+        result[ids] = True
+        return result
+
+    def ordered_set(self, ids):
+        """
+        Get the labels of a sequence of ids as an OrderedSet, for labeling a
+        divisi2 matrix.
+        """
+        labels = self.labels
+        return OrderedSet([labels[cid] for cid in ids])
+
+class SentenceConcepts(object):
+    """
+    The concepts in each sentence of a document, as ids. This takes a few
+    bytes per concept, instead of a tuple and a string.
+
+    Sentence i holds ids[ends[i-1]:ends[i]], with values[ends[i-1]:ends[i]].
+    """
+    __slots__ = ['ids', 'values', 'ends']
+
+    def __init__(self, ids, values, ends):
+        self.ids = ids
+        self.values = values
+        self.ends = ends
+
+    def __len__(self):
+        return len(self.ends)
+
+    def __iter__(self):
+        """
+        Yield (ids, values) for each sentence.
+        """
+        start = 0
+        for end in self.ends:
+            yield self.ids[start:end], self.values[start:end]
+            start = end
+
+def first_appearance(indices):
+    """
+    Number the distinct values in `indices` 0, 1, 2, ... in the order they
+    first appear. Returns the renumbered array and the distinct values in
+    that order, so that `distinct[renumbered] == indices`.
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    if len(indices) == 0:
+        return indices, indices
+    distinct, first = np.unique(indices, return_index=True)
+    distinct = distinct[np.argsort(first, kind='mergesort')]
+    numbers = np.zeros((distinct.max() + 1,), dtype=np.int64)
+    numbers[distinct] = np.arange(len(distinct))
+    return numbers[indices], distinct
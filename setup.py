@@ -31,7 +31,7 @@ classifiers=[
 
 INCLUDES = ["sip", "PyQt4.QtCore", "PyQt4.Qt", "PyQt4.QtGui", "PyQt4",
             'csc.divisi2', 'spyderlib', 'csc.nl',
-            'standalone_nlp.lang_en', 'jinja2', 'numpy', 'chardet', 'pysparse']
+            'standalone_nlp.lang_en', 'jinja2', 'numpy', 'scipy.sparse', 'chardet', 'pysparse']
 DATA_FILES = ['icons']
 
 setup(
@@ -49,7 +49,7 @@ setup(
     app=['luminoso/run_luminoso.py'],
     scripts=['luminoso/run_luminoso.py', 'luminoso/study.py'],
     windows=[{'script': 'luminoso/run_luminoso.py'}],
-    install_requires=['csc-utils >= 0.5', 'divisi2', 'simplenlp', 'ipython >= 0.9.1', 'jinja2', 'chardet'],
+    install_requires=['csc-utils >= 0.5', 'divisi2', 'simplenlp', 'ipython >= 0.9.1', 'jinja2', 'chardet', 'scipy'],
     package_data={'csc.nl': ['mblem/*.pickle', 'en/*.txt']},
     include_package_data=True,
     #data_files=DATA_FILES,
@@ -65,7 +65,9 @@ setup(
     },
 
     entry_points={'gui_scripts': ['luminoso = luminoso.run_luminoso:main'],
-                  'console_scripts': ['luminoso-study = luminoso.study:main']},
+                  'console_scripts': ['luminoso-study = luminoso.study:main',
+                                      'luminoso-batch = luminoso.batch_study:main',
+                                      'luminoso-benchmark = luminoso.benchmark:main']},
 )
 
 '''